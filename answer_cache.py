@@ -0,0 +1,198 @@
+"""Persistent SQLite cache for LLM answers.
+
+Entries are keyed by subject, normalized question text, model name and a hash
+of the subject prompt, so editing a prompt in ``SUBJECTS`` automatically stops
+old answers from being served. Entries expire after a TTL and the table is kept
+under a fixed size by evicting the least recently used rows.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# Lives next to homework_history.db (both paths are relative to the app's cwd)
+CACHE_DB_PATH = "answer_cache.db"
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def normalize_question(question: str) -> str:
+    """Canonical form of a question used for cache lookups.
+
+    Only whitespace is folded: case and symbols are kept because they carry
+    meaning in many subjects (``Co`` vs ``CO``, ``x²`` vs ``x2``).
+    """
+    text = unicodedata.normalize("NFC", question or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256((prompt or "").encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(subject: str, question: str, model: str, prompt: str) -> str:
+    payload = json.dumps(
+        [subject, normalize_question(question), model, prompt_hash(prompt)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """TTL + LRU bounded answer cache with persistent hit/miss counters.
+
+    Every method swallows ``sqlite3.Error``: a broken cache must never stop a
+    student from getting an answer, it just degrades to a miss.
+    """
+
+    def __init__(self, db_path: str = CACHE_DB_PATH,
+                 ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self) -> None:
+        try:
+            with self._connect() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS answer_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        subject TEXT NOT NULL,
+                        model TEXT NOT NULL,
+                        question TEXT NOT NULL,
+                        answer TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_access REAL NOT NULL,
+                        hits INTEGER NOT NULL DEFAULT 0
+                    )
+                """)
+                cur.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_answer_cache_last_access "
+                    "ON answer_cache (last_access)"
+                )
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS answer_cache_stats (
+                        name TEXT PRIMARY KEY,
+                        value INTEGER NOT NULL DEFAULT 0
+                    )
+                """)
+                conn.commit()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _bump(cur: sqlite3.Cursor, name: str, amount: int = 1) -> None:
+        cur.execute(
+            """
+            INSERT INTO answer_cache_stats (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+            """,
+            (name, amount),
+        )
+
+    def get(self, subject: str, question: str, model: str, prompt: str) -> str | None:
+        """Return the cached answer or None; counts a hit or a miss."""
+        key = make_cache_key(subject, question, model, prompt)
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "SELECT answer, created_at FROM answer_cache WHERE cache_key=?",
+                    (key,),
+                )
+                row = cur.fetchone()
+                if row and now - row[1] <= self.ttl_seconds:
+                    cur.execute(
+                        "UPDATE answer_cache SET last_access=?, hits=hits+1 WHERE cache_key=?",
+                        (now, key),
+                    )
+                    self._bump(cur, "hits")
+                    conn.commit()
+                    return row[0]
+                if row:
+                    cur.execute("DELETE FROM answer_cache WHERE cache_key=?", (key,))
+                    self._bump(cur, "expired")
+                self._bump(cur, "misses")
+                conn.commit()
+        except sqlite3.Error:
+            pass
+        return None
+
+    def put(self, subject: str, question: str, model: str, prompt: str, answer: str) -> None:
+        """Store an answer, then drop expired rows and trim to ``max_entries``."""
+        if not answer:
+            return
+        key = make_cache_key(subject, question, model, prompt)
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    """
+                    INSERT OR REPLACE INTO answer_cache
+                        (cache_key, subject, model, question, answer, created_at, last_access, hits)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                    """,
+                    (key, subject, model, normalize_question(question), answer, now, now),
+                )
+                cur.execute(
+                    "DELETE FROM answer_cache WHERE created_at < ?",
+                    (now - self.ttl_seconds,),
+                )
+                if cur.rowcount > 0:
+                    self._bump(cur, "expired", cur.rowcount)
+                cur.execute("SELECT COUNT(*) FROM answer_cache")
+                overflow = cur.fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    cur.execute(
+                        """
+                        DELETE FROM answer_cache WHERE cache_key IN (
+                            SELECT cache_key FROM answer_cache
+                            ORDER BY last_access ASC
+                            LIMIT ?
+                        )
+                        """,
+                        (overflow,),
+                    )
+                    self._bump(cur, "evictions", overflow)
+                conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def stats(self) -> dict:
+        """Counters plus current size, e.g. ``{'hits': 3, 'misses': 5, 'entries': 4}``."""
+        result = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "entries": 0}
+        try:
+            with self._connect() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT name, value FROM answer_cache_stats")
+                result.update(dict(cur.fetchall()))
+                cur.execute("SELECT COUNT(*) FROM answer_cache")
+                result["entries"] = cur.fetchone()[0]
+        except sqlite3.Error:
+            pass
+        lookups = result["hits"] + result["misses"]
+        result["hit_rate"] = result["hits"] / lookups if lookups else 0.0
+        return result
+
+    def clear(self) -> None:
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute("DELETE FROM answer_cache")
+                conn.execute("DELETE FROM answer_cache_stats")
+                conn.commit()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,237 @@
+"""How answers are kept in the local ``history`` table.
+
+Rows used to hold the formatted HTML, which is several times larger than
+the answer (inline styles, fraction markup) and frozen at whatever the
+formatter did back then. New rows hold the model's own text, zlib-compressed
+when that pays off, and are rendered when shown, through the format memo.
+
+``answer_format`` says what ``answer`` holds:
+
+* ``text`` / ``text+zlib``: the answer text (compressed: UTF-8, zlib, a BLOB)
+* ``html`` / ``html+zlib``: formatted HTML from before this change
+
+``formatter_version`` is the ``FORMATTER_VERSION`` current when the row was
+written (NULL for rows written before the column existed).
+
+``migrate_history`` converts old rows in small batches. A row becomes text
+only if rendering the recovered text gives back exactly the stored HTML;
+otherwise the HTML is kept, compressed, so no answer ever displays
+differently. Run it from the command line or let the app do it in the
+background at startup:
+
+    python answer_storage.py homework_history.db --vacuum
+"""
+
+import argparse
+import html
+import re
+import sqlite3
+import sys
+import zlib
+
+from formatting import FORMATTER_VERSION
+from structured_answers import format_answer
+
+TEXT = "text"
+HTML = "html"
+ZLIB_SUFFIX = "+zlib"
+
+# Shorter answers gain little from compression
+COMPRESS_MIN_CHARS = 400
+MIGRATION_BATCH_ROWS = 200
+
+_TAG = re.compile(r"<[^>]+>")
+
+# Reverse of formatting.py, for migrating rows: the fragments it emits
+_FRACTION_HTML = re.compile(
+    r'<div class="fraction-display">\n        <div>(.*?)</div>\n'
+    r'        <div class="fraction-bar"></div>\n        <div>(.*?)</div>\n    </div>'
+)
+_POWER_HTML = re.compile(r'<span class="power">([^<]*)</span>')
+_FRAGMENT = re.compile(
+    r'(?P<br><br>)'
+    r'|(?P<marker><!--STEP_CODE_NEXT-->)'
+    r'|<div style="color:#4CAF50;font-weight:700;margin:0\.6rem 0 0\.2rem 0;">(?P<title>Step \d+:[^<\n]*)</div>'
+    r'|<div class="step-code">(?P<step>[^<\n]*)</div>'
+    r'|<div class="code-block"><div class="code-header">(?P<lang>[^<\n]*)</div>'
+    r'<pre><code>(?P<code>[^<]*)</code></pre></div>'
+    r'|<div class="(?P<kind>part-header|final-answer|math-line)">(?P<body>[^\n]*)</div>\n'
+    r'|(?P<plain>[^\n]*)\n',
+    re.DOTALL,
+)
+
+
+def encode_answer(text: str, compress: bool = True) -> tuple[str | bytes, str]:
+    """``(answer, answer_format)`` column values for an answer's text"""
+    if compress and len(text) >= COMPRESS_MIN_CHARS:
+        return zlib.compress(text.encode("utf-8"), 9), TEXT + ZLIB_SUFFIX
+    return text, TEXT
+
+
+def decode_answer(value, answer_format: str | None) -> str:
+    """The stored string: answer text, or HTML for rows that still hold HTML"""
+    if (answer_format or HTML).endswith(ZLIB_SUFFIX):
+        return zlib.decompress(value).decode("utf-8")
+    return value if isinstance(value, str) else (value or b"").decode("utf-8")
+
+
+def is_html(answer_format: str | None) -> bool:
+    return (answer_format or HTML).startswith(HTML)
+
+
+def answer_text(value, answer_format: str | None) -> str:
+    """Readable text of a row (markup stripped from HTML rows), e.g. to measure it"""
+    stored = decode_answer(value, answer_format)
+    return html.unescape(_TAG.sub("", stored)) if is_html(answer_format) else stored
+
+
+def render_stored(value, answer_format: str | None, render=format_answer) -> str:
+    """HTML to show for a row; ``render`` is typically ``FormatMemo.render``"""
+    stored = decode_answer(value, answer_format)
+    return stored if is_html(answer_format) else render(stored)
+
+
+def ensure_columns(conn: sqlite3.Connection) -> None:
+    """Add ``answer_format`` and ``formatter_version`` to an existing history table"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(history)")}
+    if "answer_format" not in columns:
+        # Every row written before the column existed holds HTML
+        conn.execute(f"ALTER TABLE history ADD COLUMN answer_format TEXT NOT NULL DEFAULT '{HTML}'")
+    if "formatter_version" not in columns:
+        conn.execute("ALTER TABLE history ADD COLUMN formatter_version TEXT")
+
+
+def unformat_html(markup: str) -> str:
+    """Best guess at the answer text ``format_response`` turned into ``markup``"""
+    markup = _FRACTION_HTML.sub(r"(\1)/(\2)", markup)
+    while True:
+        # Innermost power spans first: ^(a^2) nests one span in another
+        unpowered = _POWER_HTML.sub(r"^\1", markup)
+        if unpowered == markup:
+            break
+        markup = unpowered
+
+    lines = []
+    pos = 0
+    while pos < len(markup):
+        match = _FRAGMENT.match(markup, pos)
+        if match is None or match.end() == pos:
+            # A last line without "\n": not something format_response writes
+            lines.append(markup[pos:])
+            break
+        pos = match.end()
+        if match.group("br"):
+            lines.append("")
+        elif match.group("marker"):
+            continue
+        elif match.group("title") is not None:
+            number, _, rest = match.group("title").partition(":")
+            lines.append(f"**{number}:**{rest}")
+        elif match.group("step") is not None:
+            lines.append(html.unescape(match.group("step")))
+        elif match.group("lang") is not None:
+            lines.append("```" + match.group("lang"))
+            code = html.unescape(match.group("code"))
+            if code:
+                lines.append(code)
+            lines.append("```")
+        elif match.group("kind") == "part-header":
+            label, _, rest = html.unescape(match.group("body")).partition(":")
+            lines.append(f"**{label}:**{rest}")
+        elif match.group("kind"):
+            lines.append(match.group("body"))
+        else:
+            lines.append(match.group("plain"))
+    # A blank line at either end survives only before or after other text; a
+    # stray closing tag (dropped by the formatter) keeps it there
+    if lines and not lines[0]:
+        lines.insert(0, "</div>")
+    if lines and not lines[-1]:
+        lines.append("</div>")
+    return "\n".join(lines)
+
+
+def migrate_row(markup: str, compress: bool = True, render=format_answer) -> tuple[str | bytes, str]:
+    """New ``(answer, answer_format)`` for a row that holds HTML"""
+    text = unformat_html(markup)
+    if text.strip() and render(text) == markup:
+        return encode_answer(text, compress)
+    if compress:
+        return zlib.compress(markup.encode("utf-8"), 9), HTML + ZLIB_SUFFIX
+    return markup, HTML
+
+
+def migrate_history(db_path: str, batch_rows: int = MIGRATION_BATCH_ROWS, compress: bool = True,
+                    render=format_answer, progress=None) -> dict:
+    """Convert every uncompressed HTML row, ``batch_rows`` at a time.
+
+    Each batch is its own transaction, so the app keeps working meanwhile
+    and an interrupted run just continues where it stopped next time.
+    ``progress(counts)`` is called after each batch.
+    """
+    counts = {"rows": 0, "to_text": 0, "kept_html": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = 0
+    try:
+        with sqlite3.connect(db_path, timeout=30) as conn:
+            ensure_columns(conn)
+            conn.commit()
+    except sqlite3.Error:
+        return counts
+
+    while True:
+        try:
+            with sqlite3.connect(db_path, timeout=30) as conn:
+                rows = conn.execute(
+                    "SELECT id, answer FROM history WHERE answer_format=? AND id > ? ORDER BY id LIMIT ?",
+                    (HTML, last_id, batch_rows),
+                ).fetchall()
+                if not rows:
+                    break
+                updates = []
+                for row_id, markup in rows:
+                    markup = decode_answer(markup, HTML)
+                    value, answer_format = migrate_row(markup, compress, render)
+                    updates.append((value, answer_format,
+                                    None if is_html(answer_format) else FORMATTER_VERSION, row_id))
+                    counts["rows"] += 1
+                    counts["kept_html" if is_html(answer_format) else "to_text"] += 1
+                    counts["bytes_before"] += len(markup.encode("utf-8"))
+                    counts["bytes_after"] += len(value if isinstance(value, bytes) else value.encode("utf-8"))
+                conn.executemany(
+                    "UPDATE history SET answer=?, answer_format=?, formatter_version=? WHERE id=?",
+                    updates,
+                )
+                conn.commit()
+                last_id = rows[-1][0]
+        except sqlite3.Error:
+            break
+        if progress is not None:
+            progress(dict(counts))
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Convert stored history answers from HTML to text.")
+    parser.add_argument("db", help="path to homework_history.db")
+    parser.add_argument("--batch", type=int, default=MIGRATION_BATCH_ROWS,
+                        help=f"rows per transaction (default: {MIGRATION_BATCH_ROWS})")
+    parser.add_argument("--no-compress", action="store_true", help="store text uncompressed")
+    parser.add_argument("--vacuum", action="store_true", help="reclaim the freed space afterwards")
+    args = parser.parse_args(argv)
+
+    def report(counts):
+        print(f"{counts['rows']} rows: {counts['to_text']} to text, {counts['kept_html']} kept as HTML",
+              file=sys.stderr)
+
+    counts = migrate_history(args.db, args.batch, compress=not args.no_compress, progress=report)
+    if counts["bytes_before"]:
+        print(f"Answers: {counts['bytes_before']:,} -> {counts['bytes_after']:,} bytes "
+              f"({counts['bytes_before'] / max(counts['bytes_after'], 1):.1f}x smaller)", file=sys.stderr)
+    if args.vacuum:
+        with sqlite3.connect(args.db) as conn:
+            conn.execute("VACUUM")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -100,7 +100,7 @@ def create_user(username: str, password_hash: str) -> int:
         conn.commit()
         return cur.lastrowid
 
-def save_user_history(user_id: int, subject: str, question: str, answer: str):
+def save_user_history(user_id: int, subject: str, question: str, answer: str, answer_format: str = 'html'):
     with sqlite3.connect(DB_PATH) as conn:
         cur = conn.cursor()
         cur.execute('''
@@ -113,8 +113,12 @@ def save_user_history(user_id: int, subject: str, question: str, answer: str):
                 created_at TEXT DEFAULT (datetime('now'))
             );
         ''')
-        cur.execute('INSERT INTO history (user_id, subject, question, answer) VALUES (?, ?, ?, ?)', 
-                   (user_id, subject, question, answer))
+        columns = {row[1] for row in cur.execute('PRAGMA table_info(history)')}
+        if 'answer_format' not in columns:
+            # Rows saved before the column existed hold formatted HTML
+            cur.execute("ALTER TABLE history ADD COLUMN answer_format TEXT NOT NULL DEFAULT 'html'")
+        cur.execute('INSERT INTO history (user_id, subject, question, answer, answer_format) VALUES (?, ?, ?, ?, ?)',
+                   (user_id, subject, question, answer, answer_format))
         conn.commit()
 
 def get_user_history(user_id: int, limit: int = 20):
@@ -215,8 +219,13 @@ def save_history():
     if not data or not all(k in data for k in ['subject', 'question', 'answer']):
         return {'error': 'Missing required fields: subject, question, answer'}, 400
     
+    # "html" (the old clients) or "text" (the answer as the model wrote it)
+    answer_format = data.get('answer_format', 'html')
+    if answer_format not in ('html', 'text'):
+        return {'error': 'answer_format must be "html" or "text"'}, 400
+
     try:
-        save_user_history(user_id, data['subject'], data['question'], data['answer'])
+        save_user_history(user_id, data['subject'], data['question'], data['answer'], answer_format)
         return {'ok': True, 'message': 'History saved'}, 201
     except Exception as e:
         return {'error': str(e)}, 500
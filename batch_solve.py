@@ -0,0 +1,308 @@
+"""Pre-solve a worksheet from the command line.
+
+Reads (subject, question) pairs from a JSONL or CSV file and solves them with
+the same subject prompts, model choice, length budgets, multi-part splitting,
+local equation solver, answer cache and formatted-HTML memo as the Streamlit
+app (requests are built by ``solution_request``, as in the app), so anything
+solved here is an instant cache hit in the app afterwards. Run it from the
+app's directory, with the app's settings, so it sees the same history
+database, caches and secrets.
+
+    python batch_solve.py worksheet.csv -o answers.jsonl --concurrency 8 --rate 2
+
+Each result is appended to the output JSONL as soon as it finishes. The
+output doubles as the checkpoint: running the same command again skips every
+item that already has an ``"ok"`` record and retries the rest.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import fast_solver
+import http_pool
+import openrouter
+from answer_cache import AnswerCache
+from completion_control import DEFAULT_MAX_TOKENS, LengthBudgets, trim_after_end
+from format_memo import FORMAT_MEMO_DB_PATH, FormatMemo
+from latency import percentile
+from model_router import ModelRouter, load_rules
+from question_splitter import part_question, split_parts
+from retry_policy import RetryPolicy, TokenBucket
+from similar_questions import QuestionIndex
+from solution_request import answer_max_tokens, build_request, choose_model, merged_parts
+from subjects import SUBJECTS
+
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+# The app's history database (run.py's DB_PATH)
+HISTORY_DB_PATH = "homework_history.db"
+
+# A split question's source is the costliest one any of its parts needed
+_SOURCE_ORDER = ["local", "cache", "api"]
+
+
+def load_secret(name: str) -> str | None:
+    """A setting from the environment, else from the app's secrets.toml"""
+    value = os.environ.get(name)
+    if value:
+        return value
+    try:
+        import tomllib
+        with open(SECRETS_PATH, "rb") as fh:
+            return tomllib.load(fh).get(name)
+    except (OSError, ValueError):
+        return None
+
+
+def load_setting(name: str, default):
+    """``load_secret`` cast to the default's type, like the app's ``get_setting``"""
+    value = load_secret(name)
+    if value is None:
+        return default
+    if isinstance(default, bool) and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    try:
+        return type(default)(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def item_id(index: int, subject: str, question: str) -> str:
+    """Stable id for resuming: input position plus a digest of the content"""
+    digest = hashlib.sha256(f"{subject}\n{question}".encode("utf-8")).hexdigest()[:10]
+    return f"{index}-{digest}"
+
+
+def read_items(path: str) -> list[dict]:
+    """Items from a .jsonl/.csv file with ``subject`` and ``question`` fields (``id`` optional)"""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as fh:
+            rows = list(csv.DictReader(fh))
+    else:
+        with open(path, encoding="utf-8") as fh:
+            rows = [json.loads(line) for line in fh if line.strip()]
+
+    items = []
+    for index, row in enumerate(rows):
+        subject = (row.get("subject") or "").strip()
+        question = (row.get("question") or "").strip()
+        items.append({
+            "id": str(row.get("id") or item_id(index, subject, question)),
+            "index": index,
+            "subject": subject,
+            "question": question,
+        })
+    return items
+
+
+def read_checkpoint(path: str) -> set[str]:
+    """Ids that already have a successful record in the output file"""
+    done = set()
+    try:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by an interrupted run
+                if record.get("status") == "ok":
+                    done.add(record.get("id"))
+    except OSError:
+        pass
+    return done
+
+
+class BatchSolver:
+    def __init__(self, api_key: str | None, limiter: TokenBucket, cache: AnswerCache | None,
+                 timeout: float = 60.0, retries: int = 2, memo: FormatMemo | None = None,
+                 history_db: str = HISTORY_DB_PATH):
+        self.api_key = api_key
+        self.limiter = limiter
+        self.memo = memo or FormatMemo()
+        # Waiting out a busy provider is fine for a batch, so the deadline is generous
+        self.retry = RetryPolicy(max_attempts=5, max_delay=30.0, deadline=300.0)
+        self.cache = cache
+        self.timeout = timeout
+        self.session = http_pool.build_session(retries=retries)
+        # Everything below must match the app's settings and data, or the
+        # requests (and so the cache keys) built here would differ from its own
+        self.router = ModelRouter(rules=load_rules(load_setting("MODEL_ROUTER_RULES", "")))
+        self.structured = load_setting("STRUCTURED_ANSWERS", False)
+        self.early_stop = load_setting("EARLY_STOP", True)
+        self.split_multipart = load_setting("SPLIT_MULTIPART", True)
+        self.max_tokens = load_setting("MAX_TOKENS", DEFAULT_MAX_TOKENS)
+        self.history_db = history_db
+        # Without the history database, routing and budgets fall back to their defaults
+        has_history = os.path.exists(history_db)
+        self.index = QuestionIndex(history_db) if has_history else None
+        self.budgets = LengthBudgets(
+            history_db,
+            pct=load_setting("ANSWER_LENGTH_PERCENTILE", 99.0),
+            ceiling=self.max_tokens,
+        ) if has_history else {}
+
+    def solve(self, subject: str, question: str) -> tuple[str, str, str]:
+        """Return ``(answer, source, model)``; source is local, cache or api.
+
+        Multi-part questions are solved part by part, as the app does, and
+        merged; ``model`` then lists the models the parts used.
+        """
+        if subject not in SUBJECTS:
+            raise ValueError(f"Unknown subject: {subject!r}")
+        if not question:
+            raise ValueError("Empty question")
+
+        split = split_parts(question) if self.split_multipart else None
+        if split is None:
+            return self.solve_one(subject, question)
+        stem, parts = split
+        results = [self.solve_one(subject, part_question(stem, body)) for _, body in parts]
+        answer = "".join(merged_parts(parts, [result[0] for result in results], self.structured))
+        source = max((result[1] for result in results), key=_SOURCE_ORDER.index)
+        models = ",".join(sorted({result[2] for result in results}))
+        return answer, source, models
+
+    def solve_one(self, subject: str, question: str) -> tuple[str, str, str]:
+        """``solve`` for a question that is not split"""
+        if subject == "Mathematics":
+            local_answer = fast_solver.solve(question)
+            if local_answer is not None:
+                return local_answer, "local", "local"
+
+        model = choose_model(self.router, self.index, self.history_db, subject, question)
+        request = build_request(subject, question, model,
+                                answer_max_tokens(self.budgets, subject, self.max_tokens, self.structured),
+                                structured=self.structured)
+        if self.cache is not None:
+            cached = self.cache.get(subject, question, model, request.prompt_key)
+            if cached is not None:
+                return cached, "cache", model
+
+        if not self.api_key:
+            raise RuntimeError("OPENROUTER_API_KEY is not configured")
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        # Only provider calls (including retries) count against the rate limit
+        answer = self.retry.call(
+            lambda remaining: openrouter.chat_completion(headers, request.body, timeout=min(self.timeout, remaining),
+                                                         session=self.session),
+            bucket=self.limiter,
+        )
+        if self.early_stop and not self.structured:
+            answer = trim_after_end(answer, subject)
+        if self.cache is not None:
+            self.cache.put(subject, question, model, request.prompt_key, answer)
+        return answer, "api", model
+
+    def run_item(self, item: dict) -> dict:
+        started = time.monotonic()
+        record = {"id": item["id"], "index": item["index"],
+                  "subject": item["subject"], "question": item["question"]}
+        try:
+            answer, source, model = self.solve(item["subject"], item["question"])
+        except Exception as exc:
+            record.update(status="error", error=f"{type(exc).__name__}: {exc}")
+        else:
+            record.update(status="ok", source=source, model=model,
+                          answer=answer, html=self.memo.render(answer))
+        record["latency_s"] = round(time.monotonic() - started, 3)
+        return record
+
+
+def summarize(records: list[dict], wall_seconds: float, skipped: int) -> dict:
+    latencies = [r["latency_s"] for r in records]
+    sources = {}
+    for record in records:
+        if record["status"] == "ok":
+            sources[record["source"]] = sources.get(record["source"], 0) + 1
+    return {
+        "processed": len(records),
+        "ok": sum(1 for r in records if r["status"] == "ok"),
+        "errors": sum(1 for r in records if r["status"] != "ok"),
+        "skipped": skipped,
+        "sources": sources,
+        "wall_seconds": round(wall_seconds, 2),
+        "items_per_second": round(len(records) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies) if latencies else None,
+    }
+
+
+def run_batch(items: list[dict], output: str, solver: BatchSolver, concurrency: int,
+              quiet: bool = False) -> dict:
+    done = read_checkpoint(output)
+    pending = [item for item in items if item["id"] not in done]
+    skipped = len(items) - len(pending)
+    if skipped and not quiet:
+        print(f"Resuming: {skipped} of {len(items)} items already solved", file=sys.stderr)
+
+    records = []
+    write_lock = threading.Lock()
+    started = time.monotonic()
+    with open(output, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        futures = [pool.submit(solver.run_item, item) for item in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+            records.append(record)
+            if not quiet:
+                detail = record.get("source") or record.get("error")
+                print(f"[{len(records)}/{len(pending)}] #{record['index']} {record['status']} "
+                      f"{record['latency_s']:.2f}s {detail}", file=sys.stderr)
+    return summarize(records, time.monotonic() - started, skipped)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Solve a worksheet of homework questions in bulk.")
+    parser.add_argument("input", help="JSONL or CSV file with subject and question columns")
+    parser.add_argument("-o", "--output", required=True,
+                        help="JSONL results file (appended to; also used to resume)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4,
+                        help="maximum questions solved at once (default: 4)")
+    parser.add_argument("-r", "--rate", type=float, default=2.0,
+                        help="maximum provider requests per second, 0 for unlimited (default: 2)")
+    parser.add_argument("--burst", type=int, default=1,
+                        help="requests allowed back to back before the rate applies (default: 1)")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="per-request timeout in seconds (default: 60)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="neither read nor fill the shared answer cache and HTML memo")
+    parser.add_argument("--history-db", default=HISTORY_DB_PATH,
+                        help=f"the app's history database, for routing and length budgets (default: {HISTORY_DB_PATH})")
+    parser.add_argument("--report", help="also write the summary as JSON to this path")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no per-item progress lines")
+    args = parser.parse_args(argv)
+
+    items = read_items(args.input)
+    solver = BatchSolver(
+        api_key=load_secret("OPENROUTER_API_KEY"),
+        limiter=TokenBucket(args.rate, args.burst, "batch"),
+        cache=None if args.no_cache else AnswerCache(),
+        timeout=args.timeout,
+        memo=FormatMemo(db_path=None if args.no_cache else FORMAT_MEMO_DB_PATH),
+        history_db=args.history_db,
+    )
+    summary = run_batch(items, args.output, solver, args.concurrency, quiet=args.quiet)
+
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as fh:
+            json.dump(summary, fh, indent=2)
+    return 0 if summary["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
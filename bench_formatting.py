@@ -0,0 +1,258 @@
+"""Benchmark format_response against the original regex-per-line formatter.
+
+    python bench_formatting.py --tokens 2000 --repeat 200
+    python bench_formatting.py --adversarial --chars 32000
+
+Long answers are assembled from the golden test corpus. The original
+formatter is kept here, unchanged, as the baseline; both are checked to
+produce the same HTML before timing.
+
+``--adversarial`` instead times the worst inputs we know of: lines built to
+make the fraction, power and LaTeX rules backtrack (runs of "(", "^(",
+slashes, open LaTeX groups) and single huge lines. It reports the
+worst-case time per family, and whether the answer ran over the time
+budget and fell back to plain text.
+"""
+
+import argparse
+import html
+import json
+import random
+import re
+import time
+from pathlib import Path
+
+from formatting import FORMAT_BUDGET_SECONDS, StreamingFormatter, format_response
+
+# ---- Original formatter (before the single-pass rewrite), for comparison ----
+def legacy_format_powers(text):
+    """Convert ^2, ^3, etc. to proper superscript format"""
+    # Replace common powers with superscript
+    text = re.sub(r'\^2', '<span class="power">2</span>', text)
+    text = re.sub(r'\^3', '<span class="power">3</span>', text)
+    text = re.sub(r'\^4', '<span class="power">4</span>', text)
+    text = re.sub(r'\^(\d+)', r'<span class="power">\1</span>', text)
+    text = re.sub(r'\^(\([^)]+\))', r'<span class="power">\1</span>', text)
+    # Replace sqrt(...) with √(...)
+    text = re.sub(r'\bsqrt\s*\(', '√(', text)
+    return text
+
+def legacy_format_fraction(numerator, denominator):
+    """Format a fraction with numerator over denominator in inline style"""
+    num_clean = legacy_format_powers(numerator.strip())
+    den_clean = legacy_format_powers(denominator.strip())
+
+    return f"""<div class="fraction-display">
+        <div>{num_clean}</div>
+        <div class="fraction-bar"></div>
+        <div>{den_clean}</div>
+    </div>"""
+
+def legacy_format_response(response_text):
+    """Improved formatting with consistent vertical fractions and tighter spacing.
+
+    Also formats Computer Science responses:
+    - Preserves fenced code blocks in a styled container
+    - Keeps non-code steps readable like math section
+    """
+    if not response_text:
+        return ""
+
+    # Clean up LaTeX notation to simple text but preserve fraction structure
+    response_text = re.sub(r'\\sqrt\{([^}]+)\}', r'sqrt(\1)', response_text)
+    response_text = re.sub(r'\\[a-zA-Z]+\{?([^}]*)\}?', r'\1', response_text)
+
+    # Handle fenced code blocks (```lang ... ```)
+    formatted_content = []
+    code_block_open = False
+    code_lines = []
+    code_lang = None
+
+    lines = response_text.strip().split('\n')
+    for line in lines:
+        line = line.strip()
+        if not line:
+            # Add minimal spacing between sections
+            if not code_block_open:
+                formatted_content.append("<br>")
+            continue
+
+        # Detect start/end of fenced code blocks
+        if line.startswith('```'):
+            fence = line.strip()
+            if not code_block_open:
+                # opening
+                code_block_open = True
+                code_lines = []
+                code_lang = fence.strip('`').strip() or 'text'
+            else:
+                # closing -> render and reset
+                escaped = html.escape("\n".join(code_lines))
+                formatted_content.append(
+                    f'<div class="code-block"><div class="code-header">{code_lang}</div><pre><code>{escaped}</code></pre></div>'
+                )
+                code_block_open = False
+                code_lines = []
+                code_lang = None
+            continue
+
+        if code_block_open:
+            code_lines.append(line)
+            continue
+
+        # Skip stray closing tags that may appear in the model text
+        if re.match(r'^\s*</(div|span|p)>\s*$', line):
+            continue
+
+        # Part headers of a merged multi-part answer (the text is the student's own question)
+        if re.match(r'^\*\*Part \([a-z]+\):\*\*', line):
+            part_text = re.sub(r'\*\*', '', line).strip()
+            formatted_content.append(f'<div class="part-header">{legacy_format_powers(html.escape(part_text))}</div>\n')
+
+        # One-line step headers with next-line explanation in monospace box
+        elif re.match(r'^\*\*Step \d+:', line) or re.match(r'^###\s*Step \d+:', line):
+            step_text = re.sub(r'\*\*|###', '', line).strip()
+            # Keep step title on one line
+            formatted_content.append(f'<div style="color:#4CAF50;font-weight:700;margin:0.6rem 0 0.2rem 0;">{step_text}</div>')
+            # The explanation for this step is expected on the next line; we wrap whatever comes next
+            # by inserting an opener token that the next non-empty, non-step line will close.
+            formatted_content.append('<!--STEP_CODE_NEXT-->')
+
+        # Final answer (simple one-line box, as before)
+        elif 'Final Answer' in line:
+            clean_line = re.sub(r'\*\*', '', line)
+            formatted_content.append(f'<div class="final-answer">{legacy_format_powers(clean_line)}</div>\n')
+
+        # Check for any line containing fractions - convert ALL to vertical display
+        elif '/' in line and ('(' in line or any(char in line for char in ['x', 'y', 'dx', 'dy', 'du', 'dv'])):
+            # Convert all fractions in the line to vertical display
+            # First handle complex fractions like (numerator)/(denominator) - more comprehensive pattern
+            formatted_line = re.sub(r'\(([^)]+)\)\s*/\s*\(([^)]+)\)', lambda m: legacy_format_fraction(m.group(1), m.group(2)), line)
+            # Then handle simple fractions like du/dx, dv/dx, dy/dx
+            formatted_line = re.sub(r'\b([a-zA-Z]+)/([a-zA-Z]+)\b', lambda m: legacy_format_fraction(m.group(1), m.group(2)), formatted_line)
+            # Handle any remaining fractions with parentheses - catch cases like (2x + 1) / (x² + 1)²
+            formatted_line = re.sub(r'\(([^)]+)\)\s*/\s*([^/\s]+)', lambda m: legacy_format_fraction(m.group(1), m.group(2)), formatted_line)
+            formatted_content.append(f'<div class="math-line">{legacy_format_powers(formatted_line)}</div>\n')
+
+
+
+        # If we previously saw a step header, wrap this first following line in step-code box
+        elif formatted_content and formatted_content[-1] == '<!--STEP_CODE_NEXT-->':
+            formatted_content.pop()  # remove token
+            formatted_content.append(f'<div class="step-code">{html.escape(line)}</div>')
+
+        # Mathematical expressions with equations (no fractions)
+        elif ('=' in line and any(char in line for char in ['x', '+', '-', '*', '^', '(', ')'])):
+            formatted_content.append(f'<div class="math-line">{legacy_format_powers(line)}</div>\n')
+
+        # Regular text
+        else:
+            formatted_content.append(f"{legacy_format_powers(line)}\n")
+
+    return ''.join(formatted_content)
+
+# ---- Benchmark ----
+
+
+def long_answers(tokens: int, count: int, seed: int = 0) -> list[str]:
+    """``count`` answers of about ``tokens`` tokens (four characters each) built from the corpus"""
+    corpus = json.loads((Path(__file__).parent / "test_formatting_golden.json").read_text(encoding="utf-8"))
+    pieces = [case["input"] for case in corpus if case["input"].strip()]
+    rng = random.Random(seed)
+    answers = []
+    for _ in range(count):
+        parts, size = [], 0
+        while size < tokens * 4:
+            piece = rng.choice(pieces)
+            parts.append(piece)
+            size += len(piece) + 2
+        answers.append("\n\n".join(parts))
+    return answers
+
+
+def best_of(fn, answers, repeat: int) -> float:
+    """Best per-answer time in seconds over ``repeat`` passes"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for answer in answers:
+            fn(answer)
+        best = min(best, (time.perf_counter() - start) / len(answers))
+    return best
+
+
+# Each builds one line of about n characters
+ADVERSARIAL = {
+    "open parens": lambda n: "x/" + "(" * n,
+    "open parens, one close": lambda n: "x/" + "(" * n + ")",
+    "paren over term": lambda n: "(a" * (n // 2) + ")/",
+    "paren fractions": lambda n: "(a)/" * (n // 4),
+    "open powers": lambda n: "x/y ^(" * (n // 6),
+    "slashes": lambda n: "x" + "/" * n,
+    "word fractions": lambda n: "ab/" * (n // 3),
+    "sqrt calls": lambda n: "x/y sqrt(" * (n // 9),
+    "open latex sqrt": lambda n: "\\sqrt{" * (n // 6),
+    "open latex groups": lambda n: "\\a{" * (n // 3),
+    "huge equation": lambda n: "x = " + "ab+(c)/d " * (n // 9),
+    "deep nesting": lambda n: "(" * (n // 2) + "x/y" + ")" * (n // 2),
+}
+
+
+def adversarial(chars: int, lines: int, repeat: int, legacy_max_chars: int) -> int:
+    """Worst time per family for ``lines`` lines of ``chars`` characters"""
+    print(f"{lines} line(s) of ~{chars:,} characters, worst of {repeat}, budget {FORMAT_BUDGET_SECONDS}s")
+    for name, build in ADVERSARIAL.items():
+        answer = "\n".join([build(chars)] * lines)
+        worst = 0.0
+        for _ in range(repeat):
+            formatter = StreamingFormatter()
+            start = time.perf_counter()
+            formatter.feed(answer)
+            formatter.finish()
+            worst = max(worst, time.perf_counter() - start)
+        line = f"  {name:24} {worst * 1000:9.2f} ms"
+        if formatter.over_budget:
+            line += "  (over budget: plain text)"
+        if chars <= legacy_max_chars:
+            start = time.perf_counter()
+            legacy_format_response(answer)
+            line += f"   original {(time.perf_counter() - start) * 1000:9.2f} ms"
+        print(line)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time format_response against the original formatter.")
+    parser.add_argument("--tokens", type=int, default=2000, help="approximate answer length (default: 2000)")
+    parser.add_argument("--answers", type=int, default=20, help="answers per pass (default: 20)")
+    parser.add_argument("--repeat", type=int, default=50, help="timed passes; the best is reported (default: 50)")
+    parser.add_argument("--adversarial", action="store_true",
+                        help="time pathological inputs instead of realistic answers")
+    parser.add_argument("--chars", type=int, default=32000,
+                        help="adversarial line length (default: 32000)")
+    parser.add_argument("--lines", type=int, default=1, help="adversarial lines per answer (default: 1)")
+    parser.add_argument("--legacy-max-chars", type=int, default=8000,
+                        help="also time the original formatter up to this line length; it is "
+                             "quadratic on some families (default: 8000)")
+    args = parser.parse_args(argv)
+
+    if args.adversarial:
+        return adversarial(args.chars, args.lines, min(args.repeat, 5), args.legacy_max_chars)
+
+    answers = long_answers(args.tokens, args.answers)
+    for answer in answers:
+        if format_response(answer) != legacy_format_response(answer):
+            print("Output differs from the original formatter")
+            return 1
+
+    old = best_of(legacy_format_response, answers, args.repeat)
+    new = best_of(format_response, answers, args.repeat)
+    print(f"{args.answers} answers of ~{args.tokens} tokens, best of {args.repeat} passes")
+    print(f"  original:    {old * 1000:8.3f} ms/answer")
+    print(f"  single-pass: {new * 1000:8.3f} ms/answer")
+    print(f"  speedup:     {old / new:8.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,182 @@
+"""Per-model circuit breakers for provider calls.
+
+Each model gets a breaker that watches a rolling window of outcomes. When the
+error rate crosses a threshold the breaker opens and calls fail immediately
+instead of every user waiting out a full timeout during a provider
+brownout. After a cool-down a few probe calls are let through (half-open);
+a successful probe closes the breaker again.
+
+The same window provides latency percentiles, which replace fixed timeouts:
+a request is allowed roughly ``p99 * headroom`` before it is abandoned.
+Whole replies, whole streams and times to first token are kept as separate
+series, since a streamed answer takes far longer than a short reply.
+"""
+
+import threading
+import time
+from collections import deque
+
+from latency import percentile
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Latency series: non-streamed replies, whole streams, streams' first tokens
+TOTAL = "total"
+STREAM = "stream"
+FIRST_TOKEN = "first_token"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} is unavailable, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, window_seconds: float = 60.0, min_requests: int = 5,
+                 error_threshold: float = 0.5, open_seconds: float = 30.0,
+                 half_open_probes: int = 1, latency_samples: int = 200, clock=time.monotonic):
+        self.name = name
+        self.clock = clock
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_threshold = error_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._outcomes = deque()  # (timestamp, ok)
+        self._latencies = {kind: deque(maxlen=latency_samples) for kind in (TOTAL, STREAM, FIRST_TOKEN)}
+
+    # ---- state machine ----
+    def _prune(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return failures / len(self._outcomes)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def before_call(self) -> None:
+        """Raise ``CircuitOpenError`` if the call must not go out."""
+        with self._lock:
+            now = self.clock()
+            if self._state == OPEN:
+                waited = now - self._opened_at
+                if waited < self.open_seconds:
+                    raise CircuitOpenError(self.name, self.open_seconds - waited)
+                self._state = HALF_OPEN
+                self._probes_in_flight = 0
+            if self._state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    raise CircuitOpenError(self.name, self.open_seconds)
+                self._probes_in_flight += 1
+
+    def record_success(self, latency: float | None = None, kind: str = TOTAL) -> None:
+        with self._lock:
+            now = self.clock()
+            self._outcomes.append((now, True))
+            self._prune(now)
+            if latency is not None:
+                self._latencies[kind].append(latency)
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+                self._probes_in_flight = 0
+
+    def record_latency(self, latency: float, kind: str = FIRST_TOKEN) -> None:
+        """Latency sample that is not an outcome on its own (e.g. time to first token)."""
+        with self._lock:
+            self._latencies[kind].append(latency)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            now = self.clock()
+            self._outcomes.append((now, False))
+            self._prune(now)
+            if self._state == HALF_OPEN:
+                self._trip(now)
+            elif (len(self._outcomes) >= self.min_requests
+                  and self._error_rate() >= self.error_threshold):
+                self._trip(now)
+
+    def _trip(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._probes_in_flight = 0
+
+    # ---- adaptive timeouts ----
+    def timeout(self, default: float, kind: str = TOTAL, headroom: float = 1.5,
+                floor: float = 5.0, ceiling: float | None = None, min_samples: int = 20) -> float:
+        """``p99 * headroom`` clamped to [floor, ceiling]; ``default`` until enough samples."""
+        with self._lock:
+            samples = list(self._latencies[kind])
+        if len(samples) < min_samples:
+            return default
+        derived = percentile(samples, 99) * headroom
+        return min(max(derived, floor), ceiling if ceiling is not None else default)
+
+    def snapshot(self) -> dict:
+        state = self.state
+        with self._lock:
+            self._prune(self.clock())
+            total = list(self._latencies[TOTAL])
+            streamed = list(self._latencies[STREAM])
+            first = list(self._latencies[FIRST_TOKEN])
+            return {
+                "state": state,
+                "requests": len(self._outcomes),
+                "error_rate": self._error_rate(),
+                "p50": percentile(total, 50),
+                "p95": percentile(total, 95),
+                "p99": percentile(total, 99),
+                "stream_p95": percentile(streamed, 95),
+                "stream_p99": percentile(streamed, 99),
+                "first_token_p99": percentile(first, 99),
+            }
+
+
+class BreakerRegistry:
+    """One breaker per model, created on first use with shared settings."""
+
+    def __init__(self, **settings):
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, **self._settings)
+                self._breakers[name] = breaker
+            return breaker
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.snapshot() for name, breaker in breakers.items()}
+
+
+def is_provider_failure(exc: Exception) -> bool:
+    """Errors that say something about provider health (not our own bad input)."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        return True
+    return status == 429 or status >= 500
@@ -0,0 +1,155 @@
+"""Stop completions once the required answer structure is complete, and size them.
+
+Every subject prompt ends the answer with "**Final Answer:**" plus a short
+result (Computer Science: "**Complete Code**" plus one fenced block). Models
+sometimes keep going after that with recaps and offers of further help,
+which costs generation time and tokens. ``stop_at_end`` watches a stream
+and, once the final section is complete, stops reading; closing the upstream
+generator drops the connection, so OpenRouter stops generating.
+
+``LengthBudgets`` derives a per-subject ``max_tokens`` from the lengths of
+stored text answers in ``history`` instead of the flat 2000, which bounds the
+long tail of runaway answers. Structured (JSON) answers are left out of it
+and requested with the flat limit (see ``solution_request.answer_max_tokens``).
+"""
+
+import re
+import sqlite3
+import threading
+import time
+
+from answer_storage import answer_text
+from latency import percentile
+from structured_answers import parse_answer
+
+DEFAULT_MAX_TOKENS = 2000
+
+# "**Final Answer:**" (or "**Final Answer**:") at the start of a line
+_FINAL_ANSWER = re.compile(r"(?m)^[ \t]*\*\*Final Answer:?\*\*:?")
+_COMPLETE_CODE = re.compile(r"(?m)^[ \t]*\*\*Complete Code:?\*\*:?")
+_FENCE_OPEN = re.compile(r"(?m)^[ \t]*```[^\n]*\n")
+_FENCE_CLOSE = re.compile(r"(?m)^[ \t]*```[ \t]*(?:\n|$)")
+_BLANK_LINE = re.compile(r"\n[ \t]*\n")
+
+
+def answer_end(text: str, subject: str, final: bool = False) -> int | None:
+    """Index where the answer's closing section ends, or None if it is not complete yet.
+
+    ``final`` means no more text will arrive, so a closing fence at the very
+    end counts; mid-stream the fence line must be finished first.
+    """
+    if subject == "Computer Science":
+        marker = _COMPLETE_CODE.search(text)
+        if not marker:
+            return None
+        opening = _FENCE_OPEN.search(text, marker.end())
+        if not opening:
+            return None
+        closing = _FENCE_CLOSE.search(text, opening.end())
+        if not closing or (not final and not closing.group().endswith("\n")):
+            return None
+        return closing.end() - (1 if closing.group().endswith("\n") else 0)
+
+    marker = _FINAL_ANSWER.search(text)
+    if not marker:
+        return None
+    # The result itself may start on the marker's line or the next one
+    content = re.search(r"\S", text[marker.end():])
+    if not content:
+        return None
+    blank = _BLANK_LINE.search(text, marker.end() + content.start())
+    return blank.start() if blank else None
+
+
+def trim_after_end(text: str, subject: str) -> str:
+    """Drop anything written after the closing section of a finished answer"""
+    end = answer_end(text, subject, final=True)
+    return text if end is None else text[:end]
+
+
+def stop_at_end(chunks, subject: str):
+    """Yield ``chunks`` up to the end of the answer's closing section, then stop.
+
+    Trailing whitespace is held back until the next chunk shows whether it
+    belongs to the answer. The upstream generator is closed on the way out,
+    which closes its HTTP response.
+    """
+    text = ""
+    sent = 0
+    try:
+        for chunk in chunks:
+            text += chunk
+            end = answer_end(text, subject)
+            if end is not None:
+                if end > sent:
+                    yield text[sent:end]
+                return
+            ready = len(text.rstrip())
+            if ready > sent:
+                yield text[sent:ready]
+                sent = ready
+        if len(text) > sent:
+            yield text[sent:]
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def length_budgets(db_path: str, pct: float = 99, headroom: float = 1.25,
+                   floor: int = 600, ceiling: int = DEFAULT_MAX_TOKENS,
+                   min_samples: int = 30, scan_rows: int = 5000) -> dict[str, int]:
+    """``max_tokens`` per subject: the ``pct`` percentile answer length plus headroom.
+
+    Lengths are estimated at four characters per token. Subjects with fewer
+    than ``min_samples`` stored answers are left out (callers use the
+    default); results are clamped to ``[floor, ceiling]``, so the budget only
+    ever tightens the old flat limit.
+    """
+    try:
+        with sqlite3.connect(db_path, timeout=5) as conn:
+            rows = conn.execute(
+                "SELECT subject, answer, answer_format FROM history ORDER BY id DESC LIMIT ?", (scan_rows,)
+            ).fetchall()
+    except sqlite3.Error:
+        return {}
+
+    lengths = {}
+    for subject, answer, answer_format in rows:
+        text = answer_text(answer, answer_format)
+        if text.startswith("{") and parse_answer(text) is not None:
+            continue  # JSON is much longer for the same content
+        tokens = (len(text) + 3) // 4
+        if tokens:
+            lengths.setdefault(subject, []).append(tokens)
+
+    budgets = {}
+    for subject, values in lengths.items():
+        if len(values) < min_samples:
+            continue
+        budgets[subject] = int(min(max(percentile(values, pct) * headroom, floor), ceiling))
+    return budgets
+
+
+class LengthBudgets:
+    """``length_budgets`` recomputed at most every ``refresh_seconds``; thread-safe."""
+
+    def __init__(self, db_path: str, refresh_seconds: float = 3600, **options):
+        self.db_path = db_path
+        self.refresh_seconds = refresh_seconds
+        self.options = options
+        self._lock = threading.Lock()
+        self._budgets = {}
+        self._computed_at = None
+
+    def get(self, subject: str, default: int = DEFAULT_MAX_TOKENS) -> int:
+        with self._lock:
+            now = time.monotonic()
+            if self._computed_at is None or now - self._computed_at > self.refresh_seconds:
+                self._budgets = length_budgets(self.db_path, **self.options)
+                self._computed_at = now
+            return self._budgets.get(subject, default)
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._budgets)
@@ -0,0 +1,257 @@
+"""Follow-up conversations with a bounded prompt.
+
+A thread is the questions and answers of one student in one subject. A
+follow-up ("why does step 2 work?") is sent with the thread's most recent
+turns verbatim and everything older folded into one cached summary, so it
+costs a bounded number of prompt tokens however long the thread gets,
+instead of a re-pasted problem plus the previous answer.
+
+``build_context`` is pure: it picks the turns that fit the token budget and
+reports the older turns the stored summary does not cover yet. The app
+summarizes those in the background after an answer is shown, so follow-ups
+never wait for a summary.
+"""
+
+import sqlite3
+import threading
+import time
+
+# Same database as the history the threads start from
+CONVERSATIONS_DB_PATH = "homework_history.db"
+
+# Tokens of earlier conversation sent with a follow-up, summary included
+DEFAULT_CONTEXT_BUDGET = 1200
+
+# The last question and answer always go along verbatim (clipped if huge)
+MIN_RECENT_TURNS = 2
+
+# Turns loaded per thread; anything older is covered by the summary
+MAX_LOADED_TURNS = 200
+
+SUMMARY_MAX_TOKENS = 250
+
+SUMMARY_PROMPT = (
+    "You summarize a tutoring conversation so the tutor can answer the student's next "
+    "follow-up question without the full transcript. Keep the original problem, all "
+    "given values, definitions and intermediate results, the final answers, and what "
+    "the student found confusing. Use at most {words} words. Write plain text, no preamble."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)"""
+    return (len(text or "") + 3) // 4
+
+
+def clip_text(text: str, max_tokens: int) -> str:
+    """Shorten ``text`` to about ``max_tokens``, keeping its start and its end"""
+    max_chars = max(max_tokens, 1) * 4
+    if len(text) <= max_chars:
+        return text
+    marker = "\n[…]\n"
+    head = (max_chars - len(marker)) * 2 // 3
+    tail = max(max_chars - len(marker) - head, 0)
+    return f"{text[:head].rstrip()}{marker}{text[len(text) - tail:].lstrip()}"
+
+
+def _message(turn: dict, content: str | None = None) -> dict:
+    return {"role": turn["role"], "content": turn["content"] if content is None else content}
+
+
+def build_context(turns: list[dict], summary: tuple[int, str] | None = None,
+                  budget: int = DEFAULT_CONTEXT_BUDGET) -> tuple[list[dict], list[dict]]:
+    """Chat messages standing in for ``turns``, and the turns still to be summarized.
+
+    ``turns`` are oldest first, each with ``id``, ``role``, ``content`` and
+    ``tokens``; ``summary`` is ``(upto_turn_id, text)``. If everything fits
+    the budget the turns go verbatim. Otherwise the newest turns that fit are
+    kept verbatim, the summary stands in for the turns it covers, and older
+    turns it does not cover yet are returned so the caller can fold them in;
+    until then they are sent as short excerpts if there is room.
+    """
+    if sum(turn["tokens"] for turn in turns) <= budget:
+        return [_message(turn) for turn in turns], []
+
+    upto, summary_text = summary or (0, "")
+    remaining = budget - estimate_tokens(summary_text)
+
+    kept = []
+    for turn in reversed(turns):
+        forced = len(kept) < MIN_RECENT_TURNS
+        if forced:
+            # Share what is left between the turns that must go along
+            share = max(remaining // (MIN_RECENT_TURNS - len(kept)), 32)
+            content = clip_text(turn["content"], share)
+        elif turn["tokens"] <= remaining:
+            content = turn["content"]
+        else:
+            break
+        kept.append(_message(turn, content))
+        remaining -= estimate_tokens(content)
+    kept.reverse()
+
+    dropped = turns[:len(turns) - len(kept)]
+    stale = [turn for turn in dropped if turn["id"] > upto]
+
+    messages = []
+    if summary_text and len(stale) < len(dropped):
+        messages.append({"role": "system",
+                         "content": f"Summary of the earlier conversation:\n{summary_text}"})
+    excerpts = []
+    for turn in stale:
+        if remaining < 16:
+            break
+        content = clip_text(turn["content"], min(remaining, 120))
+        excerpts.append(_message(turn, content))
+        remaining -= estimate_tokens(content)
+    return messages + excerpts + kept, stale
+
+
+def summary_messages(subject: str, previous: str, turns: list[dict],
+                     max_tokens: int = SUMMARY_MAX_TOKENS) -> list[dict]:
+    """Prompt that folds ``turns`` into the ``previous`` summary"""
+    transcript = "\n\n".join(
+        f"{'Student' if turn['role'] == 'user' else 'Tutor'}: {turn['content']}" for turn in turns
+    )
+    parts = [f"Subject: {subject}"]
+    if previous:
+        parts.append(f"Summary so far:\n{previous}")
+    parts.append(f"Conversation to add:\n{transcript}")
+    return [
+        {"role": "system", "content": SUMMARY_PROMPT.format(words=max_tokens * 3 // 4)},
+        {"role": "user", "content": "\n\n".join(parts)},
+    ]
+
+
+class ConversationStore:
+    """Threads, turns and summaries in SQLite.
+
+    Like the answer cache, ``sqlite3.Error`` is swallowed everywhere: a lost
+    turn only means a follow-up is answered with less context.
+    """
+
+    def __init__(self, db_path: str = CONVERSATIONS_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self) -> None:
+        try:
+            with self._connect() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS conversation_threads (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_key TEXT NOT NULL,
+                        subject TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                """)
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS conversation_turns (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        thread_id INTEGER NOT NULL,
+                        role TEXT NOT NULL,
+                        content TEXT NOT NULL,
+                        tokens INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        FOREIGN KEY (thread_id) REFERENCES conversation_threads (id)
+                    )
+                """)
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS conversation_summaries (
+                        thread_id INTEGER PRIMARY KEY,
+                        upto_turn_id INTEGER NOT NULL,
+                        summary TEXT NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                """)
+                cur.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_conversation_threads_user "
+                    "ON conversation_threads (user_key, subject, updated_at)"
+                )
+                cur.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_conversation_turns_thread "
+                    "ON conversation_turns (thread_id, id)"
+                )
+                conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def create_thread(self, user_key: str, subject: str) -> int | None:
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                cur = conn.execute(
+                    "INSERT INTO conversation_threads (user_key, subject, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (user_key, subject, now, now),
+                )
+                conn.commit()
+                return cur.lastrowid
+        except sqlite3.Error:
+            return None
+
+    def add_turns(self, thread_id: int, turns: list[tuple[str, str]]) -> None:
+        """Append ``(role, content)`` pairs to a thread"""
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                conn.executemany(
+                    "INSERT INTO conversation_turns (thread_id, role, content, tokens, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(thread_id, role, content, estimate_tokens(content), now) for role, content in turns],
+                )
+                conn.execute("UPDATE conversation_threads SET updated_at=? WHERE id=?", (now, thread_id))
+                conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def turns(self, thread_id: int) -> list[dict]:
+        """The thread's most recent turns, oldest first"""
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT id, role, content, tokens FROM conversation_turns "
+                    "WHERE thread_id=? ORDER BY id DESC LIMIT ?",
+                    (thread_id, MAX_LOADED_TURNS),
+                ).fetchall()
+        except sqlite3.Error:
+            return []
+        return [{"id": r[0], "role": r[1], "content": r[2], "tokens": r[3]} for r in reversed(rows)]
+
+    def summary(self, thread_id: int) -> tuple[int, str] | None:
+        """``(upto_turn_id, text)`` of the thread's cached summary"""
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT upto_turn_id, summary FROM conversation_summaries WHERE thread_id=?",
+                    (thread_id,),
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        return (row[0], row[1]) if row else None
+
+    def save_summary(self, thread_id: int, upto_turn_id: int, summary: str) -> None:
+        """Store a summary unless one covering more turns is already there"""
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    """
+                    INSERT INTO conversation_summaries (thread_id, upto_turn_id, summary, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (thread_id) DO UPDATE SET
+                        upto_turn_id=excluded.upto_turn_id,
+                        summary=excluded.summary,
+                        updated_at=excluded.updated_at
+                    WHERE excluded.upto_turn_id > conversation_summaries.upto_turn_id
+                    """,
+                    (thread_id, upto_turn_id, summary, time.time()),
+                )
+                conn.commit()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,274 @@
+"""Local solver for simple linear and quadratic equations.
+
+Questions such as "Solve: 3x² - 12x + 9 = 0" or "solve for x: 5x - 2 = 3x + 6"
+are solved deterministically and written in the same "**Step N:** ...
+**Final Answer:**" layout the Mathematics prompt asks the model for, so
+``format_response`` renders them exactly like an LLM answer. Anything that is
+not a single-variable polynomial equation of degree 1 or 2 returns None and
+goes to the LLM as before, and so does an assignment such as "a = 5", which
+has nothing to solve.
+"""
+
+import math
+import re
+from fractions import Fraction
+
+_SYMBOLS = str.maketrans({
+    "²": "^2", "¹": "^1", "−": "-", "–": "-", "×": "*", "·": "*",
+})
+
+# Words allowed in front of the equation ("Solve for x:", "Find the roots of")
+_PREFIX_WORDS = {
+    "solve", "find", "for", "the", "equation", "value", "values", "of", "root",
+    "roots", "please", "calculate", "determine", "and", "check", "compute",
+}
+
+_TERM = re.compile(r"^([+-])(\d+(?:\.\d+)?)?\*?([a-z])?(?:\^(\d+))?$")
+
+
+def _parse_side(side: str, variable: str | None) -> tuple[dict[int, Fraction], str | None] | None:
+    """Parse ``3x^2-12x+9`` into ``{2: 3, 1: -12, 0: 9}``; None if unsupported."""
+    side = side.replace(" ", "")
+    if not side:
+        return None
+    if side[0] not in "+-":
+        side = "+" + side
+    coeffs = {0: Fraction(0), 1: Fraction(0), 2: Fraction(0)}
+    for term in re.findall(r"[+-][^+-]*", side):
+        match = _TERM.match(term)
+        if not match:
+            return None
+        sign, number, var, power = match.groups()
+        if number is None and var is None:
+            return None
+        if var is None and power is not None:
+            return None
+        if var is not None:
+            if variable is not None and var != variable:
+                return None
+            variable = var
+        degree = 0 if var is None else int(power or 1)
+        if degree > 2:
+            return None
+        value = Fraction(number) if number is not None else Fraction(1)
+        coeffs[degree] += -value if sign == "-" else value
+    return coeffs, variable
+
+
+def parse_equation(question: str) -> tuple[Fraction, Fraction, Fraction, str] | None:
+    """Return ``(a, b, c, variable)`` for ``a*v^2 + b*v + c = 0``, or None."""
+    text = (question or "").translate(_SYMBOLS).strip().rstrip(".?!").strip()
+    if text.count("=") != 1 or len(text) > 200:
+        return None
+    words = text.replace(":", " : ").replace(",", " , ").split()
+    # Try every split point: "<instruction words> <equation>"
+    for split in range(len(words)):
+        prefix = [w.lower() for w in words[:split] if w not in (":", ",")]
+        if any(w not in _PREFIX_WORDS and not re.fullmatch(r"[a-z]", w) for w in prefix):
+            break
+        equation = " ".join(w for w in words[split:] if w != ",").lstrip(": ").lower()
+        if not equation or "=" not in equation:
+            continue
+        left, right = equation.split("=")
+        parsed_left = _parse_side(left, None)
+        if not parsed_left:
+            continue
+        parsed_right = _parse_side(right, parsed_left[1])
+        if not parsed_right:
+            continue
+        variable = parsed_right[1]
+        if variable is None:
+            return None
+        # A single letter in the prefix ("solve for x") must be the variable
+        letters = [w for w in prefix if len(w) == 1]
+        if letters and letters[-1] != variable:
+            return None
+        # "a = 5" (or "5 = a") gives a value rather than asking for one
+        for bare, other in ((parsed_left[0], parsed_right[0]), (parsed_right[0], parsed_left[0])):
+            if bare == {2: 0, 1: 1, 0: 0} and other[1] == other[2] == 0:
+                return None
+        a = parsed_left[0][2] - parsed_right[0][2]
+        b = parsed_left[0][1] - parsed_right[0][1]
+        c = parsed_left[0][0] - parsed_right[0][0]
+        if a == 0 and b == 0:
+            return None
+        return a, b, c, variable
+    return None
+
+
+def _num(value: Fraction) -> str:
+    if value.denominator == 1:
+        return str(value.numerator)
+    return f"{value.numerator}/{value.denominator}"
+
+
+def _paren(value: Fraction) -> str:
+    text = _num(value)
+    return f"({text})" if value < 0 or "/" in text else text
+
+
+def _plus_minus(minus_b: Fraction, disc: Fraction) -> str:
+    """``-b ± sqrt(D)`` without a leading ``0`` when b is zero."""
+    if minus_b == 0:
+        return f"± sqrt({_num(disc)})"
+    return f"{_num(minus_b)} ± sqrt({_num(disc)})"
+
+
+def _square_part(n: int, limit: int = 10 ** 4) -> tuple[int, int]:
+    """``(k, m)`` with ``n == k*k*m``, taking out square factors up to ``limit``"""
+    k, m = 1, n
+    factor = 2
+    while factor <= limit and factor * factor <= m:
+        while m % (factor * factor) == 0:
+            m //= factor * factor
+            k *= factor
+        factor += 1
+    return k, m
+
+
+def _surd(coeff: Fraction, m: int, unit: str = "") -> str:
+    """``coeff * unit * √m`` written compactly: "√2", "3√5/2", "2i", "i√3" """
+    numerator = "" if coeff.numerator == 1 and (unit or m != 1) else str(coeff.numerator)
+    text = numerator + unit + (f"√{m}" if m != 1 else "")
+    return text + (f"/{coeff.denominator}" if coeff.denominator != 1 else "")
+
+
+def _roots(centre: Fraction, offset: str) -> tuple[str, str]:
+    """``centre ± offset`` as two root strings"""
+    if centre == 0:
+        return offset, f"-{offset}"
+    return f"{_num(centre)} + {offset}", f"{_num(centre)} - {offset}"
+
+
+def _decimal(value: float) -> str:
+    return f"{value:.4g}"
+
+
+def _poly(a: Fraction, b: Fraction, c: Fraction, v: str) -> str:
+    parts = []
+    for coeff, suffix in ((a, f"{v}^2"), (b, v), (c, "")):
+        if coeff == 0:
+            continue
+        magnitude = abs(coeff)
+        body = _num(magnitude) if (suffix == "" or magnitude != 1) else ""
+        if "/" in body and suffix:
+            body = f"({body})"
+        term = f"{body}{suffix}"
+        if not parts:
+            parts.append(f"-{term}" if coeff < 0 else term)
+        else:
+            parts.append(f"- {term}" if coeff < 0 else f"+ {term}")
+    return " ".join(parts) or "0"
+
+
+def _solve_linear(b: Fraction, c: Fraction, v: str) -> str:
+    root = -c / b
+    lines = [
+        "**Step 1:** Write the equation in standard form",
+        "Move every term to the left-hand side and combine like terms.",
+        f"{_poly(Fraction(0), b, c, v)} = 0",
+        "",
+        f"**Step 2:** Isolate the {v} term",
+        "Move the constant to the right-hand side.",
+        f"{_poly(Fraction(0), b, Fraction(0), v)} = {_num(-c)}",
+        "",
+        f"**Step 3:** Divide both sides by {_num(b)}",
+        f"This leaves {v} on its own.",
+        f"{v} = {_num(root)}",
+        "",
+        f"**Final Answer:** {v} = {_num(root)}",
+    ]
+    if root.denominator != 1:
+        lines[-1] += f" ≈ {_decimal(float(root))}"
+    return "\n".join(lines)
+
+
+def _solve_quadratic(a: Fraction, b: Fraction, c: Fraction, v: str) -> str:
+    disc = b * b - 4 * a * c
+    lines = [
+        "**Step 1:** Write the equation in standard form",
+        "Move every term to the left-hand side and combine like terms.",
+        f"{_poly(a, b, c, v)} = 0",
+        "",
+        "**Step 2:** Identify the coefficients",
+        f"Compare with a{v}^2 + b{v} + c = 0.",
+        f"a = {_num(a)}, b = {_num(b)}, c = {_num(c)}",
+        "",
+        "**Step 3:** Compute the discriminant",
+        "The discriminant tells us how many real solutions there are.",
+        "D = b^2 - 4ac",
+        f"D = {_paren(b)}^2 - 4*{_paren(a)}*{_paren(c)} = {_num(disc)}",
+        "",
+        "**Step 4:** Apply the quadratic formula",
+        "Substitute a, b and D into the formula.",
+        f"{v} = (-b ± sqrt(D))/(2a)",
+        f"{v} = ({_plus_minus(-b, disc)})/({_num(2 * a)})",
+        "",
+    ]
+
+    if disc == 0:
+        root = -b / (2 * a)
+        lines += [f"**Final Answer:** {v} = {_num(root)} (repeated root)"]
+        return "\n".join(lines)
+
+    if disc > 0:
+        num_root = math.isqrt(disc.numerator)
+        den_root = math.isqrt(disc.denominator)
+        if num_root * num_root == disc.numerator and den_root * den_root == disc.denominator:
+            sqrt_disc = Fraction(num_root, den_root)
+            r1 = (-b + sqrt_disc) / (2 * a)
+            r2 = (-b - sqrt_disc) / (2 * a)
+            lines += [
+                "**Step 5:** Evaluate both roots",
+                f"D is a perfect square, so sqrt(D) = {_num(sqrt_disc)}.",
+                f"{v} = {_num(r1)} or {v} = {_num(r2)}",
+                "",
+                f"**Final Answer:** {v} = {_num(r1)} or {v} = {_num(r2)}",
+            ]
+            return "\n".join(lines)
+    # sqrt(p/q) = sqrt(p*q)/q = (k/q)*sqrt(m) with m square-free
+    k, m = _square_part(abs(disc.numerator) * disc.denominator)
+    centre = -b / (2 * a)
+    half_width = abs(Fraction(k, disc.denominator) / (2 * a))
+    sqrt_text = _surd(Fraction(k, disc.denominator), m)
+
+    if disc > 0:
+        exact = _surd(half_width, m)
+        sqrt_disc = math.sqrt(disc)
+        r1 = (float(-b) + sqrt_disc) / float(2 * a)
+        r2 = (float(-b) - sqrt_disc) / float(2 * a)
+        lines += [
+            "**Step 5:** Simplify the square root",
+            f"D is not a perfect square: sqrt({_num(disc)}) = {sqrt_text}, then divide through by {_num(2 * a)}.",
+            f"{v} = {'±' if centre == 0 else _num(centre) + ' ± '}{exact}",
+            "",
+            "**Step 6:** Evaluate both roots",
+            "The roots are irrational; round to 4 significant figures.",
+            f"{v} ≈ {_decimal(r1)} or {v} ≈ {_decimal(r2)}",
+            "",
+            f"**Final Answer:** {v} = {'±' if centre == 0 else _num(centre) + ' ± '}{exact}, "
+            f"i.e. {v} ≈ {_decimal(r1)} or {v} ≈ {_decimal(r2)}",
+        ]
+        return "\n".join(lines)
+
+    first, second = _roots(centre, _surd(half_width, m, unit="i"))
+    lines += [
+        "**Step 5:** Interpret the negative discriminant",
+        "D < 0, so there are no real solutions; the roots are complex conjugates.",
+        f"sqrt({_num(disc)}) = {_surd(Fraction(k, disc.denominator), m, unit='i')}",
+        f"{v} = {first} or {v} = {second}",
+        "",
+        f"**Final Answer:** No real solutions; {v} = {first} or {v} = {second}",
+    ]
+    return "\n".join(lines)
+
+
+def solve(question: str) -> str | None:
+    """Step-by-step solution text, or None if the question is out of scope."""
+    parsed = parse_equation(question)
+    if parsed is None:
+        return None
+    a, b, c, variable = parsed
+    if a == 0:
+        return _solve_linear(b, c, variable)
+    return _solve_quadratic(a, b, c, variable)
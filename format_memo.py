@@ -0,0 +1,176 @@
+"""Memo of formatted answer HTML, keyed by a hash of the raw answer text.
+
+The same answer is rendered many times: every answer-cache hit, every
+pre-solved example, and every batch run over a worksheet the app has
+already seen. ``FormatMemo`` keeps the HTML in a small in-memory LRU and,
+optionally, in a SQLite table that outlives the process.
+
+Keys are a SHA-256 of the text plus ``MEMO_VERSION`` (``FORMATTER_VERSION``
+and ``STRUCTURED_RENDERER_VERSION``), so bumping either retires every stored
+rendering; rows written by another version are
+deleted when the disk store is opened.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from formatting import FORMATTER_VERSION, is_plain_fallback
+from structured_answers import STRUCTURED_RENDERER_VERSION, format_answer
+
+# Lives next to answer_cache.db (relative to the app's cwd)
+FORMAT_MEMO_DB_PATH = "format_memo.db"
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_DISK_ENTRIES = 20000
+
+# format_answer renders with both formatting.py and structured_answers.py
+MEMO_VERSION = f"{FORMATTER_VERSION}.{STRUCTURED_RENDERER_VERSION}"
+
+
+def content_key(text: str, version: str = MEMO_VERSION) -> str:
+    return hashlib.sha256(f"{version}\n{text}".encode("utf-8")).hexdigest()
+
+
+class FormatMemo:
+    """LRU of ``render(text)`` results with an optional SQLite second level.
+
+    Like ``AnswerCache``, disk errors are swallowed: the memo then just
+    degrades to rendering again.
+    """
+
+    def __init__(self, render=format_answer, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 db_path: str | None = None, max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES,
+                 version: str = MEMO_VERSION):
+        self.render_fn = render
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self.version = version
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._counts = {"hits": 0, "disk_hits": 0, "misses": 0}
+        if db_path:
+            self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self) -> None:
+        try:
+            with self._connect() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS format_memo (
+                        content_key TEXT PRIMARY KEY,
+                        version TEXT NOT NULL,
+                        html TEXT NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                """)
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_format_memo_last_access "
+                    "ON format_memo (last_access)"
+                )
+                conn.execute("DELETE FROM format_memo WHERE version != ?", (self.version,))
+                conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def _remember(self, key: str, html: str) -> None:
+        self._entries[key] = html
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, text: str) -> str | None:
+        """The stored HTML for ``text``, or None"""
+        key = content_key(text, self.version)
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self._counts["hits"] += 1
+                return html
+            if self.db_path:
+                try:
+                    with self._connect() as conn:
+                        row = conn.execute(
+                            "SELECT html FROM format_memo WHERE content_key=?", (key,)
+                        ).fetchone()
+                        if row:
+                            conn.execute(
+                                "UPDATE format_memo SET last_access=? WHERE content_key=?",
+                                (time.time(), key),
+                            )
+                            conn.commit()
+                except sqlite3.Error:
+                    row = None
+                if row:
+                    self._remember(key, row[0])
+                    self._counts["disk_hits"] += 1
+                    return row[0]
+            self._counts["misses"] += 1
+        return None
+
+    def put(self, text: str, html: str) -> None:
+        """Store HTML rendered elsewhere (e.g. while streaming)"""
+        if is_plain_fallback(html):
+            return  # ran out of time once; may well fit the budget next time
+        key = content_key(text, self.version)
+        with self._lock:
+            self._remember(key, html)
+            if not self.db_path:
+                return
+            try:
+                with self._connect() as conn:
+                    cur = conn.cursor()
+                    cur.execute(
+                        "INSERT OR REPLACE INTO format_memo (content_key, version, html, last_access) "
+                        "VALUES (?, ?, ?, ?)",
+                        (key, self.version, html, time.time()),
+                    )
+                    cur.execute("SELECT COUNT(*) FROM format_memo")
+                    overflow = cur.fetchone()[0] - self.max_disk_entries
+                    if overflow > 0:
+                        cur.execute(
+                            """
+                            DELETE FROM format_memo WHERE content_key IN (
+                                SELECT content_key FROM format_memo
+                                ORDER BY last_access ASC
+                                LIMIT ?
+                            )
+                            """,
+                            (overflow,),
+                        )
+                    conn.commit()
+            except sqlite3.Error:
+                pass
+
+    def render(self, text: str) -> str:
+        """HTML for ``text``, rendered at most once per formatter version"""
+        html = self.get(text)
+        if html is None:
+            html = self.render_fn(text)
+            self.put(text, html)
+        return html
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = dict(self._counts, entries=len(self._entries))
+        lookups = result["hits"] + result["disk_hits"] + result["misses"]
+        result["hit_rate"] = (result["hits"] + result["disk_hits"]) / lookups if lookups else 0.0
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if not self.db_path:
+                return
+            try:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM format_memo")
+                    conn.commit()
+            except sqlite3.Error:
+                pass
@@ -0,0 +1,465 @@
+"""Turn a model answer ("**Step N:** ..." text) into the app's styled HTML.
+
+Kept free of Streamlit so batch tools render answers exactly like the app.
+
+All patterns are compiled once. Each line is classified by cheap string
+checks, and only lines that can be headers or stray tags are matched against
+a regex. Powers and ``sqrt(`` are rewritten in one scan instead of six
+substitutions. The output is byte-for-byte what the original
+regex-per-line formatter produced; ``test_formatting.py`` checks that
+against a golden corpus.
+
+``StreamingFormatter`` formats an answer while it streams in: each chunk
+yields the HTML of the lines that can no longer change, and the rest is
+kept as a short pending tail. ``format_response`` is the same formatter fed
+the whole text at once.
+
+Model output is untrusted, so nothing here backtracks: the "(a)/(b)"
+fraction rules and "^(...)" powers, quadratic as plain regexes on lines
+full of "(", are scanned in linear time. On top of that, an answer that
+still takes longer than its time budget has its remaining lines shown as
+escaped plain text (``bench_formatting.py --adversarial`` measures it).
+"""
+
+import html
+import re
+import time
+from itertools import chain
+
+# Part of every format_memo key: bump it whenever the HTML produced here
+# changes, so stored renderings are not reused (structured_answers.py has its
+# own STRUCTURED_RENDERER_VERSION)
+FORMATTER_VERSION = "3"
+
+_POWER_SPAN = '<span class="power">{}</span>'
+
+# ^2/^3/^4 take a single digit (so ^23 is a squared 2 followed by 3), other
+# digits take the whole run, ^(…) runs to the first ")". sqrt is matched
+# without \b here; _rewrite_powers checks the word boundary itself.
+_POWERS_AND_SQRT = re.compile(r'\^([234])|\^(\d+)|\^(\([^)]+\))|sqrt\s*\(')
+# Inside ^(…): the old sequential substitutions never nested ^(…)
+_DIGIT_POWERS_AND_SQRT = re.compile(r'\^([234])|\^(\d+)|sqrt\s*\(')
+
+_LATEX_LETTERS = re.compile(r'[a-zA-Z]+')
+
+# Lines starting with "*", "#" or "<" that mean something on their own
+_SPECIAL_LINE = re.compile(
+    r'(?P<part>\*\*Part \([a-z0-9]+\):\*\*)'
+    r'|(?P<step>\*\*Step \d+:|###\s*Step \d+:)'
+    r'|(?P<tag></(?:div|span|p)>\s*$)'
+)
+_STEP_MARKUP = re.compile(r'\*\*|###')
+
+_WORD_FRACTION = re.compile(r'\b([a-zA-Z]+)/([a-zA-Z]+)\b')
+
+_STEP_CODE_NEXT = '<!--STEP_CODE_NEXT-->'
+
+# Formatting time allowed per answer (normal answers need about a millisecond)
+FORMAT_BUDGET_SECONDS = 0.5
+_PLAIN_LINE = '<div class="plain-line">{}</div>\n'
+_STEP_TITLE = '<div style="color:#4CAF50;font-weight:700;margin:0.6rem 0 0.2rem 0;">{}</div>'
+
+
+def _is_word(char):
+    """Python's regex \\w for one character"""
+    return char.isalnum() or char == '_'
+
+
+def _rewrite_powers(text, pattern):
+    matches = pattern.finditer(text)
+    if pattern is _POWERS_AND_SQRT:
+        # A "^(" with no ")" after it never matches, but the regex would scan
+        # to the end of the text for each one; past the last ")" only the
+        # other alternatives can match
+        cut = text.rfind(')') + 1
+        matches = chain(pattern.finditer(text, 0, cut), _DIGIT_POWERS_AND_SQRT.finditer(text, cut))
+    out = []
+    pos = 0
+    power_end = -1
+    for match in matches:
+        start = match.start()
+        out.append(text[pos:start])
+        pos = match.end()
+        index = match.lastindex
+        if index in (1, 2):
+            out.append(_POWER_SPAN.format(match.group(index)))
+            power_end = pos
+        elif index == 3:
+            inner = _rewrite_powers(match.group(3)[1:-1], _DIGIT_POWERS_AND_SQRT)
+            out.append(_POWER_SPAN.format(f'({inner})'))
+            power_end = pos
+        elif start == 0 or start == power_end or not _is_word(text[start - 1]):
+            # \bsqrt: the old code ran after the power spans were inserted, so a
+            # "sqrt" right after one (preceded by ">") counted as a word start
+            out.append('√(')
+        else:
+            out.append(match.group())
+    if not out:
+        return text
+    out.append(text[pos:])
+    return ''.join(out)
+
+
+def format_powers(text):
+    """Convert ^2, ^3, etc. to proper superscript format"""
+    if '^' not in text and 'sqrt' not in text:
+        return text
+    return _rewrite_powers(text, _POWERS_AND_SQRT)
+
+def format_fraction(numerator, denominator):
+    """Format a fraction with numerator over denominator in inline style"""
+    num_clean = format_powers(numerator.strip())
+    den_clean = format_powers(denominator.strip())
+
+    return f"""<div class="fraction-display">
+        <div>{num_clean}</div>
+        <div class="fraction-bar"></div>
+        <div>{den_clean}</div>
+    </div>"""
+
+def _fraction(match):
+    return format_fraction(match.group(1), match.group(2))
+
+
+def _skip_space(line, pos):
+    while pos < len(line) and line[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _paren_fractions(line, over_term=False):
+    r"""``re.sub`` of r'\(([^)]+)\)\s*/\s*\(([^)]+)\)' (or, with ``over_term``,
+    r'\(([^)]+)\)\s*/\s*([^/\s]+)') with ``format_fraction``, in linear time.
+
+    Each "(" can only match up to the first ")" after it. When that fails,
+    every "(" before the same ")" fails the same way, so the scan resumes
+    after it instead of retrying each one.
+    """
+    out = []
+    pos = 0
+    start = line.find('(')
+    while start != -1:
+        close = line.find(')', start + 1)
+        if close == -1:
+            break
+        slash = _skip_space(line, close + 1)
+        if close > start + 1 and slash < len(line) and line[slash] == '/':
+            den_start = _skip_space(line, slash + 1)
+            den_end = -1
+            if over_term:
+                end = den_start
+                while end < len(line) and line[end] != '/' and not line[end].isspace():
+                    end += 1
+                if end > den_start:
+                    den, den_end = line[den_start:end], end
+            elif den_start < len(line) and line[den_start] == '(':
+                den_close = line.find(')', den_start + 1)
+                if den_close > den_start + 1:
+                    den, den_end = line[den_start + 1:den_close], den_close + 1
+            if den_end != -1:
+                out.append(line[pos:start])
+                out.append(format_fraction(line[start + 1:close], den))
+                pos = den_end
+                start = line.find('(', pos)
+                continue
+        start = line.find('(', close)
+    if not out:
+        return line
+    out.append(line[pos:])
+    return ''.join(out)
+
+
+class _LatexCleaner:
+    """The LaTeX clean-up, applied to text as it arrives.
+
+    Same result as ``\\sqrt{x}`` -> ``sqrt(x)`` followed by dropping every
+    ``\\command`` with its "{" and the first "}" after it (however far away,
+    as the original regex did). Text is held back only while a match is
+    still undecided.
+    """
+
+    def __init__(self):
+        self._sqrt_held = ""
+        self._command_held = ""
+        self._drop_brace = False
+
+    @property
+    def held(self):
+        return self._command_held + self._sqrt_held
+
+    def feed(self, text, final=False):
+        if '\\' not in text and not self._sqrt_held and not self._command_held and not self._drop_brace:
+            return text
+        return self._commands(self._sqrts(text, final), final)
+
+    def _sqrts(self, text, final):
+        s = self._sqrt_held + text
+        out = []
+        pos = 0
+        while True:
+            start = s.find('\\sqrt{', pos)
+            if start == -1:
+                cut = len(s)
+                if not final:
+                    # A "\sqrt{" may be split across chunks
+                    backslash = s.rfind('\\', max(pos, len(s) - 5))
+                    if backslash != -1 and '\\sqrt{'.startswith(s[backslash:]):
+                        cut = backslash
+                out.append(s[pos:cut])
+                self._sqrt_held = s[cut:]
+                break
+            close = s.find('}', start + 6)
+            if close == -1:
+                # Undecided until a "}" arrives; at the end, nothing more can match
+                cut = len(s) if final else start
+                out.append(s[pos:cut])
+                self._sqrt_held = s[cut:]
+                break
+            if close == start + 6:
+                # "\sqrt{}" is left for the command pass
+                out.append(s[pos:close])
+                pos = close
+            else:
+                out.append(s[pos:start])
+                out.append(f'sqrt({s[start + 6:close]})')
+                pos = close + 1
+        return ''.join(out)
+
+    def _commands(self, text, final):
+        s = self._command_held + text
+        out = []
+        pos = 0
+        end = len(s)
+        while pos < end:
+            if self._drop_brace:
+                close = s.find('}', pos)
+                if close == -1:
+                    out.append(s[pos:])
+                    pos = end
+                    break
+                out.append(s[pos:close])
+                pos = close + 1
+                self._drop_brace = False
+                continue
+            start = s.find('\\', pos)
+            if start == -1:
+                out.append(s[pos:])
+                pos = end
+                break
+            out.append(s[pos:start])
+            letters = _LATEX_LETTERS.match(s, start + 1)
+            if letters is None:
+                if start + 1 == end and not final:
+                    pos = start
+                    break
+                out.append('\\')
+                pos = start + 1
+                continue
+            after = letters.end()
+            if after == end and not final:
+                # The name (or the "{" after it) may continue in the next chunk
+                pos = start
+                break
+            if after < end and s[after] == '{':
+                after += 1
+            pos = after
+            self._drop_brace = True
+        self._command_held = s[pos:]
+        return ''.join(out)
+
+
+class StreamingFormatter:
+    """``format_response`` for an answer that arrives in chunks.
+
+    ``feed`` returns the HTML of the lines that can no longer change and
+    ``finish`` the rest once the answer is complete; joined, they are exactly
+    ``format_response`` of the whole text. Every line is formatted once, so
+    streaming costs no more than formatting the finished answer.
+
+    A line is final as soon as the next one starts, except where the batch
+    formatter looks ahead: the line after a step header, blank lines (dropped
+    at the end of the answer) and fenced code, which is emitted when its
+    closing fence arrives. ``pending`` is the text fed but not yet returned.
+
+    Once formatting has taken ``budget`` seconds in total, the remaining
+    lines are shown as escaped plain text and ``over_budget`` is set.
+    """
+
+    def __init__(self, budget=FORMAT_BUDGET_SECONDS):
+        self.budget = budget
+        self.over_budget = False
+        self._spent = 0.0
+        self._latex = _LatexCleaner()
+        self._line = ""
+        self._out = []
+        self._fed = False
+        self._started = False
+        self._breaks = 0
+        self._step_code_next = False
+        self._code_fence = None
+        self._code_lines = []
+        self._code_lang = None
+
+    @property
+    def pending(self):
+        """Fed text without HTML yet: an open code block and the current line"""
+        tail = self._line + self._latex.held
+        if self._code_fence is None:
+            return tail
+        return '\n'.join([self._code_fence, *self._code_lines, tail])
+
+    def feed(self, chunk):
+        """Add the next chunk; returns the HTML that became final"""
+        if not chunk:
+            return ""
+        started = time.perf_counter()
+        self._fed = True
+        text = self._latex.feed(chunk)
+        if '\n' not in text:
+            self._line += text
+            self._spent += time.perf_counter() - started
+            return ""
+        lines = (self._line + text).split('\n')
+        self._line = lines.pop()
+        self._add_lines(lines, started)
+        return self._take()
+
+    def finish(self):
+        """End of the answer; returns the remaining HTML"""
+        started = time.perf_counter()
+        lines = (self._line + self._latex.feed("", final=True)).split('\n')
+        self._line = ""
+        self._add_lines(lines, started)
+        # The batch formatter strips the text: trailing blank lines and an
+        # unclosed code block produce nothing
+        self._breaks = 0
+        self._settle()
+        self._code_fence = None
+        self._code_lines = []
+        if self._fed and not self._started:
+            self._out.append("<br>")
+        return self._take()
+
+    def _take(self):
+        html_out = ''.join(self._out)
+        self._out.clear()
+        return html_out
+
+    def _add_lines(self, lines, started):
+        for line in lines:
+            if (not self.over_budget and self.budget is not None
+                    and self._spent + time.perf_counter() - started > self.budget):
+                self.over_budget = True
+            self._add_line(line)
+        self._spent += time.perf_counter() - started
+
+    def _settle(self):
+        """Nothing took the slot after a step header; its marker stays in the output"""
+        if self._step_code_next:
+            self._out.append(_STEP_CODE_NEXT)
+            self._step_code_next = False
+
+    def _add_line(self, line):
+        line = line.strip()
+        if not line:
+            # Add minimal spacing between sections
+            if self._started and self._code_fence is None:
+                self._breaks += 1
+            return
+        self._started = True
+        append = self._out.append
+        if self._breaks:
+            self._settle()
+            append("<br>" * self._breaks)
+            self._breaks = 0
+
+        # Fenced code blocks (```lang ... ```)
+        if line.startswith('```'):
+            if self._code_fence is None:
+                self._code_fence = line
+                self._code_lines = []
+                self._code_lang = line.strip('`').strip() or 'text'
+            else:
+                self._settle()
+                escaped = html.escape("\n".join(self._code_lines))
+                append(
+                    f'<div class="code-block"><div class="code-header">{self._code_lang}</div><pre><code>{escaped}</code></pre></div>'
+                )
+                self._code_fence = None
+                self._code_lines = []
+                self._code_lang = None
+            return
+
+        if self._code_fence is not None:
+            self._code_lines.append(line)
+            return
+
+        # Out of time: no more heuristics, just the text
+        if self.over_budget:
+            self._settle()
+            append(_PLAIN_LINE.format(html.escape(line)))
+            return
+
+        special = _SPECIAL_LINE.match(line) if line[0] in '*#<' else None
+        kind = special.lastgroup if special else None
+
+        # Skip stray closing tags that may appear in the model text
+        if kind == 'tag':
+            return
+
+        # Part headers of a merged multi-part answer (the text is the student's own question)
+        if kind == 'part':
+            self._settle()
+            part_text = line.replace('**', '').strip()
+            append(f'<div class="part-header">{format_powers(html.escape(part_text))}</div>\n')
+
+        # One-line step headers; the next plain line is wrapped in a step-code box
+        elif kind == 'step':
+            self._settle()
+            append(_STEP_TITLE.format(_STEP_MARKUP.sub('', line).strip()))
+            self._step_code_next = True
+
+        # Final answer (simple one-line box)
+        elif 'Final Answer' in line:
+            self._settle()
+            append(f'<div class="final-answer">{format_powers(line.replace("**", ""))}</div>\n')
+
+        # Any line with fractions: convert them all to vertical display
+        elif '/' in line and ('(' in line or 'x' in line or 'y' in line or 'du' in line or 'dv' in line):
+            self._settle()
+            formatted_line = _paren_fractions(line)
+            formatted_line = _WORD_FRACTION.sub(_fraction, formatted_line)
+            formatted_line = _paren_fractions(formatted_line, over_term=True)
+            append(f'<div class="math-line">{format_powers(formatted_line)}</div>\n')
+
+        # The first plain line after a step header
+        elif self._step_code_next:
+            self._step_code_next = False
+            append(f'<div class="step-code">{html.escape(line)}</div>')
+
+        # Mathematical expressions with equations (no fractions)
+        elif '=' in line and ('x' in line or '+' in line or '-' in line or '*' in line
+                              or '^' in line or '(' in line or ')' in line):
+            append(f'<div class="math-line">{format_powers(line)}</div>\n')
+
+        # Regular text
+        else:
+            append(f"{format_powers(line)}\n")
+
+
+def is_plain_fallback(formatted):
+    """Whether ``formatted`` was cut short by the time budget (so not worth keeping)"""
+    return '<div class="plain-line">' in formatted
+
+
+def format_response(response_text, budget=FORMAT_BUDGET_SECONDS):
+    """Improved formatting with consistent vertical fractions and tighter spacing.
+
+    Also formats Computer Science responses:
+    - Preserves fenced code blocks in a styled container
+    - Keeps non-code steps readable like math section
+    """
+    if not response_text:
+        return ""
+    formatter = StreamingFormatter(budget)
+    return formatter.feed(response_text) + formatter.finish()
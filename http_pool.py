@@ -0,0 +1,74 @@
+"""Process-wide keep-alive HTTP session for OpenRouter and backend calls.
+
+A single ``requests.Session`` keeps TCP/TLS connections open between calls,
+so a page render no longer pays a fresh handshake for every backend round
+trip and LLM request.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Distinct hosts whose pools are kept around
+POOL_CONNECTIONS = 10
+# Default number of keep-alive connections kept per host
+POOL_MAXSIZE = 20
+
+# Per-host connection limits (URL prefix -> max pooled connections)
+DEFAULT_HOST_LIMITS = {
+    "https://openrouter.ai/": 32,
+}
+
+# Hosts whose calls go through retry_policy.RetryPolicy, which owns their
+# retries; adapter retries underneath would multiply its attempts
+CALLER_RETRIED_PREFIXES = ("https://openrouter.ai/",)
+
+
+def build_retry(total: int = 2, backoff_factor: float = 0.3) -> Retry:
+    """Retry policy for transient failures.
+
+    Connection errors are retried for every method because the request never
+    reached the server. Read errors and 502/503/504 are only retried for
+    idempotent methods (GET, HEAD, ...), so a POST that may have been
+    processed is never sent twice.
+    """
+    return Retry(
+        total=total,
+        connect=total,
+        read=total,
+        status=total,
+        backoff_factor=backoff_factor,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+
+
+def build_session(host_limits: dict[str, int] | None = None,
+                  pool_maxsize: int = POOL_MAXSIZE,
+                  retries: int = 2) -> requests.Session:
+    """Create a pooled session with per-host limits and retry adapters.
+
+    Hosts in ``CALLER_RETRIED_PREFIXES`` get no adapter retries. Anywhere
+    else (e.g. a mock provider on localhost) a call made through a
+    ``RetryPolicy`` may open up to ``max_attempts * (1 + retries)``
+    connections in the worst case.
+    """
+    session = requests.Session()
+    default_adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize,
+        max_retries=build_retry(retries),
+    )
+    session.mount("http://", default_adapter)
+    session.mount("https://", default_adapter)
+
+    limits = DEFAULT_HOST_LIMITS if host_limits is None else host_limits
+    for prefix in {**limits, **dict.fromkeys(CALLER_RETRIED_PREFIXES)}:
+        session.mount(prefix, HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=limits.get(prefix, pool_maxsize),
+            max_retries=0 if prefix in CALLER_RETRIED_PREFIXES else build_retry(retries),
+        ))
+    return session
@@ -14,6 +14,9 @@ import base64
 from datetime import datetime
 import html
 
+import openrouter
+from latency import LatencyTracker, adaptive_delay
+
 # Page configuration
 st.set_page_config(
     page_title="Academic Assistant Pro",
@@ -1514,8 +1517,40 @@ def create_smart_visualization(question: str, subject: str):
         plt.close('all')
         return None
 
+def get_setting(name: str, default):
+    """Read an optional tuning value from Streamlit secrets, cast to the default's type"""
+    try:
+        value = st.secrets.get(name, default)
+    except Exception:
+        return default
+    if isinstance(default, bool) and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    try:
+        return type(default)(value)
+    except (TypeError, ValueError):
+        return default
+
+STREAM_SOLUTIONS = get_setting('STREAM_SOLUTIONS', True)
+FIRST_TOKEN_TIMEOUT = get_setting('FIRST_TOKEN_TIMEOUT', openrouter.DEFAULT_FIRST_TOKEN_TIMEOUT)
+STREAM_TOTAL_TIMEOUT = get_setting('STREAM_TOTAL_TIMEOUT', openrouter.DEFAULT_TOTAL_TIMEOUT)
+
+HEDGE_REQUESTS = get_setting('HEDGE_REQUESTS', True)
+HEDGE_PERCENTILE = get_setting('HEDGE_PERCENTILE', 95.0)
+HEDGE_DEFAULT_DELAY = get_setting('HEDGE_DEFAULT_DELAY', 12.0)
+HEDGE_MIN_DELAY = get_setting('HEDGE_MIN_DELAY', 2.0)
+
+@st.cache_resource
+def get_latency_tracker() -> LatencyTracker:
+    """Per-model completion latencies shared by all sessions (drives the hedge delay)"""
+    return LatencyTracker()
+
 def get_api_response(question, subject):
-    """Get response from OpenRouter API"""
+    """Get response from OpenRouter API
+
+    With HEDGE_REQUESTS on and a fallback model different from the primary,
+    the fallback is launched once the primary runs past its recent p95
+    latency and the first finished answer wins.
+    """
     if 'OPENROUTER_API_KEY' not in st.secrets:
         st.error("⚠️ API key not configured. Please add OPENROUTER_API_KEY to Streamlit secrets.")
         return None
@@ -1545,10 +1580,33 @@ def get_api_response(question, subject):
             "max_tokens": 2000
         }
     
+    if HEDGE_REQUESTS and fallback_model != primary_model:
+        # Race primary against a delayed fallback instead of waiting for it to fail
+        tracker = get_latency_tracker()
+        hedge_delay = adaptive_delay(
+            tracker, primary_model, HEDGE_PERCENTILE,
+            default=HEDGE_DEFAULT_DELAY, floor=HEDGE_MIN_DELAY, ceiling=30.0,
+        )
+        try:
+            answer, _model = openrouter.hedged_completion(
+                headers, _make_body(primary_model), _make_body(fallback_model),
+                hedge_delay=hedge_delay,
+                latency_tracker=tracker,
+                first_token_timeout=FIRST_TOKEN_TIMEOUT,
+                total_timeout=STREAM_TOTAL_TIMEOUT,
+            )
+            return answer
+        except (openrouter.OpenRouterError, openrouter.StreamTimeout):
+            st.error("The service is temporarily unavailable. Please try again in a moment.")
+            return None
+        except requests.exceptions.RequestException as e:
+            st.error(f"Network Error: {str(e)}")
+            return None
+
     try:
         # First try with the primary model
         response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
+            openrouter.OPENROUTER_URL,
             headers=headers,
             json=_make_body(primary_model),
             timeout=30
@@ -1560,7 +1618,7 @@ def get_api_response(question, subject):
         # If primary fails, silently try a safe fallback (no noisy UI messages)
 
         response_fb = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
+            openrouter.OPENROUTER_URL,
             headers=headers,
             json=_make_body(fallback_model),
             timeout=30
@@ -1578,6 +1636,86 @@ def get_api_response(question, subject):
         return None
 
 
+def stream_api_response(question, subject):
+    """Yield the solution from OpenRouter chunk by chunk (for st.write_stream).
+
+    Same model choice as get_api_response. With HEDGE_REQUESTS on, the
+    fallback stream starts once the primary is slower than its recent p95
+    time to first token and the first model to send text is kept; otherwise
+    the fallback is only tried when the primary fails before sending any
+    text. Once tokens have been shown we never switch models mid-answer.
+    """
+    if 'OPENROUTER_API_KEY' not in st.secrets:
+        st.error("⚠️ API key not configured. Please add OPENROUTER_API_KEY to Streamlit secrets.")
+        return
+
+    headers = {
+        "Authorization": f"Bearer {st.secrets['OPENROUTER_API_KEY']}",
+        "Content-Type": "application/json"
+    }
+
+    primary_model = "openai/gpt-4o-mini"
+    if subject in ("Physics", "Chemistry"):
+        primary_model = "openai/gpt-4o"
+    fallback_model = "openai/gpt-4o-mini"
+
+    def _make_body(model_name: str):
+        return {
+            "model": model_name,
+            "messages": [
+                {"role": "system", "content": SUBJECTS[subject]['prompt']},
+                {"role": "user", "content": question}
+            ],
+            "temperature": 0.1,
+            "max_tokens": 2000
+        }
+
+    if HEDGE_REQUESTS and fallback_model != primary_model:
+        tracker = get_latency_tracker()
+        # Must fire well inside the first-token deadline to be of any use
+        hedge_delay = adaptive_delay(
+            tracker, openrouter.first_token_key(primary_model), HEDGE_PERCENTILE,
+            default=min(HEDGE_DEFAULT_DELAY, FIRST_TOKEN_TIMEOUT / 2),
+            floor=HEDGE_MIN_DELAY, ceiling=FIRST_TOKEN_TIMEOUT,
+        )
+        streams = [openrouter.hedged_stream(
+            headers, _make_body(primary_model), _make_body(fallback_model),
+            hedge_delay=hedge_delay,
+            latency_tracker=tracker,
+            first_token_timeout=FIRST_TOKEN_TIMEOUT,
+            total_timeout=STREAM_TOTAL_TIMEOUT,
+        )]
+    else:
+        models = [primary_model] if fallback_model == primary_model else [primary_model, fallback_model]
+        # Generators: a request is only sent when its stream is iterated
+        streams = [
+            openrouter.stream_chat_completion(
+                headers, _make_body(model_name),
+                first_token_timeout=FIRST_TOKEN_TIMEOUT,
+                total_timeout=STREAM_TOTAL_TIMEOUT,
+            )
+            for model_name in models
+        ]
+
+    for stream in streams:
+        started = False
+        try:
+            for delta in stream:
+                started = True
+                yield delta
+            return
+        except openrouter.TotalTimeout:
+            st.warning("The solution was cut short because it took too long.")
+            return
+        except (openrouter.FirstTokenTimeout, openrouter.OpenRouterError, requests.exceptions.RequestException):
+            if started:
+                st.warning("The connection dropped before the solution was complete.")
+                return
+            # Nothing shown yet: silently try the next model
+
+    st.error("The service is temporarily unavailable. Please try again in a moment.")
+
+
 # ---------------------------
 # Backend helpers (HTTP)
 # ---------------------------
@@ -1870,51 +2008,64 @@ def main():
     
     if st.button("🎯 Get Solution", type="primary"):
         if question.strip():
-            with st.spinner("Getting solution..."):
-                response = get_api_response(question, selected_subject)
-                
-                if response:
+            solution_slot = None
+            if STREAM_SOLUTIONS:
+                # Show tokens as they arrive, then swap in the formatted version
+                st.markdown("---")
+                st.markdown(f"## 📚 {selected_subject} Solution")
+                solution_slot = st.empty()
+                with solution_slot.container():
+                    response = st.write_stream(stream_api_response(question, selected_subject))
+                if not response:
+                    solution_slot.empty()
+            else:
+                with st.spinner("Getting solution..."):
+                    response = get_api_response(question, selected_subject)
+
+            if response:
+                if solution_slot is None:
                     st.markdown("---")
                     st.markdown(f"## 📚 {selected_subject} Solution")
-                    
-                    # Improved formatting in a clean container
-                    formatted_response = format_response(response)
-                    st.markdown(f"""
-                    <div class="solution-content">
-                        {formatted_response}
-                    </div>
-                    """, unsafe_allow_html=True)
-                    # Save to history (backend)
-                    if backend_save_history(selected_subject, question.strip(), formatted_response):
-                        pass  # Successfully saved
-                    else:
-                        # Fallback to local save if backend fails
-                        save_history(
-                            st.session_state["user_id"],
-                            selected_subject,
-                            question.strip(),
-                            formatted_response,
-                        )
-                    
-                    # Show diagram if needed
-                    if should_show_diagram(question, selected_subject):
-                        st.markdown("### 📊 Visualization")
-                        viz = create_smart_visualization(question, selected_subject)
-                        if viz:
-                            st.image(viz, use_container_width=True)
-                    
-                    # Simple feedback
-                    st.markdown("### Rate this solution")
-                    col_a, col_b, col_c = st.columns(3)
-                    with col_a:
-                        if st.button("👍 Helpful"):
-                            st.success("Thanks!")
-                    with col_b:
-                        if st.button("👎 Needs work"):
-                            st.info("We'll improve!")
-                    with col_c:
-                        if st.button("🔄 Try again"):
-                            st.rerun()
+                    solution_slot = st.empty()
+                
+                # Improved formatting in a clean container
+                formatted_response = format_response(response)
+                solution_slot.markdown(f"""
+                <div class="solution-content">
+                    {formatted_response}
+                </div>
+                """, unsafe_allow_html=True)
+                # Save to history (backend)
+                if backend_save_history(selected_subject, question.strip(), formatted_response):
+                    pass  # Successfully saved
+                else:
+                    # Fallback to local save if backend fails
+                    save_history(
+                        st.session_state["user_id"],
+                        selected_subject,
+                        question.strip(),
+                        formatted_response,
+                    )
+                
+                # Show diagram if needed
+                if should_show_diagram(question, selected_subject):
+                    st.markdown("### 📊 Visualization")
+                    viz = create_smart_visualization(question, selected_subject)
+                    if viz:
+                        st.image(viz, use_container_width=True)
+                
+                # Simple feedback
+                st.markdown("### Rate this solution")
+                col_a, col_b, col_c = st.columns(3)
+                with col_a:
+                    if st.button("👍 Helpful"):
+                        st.success("Thanks!")
+                with col_b:
+                    if st.button("👎 Needs work"):
+                        st.info("We'll improve!")
+                with col_c:
+                    if st.button("🔄 Try again"):
+                        st.rerun()
         else:
             st.warning("Please enter a question.")
     
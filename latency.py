@@ -0,0 +1,70 @@
+"""Rolling per-model latency history.
+
+Used to derive adaptive cut-offs (hedge delays, timeouts) from what the
+provider has actually been doing recently instead of fixed constants.
+"""
+
+import math
+import threading
+from collections import defaultdict, deque
+
+DEFAULT_WINDOW = 200
+MIN_SAMPLES = 10
+
+
+def percentile(values, pct: float) -> float | None:
+    """Nearest-rank percentile of ``values`` (``pct`` in 0..100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class LatencyTracker:
+    """Thread-safe window of the last ``window`` latencies (seconds) per key."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW, min_samples: int = MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[key].append(float(seconds))
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, pct: float) -> float | None:
+        """Percentile for ``key``, or None until ``min_samples`` were recorded."""
+        with self._lock:
+            values = list(self._samples.get(key, ()))
+        if len(values) < self.min_samples:
+            return None
+        return percentile(values, pct)
+
+    def snapshot(self) -> dict:
+        """``{key: {'count', 'p50', 'p95', 'p99'}}`` for status pages."""
+        with self._lock:
+            items = {key: list(values) for key, values in self._samples.items()}
+        return {
+            key: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+            for key, values in items.items()
+        }
+
+
+def adaptive_delay(tracker: LatencyTracker, key: str, pct: float,
+                   default: float, floor: float, ceiling: float) -> float:
+    """``pct`` percentile of ``key`` clamped to [floor, ceiling], else ``default``."""
+    observed = tracker.percentile(key, pct)
+    if observed is None:
+        return default
+    return min(max(observed, floor), ceiling)
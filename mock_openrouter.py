@@ -0,0 +1,542 @@
+"""Local stand-in for the OpenRouter chat-completions API.
+
+Speaks ``POST /api/v1/chat/completions`` (streaming SSE and plain JSON) so the
+apps, ``batch_solve.py`` and load tests can run without a key or network.
+Point a client at it through the ``OPENROUTER_URL`` environment variable:
+
+    python mock_openrouter.py --port 8765 --latency lognormal:0.8,0.5 --tokens-per-second 40
+    OPENROUTER_URL=http://127.0.0.1:8765/api/v1/chat/completions streamlit run run.py
+
+Three modes:
+
+* synthetic (default): a made-up "**Step N:**" answer, delayed by a latency
+  distribution and streamed at a fixed token rate, with optional injected
+  errors, stalls and dropped connections.
+* ``--record DIR``: proxy to the real API (the client's Authorization header
+  is passed through) and save every successful answer, with its chunk
+  timings, as a JSON cassette in DIR.
+* ``--replay DIR``: serve recorded cassettes back, with the recorded timings
+  (scaled by ``--replay-speed``). A request without a cassette gets a 404.
+
+``GET /stats`` returns request and fault counters as JSON.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import openrouter
+
+UPSTREAM_URL = "https://openrouter.ai/api/v1/chat/completions"
+COMPLETIONS_PATH = "/api/v1/chat/completions"
+
+
+def parse_distribution(spec: str):
+    """``fixed:S``, ``uniform:A,B``, ``normal:MEAN,SD``, ``lognormal:MEDIAN,SIGMA`` or ``exp:MEAN``.
+
+    Returns a function of a ``random.Random`` giving a delay in seconds (never negative).
+    """
+    name, _, args = spec.partition(":")
+    try:
+        values = [float(v) for v in args.split(",")] if args else []
+    except ValueError as exc:
+        raise ValueError(f"Bad distribution parameters: {spec!r}") from exc
+
+    if name == "fixed" and len(values) == 1:
+        return lambda rng: max(values[0], 0.0)
+    if name == "uniform" and len(values) == 2:
+        return lambda rng: max(rng.uniform(values[0], values[1]), 0.0)
+    if name == "normal" and len(values) == 2:
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0.0)
+    if name == "lognormal" and len(values) == 2:
+        # Parameterised by the median, which is what latency dashboards show
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    if name == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+
+def cassette_key(body: dict) -> str:
+    """Identity of a request for record/replay; streamed and blocking calls share it."""
+    identity = {name: body.get(name) for name in ("model", "messages", "temperature", "max_tokens")}
+    canonical = json.dumps(identity, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def split_tokens(text: str) -> list[str]:
+    """Word-sized pieces (trailing whitespace attached), joined back losslessly."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def synthetic_answer(body: dict) -> str:
+    """Deterministic answer in the layout the subject prompts ask for (JSON if requested)."""
+    messages = body.get("messages") or []
+    question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    digest = int(hashlib.sha256(question.encode("utf-8")).hexdigest()[:8], 16)
+    if (body.get("response_format") or {}).get("type") == "json_schema":
+        return json.dumps({
+            "steps": [
+                {"title": "Understand the question", "explanation": f"We are asked: {question.strip()[:160]}",
+                 "equations": [], "code": "", "language": ""},
+                {"title": "Set up the relationship", "explanation": "Write down what is known and what we need to find.",
+                 "equations": ["x² + 2x = 15"], "code": "", "language": ""},
+                {"title": "Solve", "explanation": "Rearrange and solve for the unknown.",
+                 "equations": [f"x = {digest % 97}"], "code": "", "language": ""},
+            ],
+            "complexity": {"time": "", "space": ""},
+            "complete_code": {"language": "", "code": ""},
+            "final_answer": f"x = {digest % 97}",
+        }, ensure_ascii=False)
+    return "\n".join([
+        "**Step 1:** Understand the question",
+        f"We are asked: {question.strip()[:160]}",
+        "",
+        "**Step 2:** Set up the relationship",
+        "Write down what is known and what we need to find.",
+        "x^2 + 2x = 15",
+        "",
+        "**Step 3:** Solve",
+        "Rearrange and solve for the unknown.",
+        f"x = {digest % 97}",
+        "",
+        f"**Final Answer:** x = {digest % 97}",
+    ])
+
+
+class CassetteStore:
+    """One JSON file per request key in ``directory``."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key: str) -> dict | None:
+        try:
+            with open(self._path(key), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key: str, cassette: dict) -> None:
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(cassette, fh, ensure_ascii=False, indent=2)
+        os.replace(tmp, self._path(key))
+
+
+class MockConfig:
+    def __init__(self, latency: str = "fixed:0.3", tokens_per_second: float = 50.0,
+                 error_rate: float = 0.0, error_statuses=(503,), stall_rate: float = 0.0,
+                 stall_seconds: float = 120.0, drop_rate: float = 0.0, retry_after: int = 2,
+                 seed: int | None = None, record_dir: str | None = None,
+                 replay_dir: str | None = None, replay_speed: float = 1.0,
+                 upstream: str = UPSTREAM_URL):
+        self.latency = parse_distribution(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.drop_rate = drop_rate
+        self.retry_after = retry_after
+        self.replay_speed = replay_speed
+        self.upstream = upstream
+        self.record = CassetteStore(record_dir) if record_dir else None
+        self.replay = CassetteStore(replay_dir) if replay_dir else None
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "streamed": 0, "errors": 0, "stalls": 0, "drops": 0,
+                      "recorded": 0, "replayed": 0, "replay_misses": 0}
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.stats[name] += 1
+
+    def draw(self) -> dict:
+        """Latency and fault decisions for one request, drawn under the lock."""
+        with self.lock:
+            roll = self.rng.random()
+            fault = None
+            if roll < self.error_rate:
+                fault = "error"
+            elif roll < self.error_rate + self.stall_rate:
+                fault = "stall"
+            elif roll < self.error_rate + self.stall_rate + self.drop_rate:
+                fault = "drop"
+            return {
+                "fault": fault,
+                "status": self.rng.choice(self.error_statuses) if self.error_statuses else 503,
+                "latency": self.latency(self.rng),
+            }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockOpenRouter/1.0"
+
+    @property
+    def config(self) -> MockConfig:
+        return self.server.config
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    # ---- low-level writers ----
+    def _send_json(self, status: int, payload: dict, extra_headers: dict | None = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_event(self, payload) -> None:
+        data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+        self._write_chunk(f"data: {data}\n\n".encode("utf-8"))
+
+    def _end_stream(self) -> None:
+        self._send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _drop(self) -> None:
+        self.config.count("drops")
+        self.close_connection = True
+        try:
+            self.connection.shutdown(2)
+        except OSError:
+            pass
+
+    # ---- payloads ----
+    @staticmethod
+    def _completion(model: str, content: str, usage: dict) -> dict:
+        return {
+            "id": f"gen-mock-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    @staticmethod
+    def _delta(model: str, content: str | None, finish_reason: str | None = None,
+               usage: dict | None = None) -> dict:
+        event = {
+            "id": "gen-mock-stream",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": content} if content else {},
+                         "finish_reason": finish_reason}],
+        }
+        if usage is not None:
+            event["usage"] = usage
+        return event
+
+    @staticmethod
+    def _usage(body: dict, content: str) -> dict:
+        prompt = "".join(str(m.get("content", "")) for m in body.get("messages") or [])
+        prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(content)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    # ---- routes ----
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.config.lock:
+                stats = dict(self.config.stats)
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {"error": {"message": "not found", "code": 404}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "code": 404}})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON body", "code": 400}})
+            return
+
+        self.config.count("requests")
+        if body.get("stream"):
+            self.config.count("streamed")
+
+        if self.config.record is not None:
+            self._proxy_and_record(body)
+        elif self.config.replay is not None:
+            self._replay(body)
+        else:
+            self._synthetic(body)
+
+    def _synthetic(self, body: dict) -> None:
+        config = self.config
+        plan = config.draw()
+        model = body.get("model") or "mock/model"
+
+        if plan["fault"] == "stall":
+            config.count("stalls")
+            time.sleep(config.stall_seconds)
+            self._drop()
+            return
+        time.sleep(plan["latency"])
+        if plan["fault"] == "error":
+            config.count("errors")
+            status = plan["status"]
+            headers = {"Retry-After": str(config.retry_after)} if status == 429 else None
+            self._send_json(status, {"error": {"message": f"Injected error {status}", "code": status}},
+                            headers)
+            return
+
+        content = synthetic_answer(body)
+        usage = self._usage(body, content)
+        if not body.get("stream"):
+            if plan["fault"] == "drop":
+                self._drop()
+                return
+            tokens = len(split_tokens(content))
+            if config.tokens_per_second > 0:
+                time.sleep(tokens / config.tokens_per_second)
+            self._send_json(200, self._completion(model, content, usage))
+            return
+
+        pieces = split_tokens(content)
+        drop_at = len(pieces) // 2 if plan["fault"] == "drop" else None
+        interval = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        self._start_stream()
+        try:
+            for index, piece in enumerate(pieces):
+                if index == drop_at:
+                    self._drop()
+                    return
+                self._send_event(self._delta(model, piece))
+                if interval:
+                    time.sleep(interval)
+            self._send_event(self._delta(model, None, "stop", usage))
+            self._end_stream()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _replay(self, body: dict) -> None:
+        config = self.config
+        cassette = config.replay.load(cassette_key(body))
+        if cassette is None:
+            config.count("replay_misses")
+            self._send_json(404, {"error": {"message": "No cassette recorded for this request",
+                                            "code": 404}})
+            return
+        config.count("replayed")
+        model = cassette.get("model") or body.get("model") or "mock/model"
+        content = cassette["content"]
+        usage = cassette.get("usage") or self._usage(body, content)
+        speed = config.replay_speed
+        started = time.monotonic()
+
+        if not body.get("stream"):
+            time.sleep(cassette.get("total_s", 0.0) * speed)
+            self._send_json(200, self._completion(model, content, usage))
+            return
+
+        chunks = cassette.get("chunks") or [[0.0, content]]
+        self._start_stream()
+        try:
+            for offset, piece in chunks:
+                delay = started + offset * speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self._send_event(self._delta(model, piece))
+            self._send_event(self._delta(model, None, "stop", usage))
+            self._end_stream()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _proxy_and_record(self, body: dict) -> None:
+        config = self.config
+        headers = {"Content-Type": "application/json"}
+        if self.headers.get("Authorization"):
+            headers["Authorization"] = self.headers["Authorization"]
+        started = time.monotonic()
+        try:
+            upstream = requests.post(config.upstream, headers=headers, json=body,
+                                     stream=bool(body.get("stream")), timeout=(10, 120))
+        except requests.exceptions.RequestException as exc:
+            self._send_json(502, {"error": {"message": f"Upstream unreachable: {exc}", "code": 502}})
+            return
+
+        with upstream:
+            if upstream.status_code != 200 or not body.get("stream"):
+                payload = upstream.content
+                self.send_response(upstream.status_code)
+                self.send_header("Content-Type", upstream.headers.get("Content-Type", "application/json"))
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                if upstream.status_code == 200:
+                    try:
+                        reply = json.loads(payload)
+                        content = reply["choices"][0]["message"]["content"]
+                    except (ValueError, KeyError, IndexError, TypeError):
+                        return
+                    self._save(body, reply.get("model"), content, reply.get("usage"),
+                               [[0.0, content]], time.monotonic() - started)
+                return
+
+            # Relay the stream line by line while noting when each piece arrived
+            self._start_stream()
+            chunks, usage, model = [], None, None
+            try:
+                for line in openrouter.iter_sse_lines(upstream):
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    self._write_chunk(f"data: {data}\n\n".encode("utf-8"))
+                    try:
+                        event = json.loads(data)
+                    except ValueError:
+                        continue
+                    model = event.get("model") or model
+                    usage = event.get("usage") or usage
+                    choices = event.get("choices") or []
+                    piece = (choices[0].get("delta") or {}).get("content") if choices else None
+                    if piece:
+                        chunks.append([round(time.monotonic() - started, 4), piece])
+                self._end_stream()
+            except (BrokenPipeError, ConnectionResetError, requests.exceptions.RequestException):
+                self.close_connection = True
+                return
+            if chunks:
+                self._save(body, model, "".join(piece for _, piece in chunks), usage,
+                           chunks, time.monotonic() - started)
+
+    def _save(self, body, model, content, usage, chunks, total_s) -> None:
+        self.config.record.save(cassette_key(body), {
+            "request": {name: body.get(name) for name in ("model", "messages", "temperature", "max_tokens")},
+            "model": model,
+            "content": content,
+            "usage": usage,
+            "ttft_s": chunks[0][0] if chunks else None,
+            "total_s": round(total_s, 4),
+            "chunks": chunks,
+        })
+        self.config.count("recorded")
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on stalled or dropped requests is expected here
+        if isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def make_server(config: MockConfig, host: str = "127.0.0.1", port: int = 8765,
+                verbose: bool = False) -> ThreadingHTTPServer:
+    server = MockServer((host, port), MockHandler)
+    server.config = config
+    server.verbose = verbose
+    return server
+
+
+def start_in_thread(config: MockConfig | None = None, host: str = "127.0.0.1",
+                    port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """Serve in a daemon thread; returns the server and its completions URL."""
+    server = make_server(config or MockConfig(), host, port)
+    threading.Thread(target=server.serve_forever, name="mock-openrouter", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}{COMPLETIONS_PATH}"
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Local mock of the OpenRouter chat-completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="fixed:0.3",
+                        help="delay before the first byte: fixed:S, uniform:A,B, normal:MEAN,SD, "
+                             "lognormal:MEDIAN,SIGMA or exp:MEAN (default: fixed:0.3)")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0,
+                        help="generation speed after the first byte, 0 for instant (default: 50)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-status", default="503",
+                        help="comma-separated statuses to pick injected errors from (default: 503)")
+    parser.add_argument("--stall-rate", type=float, default=0.0,
+                        help="share of requests that hang without sending anything")
+    parser.add_argument("--stall-seconds", type=float, default=120.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="share of requests whose connection is cut mid-answer")
+    parser.add_argument("--retry-after", type=int, default=2, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, help="seed for latency and fault draws")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="DIR", help="proxy to the real API and save cassettes here")
+    mode.add_argument("--replay", metavar="DIR", help="serve cassettes from here")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="multiplier for recorded timings, 0 for instant (default: 1)")
+    parser.add_argument("--upstream", default=UPSTREAM_URL, help="real endpoint used by --record")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    config = MockConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_status.split(",") if s.strip()],
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+        drop_rate=args.drop_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        record_dir=args.record,
+        replay_dir=args.replay,
+        replay_speed=args.replay_speed,
+        upstream=args.upstream,
+    )
+    server = make_server(config, args.host, args.port, verbose=args.verbose)
+    print(f"Mock OpenRouter on http://{args.host}:{server.server_port}{COMPLETIONS_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Complexity-aware model routing.
+
+Replaces the fixed "Physics and Chemistry get gpt-4o" rule. Each question is
+scored from cheap local features (length, equations, multi-part markers,
+reasoning verbs and, when known, how long answers to similar questions
+were). Scoring above the subject's threshold selects the stronger tier,
+subject to the rule's tier limits and a latency budget checked against
+observed p95s.
+
+Rules are plain dicts so they can be overridden from settings as JSON:
+
+    {"*": {"latency_budget": 20}, "Physics": {"threshold": 0.3},
+     "English Literature": {"max_tier": "fast"}}
+
+Run ``python model_router.py`` for a dry-run report over the ``history``
+table that compares the router with the old subject map.
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import warnings
+from collections import Counter
+
+from answer_storage import answer_text
+
+# Cheapest first
+TIERS = [
+    {"name": "fast", "model": "openai/gpt-4o-mini", "relative_cost": 1.0},
+    {"name": "strong", "model": "openai/gpt-4o", "relative_cost": 16.0},
+]
+
+DEFAULT_WEIGHTS = {
+    "length": 0.15,
+    "equations": 0.20,
+    "parts": 0.20,
+    "reasoning": 0.30,
+    "history": 0.15,
+}
+
+DEFAULT_RULE = {
+    "threshold": 0.35,
+    "min_tier": "fast",
+    "max_tier": "strong",
+    # Seconds; a tier whose observed p95 is above this is skipped if a cheaper one fits
+    "latency_budget": None,
+}
+
+# Calculation-heavy subjects tip over to the strong model sooner
+SUBJECT_RULES = {
+    "Mathematics": {"threshold": 0.30},
+    "Physics": {"threshold": 0.25},
+    "Chemistry": {"threshold": 0.25},
+    "Computer Science": {"threshold": 0.30},
+}
+
+_REASONING = re.compile(
+    r"\b(prove|proof|derive|derivation|show that|justify|explain why|compare|contrast|"
+    r"evaluate|analy[sz]e|critically|design|optimi[sz]e|implement|mechanism)\b",
+    re.IGNORECASE,
+)
+_PARTS = re.compile(
+    r"(?:^|\s)\(?(?:[a-h]|i{1,3}|iv|v)\)\s|(?:^|\n)\s*\d+[.)]\s|\bpart\s+\(?[a-h0-9]\b",
+    re.IGNORECASE,
+)
+_EQUATION = re.compile(r"[=<>≤≥]|\\frac|\^|\bsqrt\b|∫|∑|d/dx", re.IGNORECASE)
+
+
+def _tier_index(name: str) -> int:
+    for index, tier in enumerate(TIERS):
+        if tier["name"] == name:
+            return index
+    raise ValueError(f"Unknown model tier: {name!r}")
+
+
+def legacy_model(subject: str) -> str:
+    """The old fixed subject map, kept for the dry-run comparison."""
+    if subject in ("Physics", "Chemistry"):
+        return "openai/gpt-4o"
+    return "openai/gpt-4o-mini"
+
+
+def extract_features(question: str, answer_length: int | None = None) -> dict:
+    """Each feature scaled to 0..1; ``history`` is None when no similar answer is known."""
+    text = question or ""
+    words = len(text.split())
+    equations = len(_EQUATION.findall(text))
+    parts = len(_PARTS.findall(text)) + max(text.count("?") - 1, 0)
+    return {
+        "length": min(words / 80.0, 1.0),
+        "equations": min(equations / 4.0, 1.0),
+        "parts": min(parts / 3.0, 1.0),
+        "reasoning": 1.0 if _REASONING.search(text) else 0.0,
+        "history": None if answer_length is None else min(answer_length / 2500.0, 1.0),
+    }
+
+
+def complexity_score(features: dict, weights: dict = DEFAULT_WEIGHTS) -> float:
+    """Weighted mean of the known features, 0 (trivial) to 1 (hard)."""
+    total = weight_sum = 0.0
+    for name, weight in weights.items():
+        value = features.get(name)
+        if value is None:
+            continue
+        total += weight * value
+        weight_sum += weight
+    return total / weight_sum if weight_sum else 0.0
+
+
+class RouteDecision:
+    def __init__(self, subject: str, model: str, tier: str, score: float, features: dict, reason: str):
+        self.subject = subject
+        self.model = model
+        self.tier = tier
+        self.score = score
+        self.features = features
+        self.reason = reason
+
+    def as_dict(self) -> dict:
+        return {"subject": self.subject, "model": self.model, "tier": self.tier,
+                "score": round(self.score, 3), "features": self.features, "reason": self.reason}
+
+
+class ModelRouter:
+    """Pick a model tier per question.
+
+    ``latency_of(model)`` may return an observed p95 in seconds (or None) and
+    ``available(model)`` False for a model that should not be used right now,
+    e.g. one whose circuit breaker is open.
+    """
+
+    def __init__(self, rules: dict | None = None, weights: dict | None = None,
+                 latency_of=None, available=None):
+        self.rules = {"*": dict(DEFAULT_RULE)}
+        for subject, rule in SUBJECT_RULES.items():
+            self.rules[subject] = dict(rule)
+        for subject, rule in (rules or {}).items():
+            self.rules.setdefault(subject, {}).update(rule)
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.latency_of = latency_of or (lambda model: None)
+        self.available = available or (lambda model: True)
+
+    def rule_for(self, subject: str) -> dict:
+        return {**DEFAULT_RULE, **self.rules["*"], **self.rules.get(subject, {})}
+
+    def route(self, subject: str, question: str, answer_length: int | None = None) -> RouteDecision:
+        rule = self.rule_for(subject)
+        features = extract_features(question, answer_length)
+        score = complexity_score(features, self.weights)
+        low, high = _tier_index(rule["min_tier"]), _tier_index(rule["max_tier"])
+
+        wanted = high if score >= rule["threshold"] else low
+        reason = f"score {score:.2f} {'>=' if wanted == high else '<'} {rule['threshold']:.2f}"
+
+        # Step down while the wanted tier is over budget or unavailable
+        budget = rule["latency_budget"]
+        index = wanted
+        while index > low:
+            model = TIERS[index]["model"]
+            p95 = self.latency_of(model)
+            if not self.available(model):
+                reason += f"; {TIERS[index]['name']} unavailable"
+            elif budget is not None and p95 is not None and p95 > budget:
+                reason += f"; {TIERS[index]['name']} p95 {p95:.1f}s over {budget:g}s budget"
+            else:
+                break
+            index -= 1
+
+        tier = TIERS[index]
+        return RouteDecision(subject, tier["model"], tier["name"], score, features, reason)
+
+
+def load_rules(raw: str) -> dict:
+    """Parse a JSON rules override; empty or invalid input means no overrides.
+
+    A subject's rule naming an unknown tier is dropped with a warning (that
+    subject keeps its default rule) rather than failing every ``route()``.
+    """
+    if not raw:
+        return {}
+    try:
+        rules = json.loads(raw)
+    except ValueError:
+        warnings.warn("MODEL_ROUTER_RULES is not valid JSON; using the default rules")
+        return {}
+    if not isinstance(rules, dict):
+        warnings.warn("MODEL_ROUTER_RULES must be a JSON object; using the default rules")
+        return {}
+    names = {tier["name"] for tier in TIERS}
+    valid = {}
+    for subject, rule in rules.items():
+        bad = None
+        if not isinstance(rule, dict):
+            bad = "not an object"
+        else:
+            for key in ("min_tier", "max_tier"):
+                if key in rule and rule[key] not in names:
+                    bad = f"unknown {key} {rule[key]!r} (known: {', '.join(sorted(names))})"
+        if bad:
+            warnings.warn(f"Ignoring MODEL_ROUTER_RULES entry for {subject!r}: {bad}")
+            continue
+        valid[subject] = rule
+    return valid
+
+
+def dry_run(db_path: str, router: ModelRouter, limit: int | None = None) -> dict:
+    """Route every stored question and compare with the old subject map.
+
+    Uses the stored answer's own length as the history feature, i.e. what
+    the router would have known had a near-duplicate been answered before.
+    The database is opened read-only.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(history)")}
+        # Databases from before answer_format existed hold HTML (NULL reads as such)
+        answer_format = "answer_format" if "answer_format" in columns else "NULL"
+        query = f"SELECT subject, question, answer, {answer_format} FROM history ORDER BY id DESC"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        rows = conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+    per_subject = {}
+    changed = []
+    for subject, question, answer, answer_format in rows:
+        decision = router.route(subject, question, len(answer_text(answer, answer_format)) if answer else None)
+        old = legacy_model(subject)
+        stats = per_subject.setdefault(subject, {"questions": 0, "scores": [], "tiers": Counter(),
+                                                 "changed": 0, "cost_old": 0.0, "cost_new": 0.0})
+        stats["questions"] += 1
+        stats["scores"].append(decision.score)
+        stats["tiers"][decision.tier] += 1
+        cost = {tier["model"]: tier["relative_cost"] for tier in TIERS}
+        stats["cost_old"] += cost.get(old, 1.0)
+        stats["cost_new"] += cost[decision.model]
+        if decision.model != old:
+            stats["changed"] += 1
+            changed.append((decision.score, subject, question, old, decision.model))
+
+    report = {"questions": len(rows), "subjects": {}, "examples": []}
+    for subject, stats in sorted(per_subject.items()):
+        scores = sorted(stats["scores"])
+        report["subjects"][subject] = {
+            "questions": stats["questions"],
+            "median_score": round(scores[len(scores) // 2], 3),
+            "tiers": dict(stats["tiers"]),
+            "changed": stats["changed"],
+            "relative_cost_change": round(stats["cost_new"] / stats["cost_old"] - 1.0, 3),
+        }
+    for score, subject, question, old, new in sorted(changed, reverse=True)[:10]:
+        report["examples"].append({"subject": subject, "score": round(score, 3),
+                                   "question": question[:120], "from": old, "to": new})
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Dry-run the model router over stored history.")
+    parser.add_argument("--db", default="homework_history.db", help="SQLite file with the history table")
+    parser.add_argument("--limit", type=int, help="only the most recent N questions")
+    parser.add_argument("--rules", default="", help="JSON rules override, as in MODEL_ROUTER_RULES")
+    args = parser.parse_args(argv)
+
+    report = dry_run(args.db, ModelRouter(rules=load_rules(args.rules)), args.limit)
+    print(f"{report['questions']} questions")
+    print(f"{'Subject':<20} {'n':>5} {'median':>7} {'fast':>5} {'strong':>7} {'changed':>8} {'cost':>7}")
+    for subject, row in report["subjects"].items():
+        print(f"{subject:<20} {row['questions']:>5} {row['median_score']:>7.2f} "
+              f"{row['tiers'].get('fast', 0):>5} {row['tiers'].get('strong', 0):>7} "
+              f"{row['changed']:>8} {row['relative_cost_change']:>+7.0%}")
+    if report["examples"]:
+        print("\nLargest changes:")
+        for example in report["examples"]:
+            print(f"  [{example['score']:.2f}] {example['subject']}: {example['from']} -> "
+                  f"{example['to']}  {example['question']}")
+
+
+if __name__ == "__main__":
+    main()
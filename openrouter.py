@@ -0,0 +1,346 @@
+"""Thin OpenRouter chat-completions client shared by the Streamlit apps.
+
+Kept free of Streamlit so it can be used from background threads and scripts;
+callers decide how errors are shown to the user.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+# OPENROUTER_URL points the apps at a stand-in such as mock_openrouter.py
+OPENROUTER_URL = os.environ.get("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+CONNECT_TIMEOUT = 6.0
+DEFAULT_FIRST_TOKEN_TIMEOUT = 10.0
+DEFAULT_TOTAL_TIMEOUT = 90.0
+
+
+class OpenRouterError(Exception):
+    """Non-success reply: an HTTP error status or an error event mid-stream."""
+
+    def __init__(self, message: str, status_code: int | None = None, retry_after: str | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        # Raw Retry-After header value (seconds or an HTTP date), if the reply had one
+        self.retry_after = retry_after
+
+
+class StreamTimeout(Exception):
+    """A streamed completion missed one of its deadlines."""
+
+
+class FirstTokenTimeout(StreamTimeout):
+    """No content arrived within the first-token deadline."""
+
+
+class TotalTimeout(StreamTimeout):
+    """The stream was still running when the total deadline passed."""
+
+
+class Cancelled(Exception):
+    """The attempt was abandoned because another one already won."""
+
+
+def chat_completion(headers: dict, body: dict, timeout: float = 30, session=None,
+                    meta: dict | None = None) -> str:
+    """Blocking completion; returns the message text or raises ``OpenRouterError``.
+
+    If ``meta`` is given it is filled with ``status``, ``ttfb`` (seconds until
+    the response headers), the ``model`` that actually answered and the
+    provider's ``usage`` block, for telemetry.
+    """
+    http = session or requests
+    response = http.post(OPENROUTER_URL, headers=headers, json=body, timeout=timeout)
+    if meta is not None:
+        meta["status"] = response.status_code
+        meta["ttfb"] = response.elapsed.total_seconds()
+    if response.status_code != 200:
+        raise OpenRouterError(f"OpenRouter returned HTTP {response.status_code}", response.status_code,
+                              response.headers.get("Retry-After"))
+    try:
+        payload = response.json()
+        content = payload['choices'][0]['message']['content']
+    except (ValueError, KeyError, IndexError, TypeError) as exc:
+        raise OpenRouterError("Malformed completion payload", response.status_code) from exc
+    if meta is not None:
+        meta["model"] = payload.get("model")
+        meta["usage"] = payload.get("usage")
+    return content
+
+
+def iter_sse_lines(response: requests.Response):
+    """Yield decoded, stripped lines of a server-sent-events body as they arrive.
+
+    ``iter_content(chunk_size=None)`` hands over data as soon as the server
+    flushes it instead of waiting for a fixed-size buffer to fill up.
+    """
+    buffer = b""
+    for chunk in response.iter_content(chunk_size=None):
+        buffer += chunk
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            yield line.strip().decode("utf-8", errors="replace")
+    if buffer.strip():
+        yield buffer.strip().decode("utf-8", errors="replace")
+
+
+def stream_chat_completion(headers: dict, body: dict,
+                           first_token_timeout: float = DEFAULT_FIRST_TOKEN_TIMEOUT,
+                           total_timeout: float = DEFAULT_TOTAL_TIMEOUT,
+                           session=None, meta: dict | None = None):
+    """Yield content deltas of a streamed completion.
+
+    ``first_token_timeout`` bounds the wait for the first piece of content and
+    is also used as the socket read timeout, so a stalled connection is cut off
+    after that long without any bytes. ``total_timeout`` bounds the whole
+    stream. Raises ``FirstTokenTimeout``/``TotalTimeout``, ``OpenRouterError``
+    or ``requests.RequestException``.
+
+    ``meta`` is filled as in ``chat_completion``; ``ttfb`` here is the time to
+    the first content delta, and ``usage`` arrives with the last event.
+    """
+    if meta is None:
+        meta = {}
+    started = time.monotonic()
+    http = session or requests
+    try:
+        response = http.post(
+            OPENROUTER_URL,
+            headers=headers,
+            json={**body, "stream": True},
+            stream=True,
+            timeout=(CONNECT_TIMEOUT, first_token_timeout),
+        )
+    except requests.exceptions.ReadTimeout as exc:
+        raise FirstTokenTimeout(f"No response after {first_token_timeout:g}s") from exc
+
+    with response:
+        meta["status"] = response.status_code
+        if response.status_code != 200:
+            raise OpenRouterError(f"OpenRouter returned HTTP {response.status_code}", response.status_code,
+                                  response.headers.get("Retry-After"))
+
+        got_content = False
+        lines = iter_sse_lines(response)
+        while True:
+            try:
+                line = next(lines)
+            except StopIteration:
+                return
+            except requests.exceptions.RequestException as exc:
+                # A socket read timeout before any text is a missed first-token deadline
+                if not got_content and time.monotonic() - started >= first_token_timeout:
+                    raise FirstTokenTimeout(f"No tokens after {first_token_timeout:g}s") from exc
+                raise
+
+            elapsed = time.monotonic() - started
+            if not got_content and elapsed > first_token_timeout:
+                raise FirstTokenTimeout(f"No tokens after {first_token_timeout:g}s")
+            if elapsed > total_timeout:
+                raise TotalTimeout(f"Stream exceeded {total_timeout:g}s")
+
+            # Comments such as ": OPENROUTER PROCESSING" are keep-alives
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            if event.get("error"):
+                error = event["error"]
+                message = error.get("message", "stream error") if isinstance(error, dict) else str(error)
+                raise OpenRouterError(message)
+            if event.get("model"):
+                meta["model"] = event["model"]
+            if event.get("usage"):
+                meta["usage"] = event["usage"]
+            choices = event.get("choices") or []
+            if not choices:
+                continue
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                if not got_content:
+                    meta["ttfb"] = elapsed
+                got_content = True
+                yield delta
+
+
+def collect_completion(headers: dict, body: dict, cancel_event: threading.Event | None = None,
+                       first_token_timeout: float = DEFAULT_FIRST_TOKEN_TIMEOUT,
+                       total_timeout: float = DEFAULT_TOTAL_TIMEOUT,
+                       session=None) -> str:
+    """Run a completion to the end and return its full text.
+
+    The request is streamed under the hood so it can be abandoned: once
+    ``cancel_event`` is set the next chunk closes the connection, which makes
+    OpenRouter stop generating (and billing) the rest of the answer.
+    """
+    parts = []
+    stream = stream_chat_completion(headers, body, first_token_timeout, total_timeout, session=session)
+    try:
+        for delta in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                raise Cancelled(body.get("model", ""))
+            parts.append(delta)
+    finally:
+        stream.close()
+    return "".join(parts)
+
+
+# Shared by all sessions; attempts are I/O bound so a few dozen threads is plenty
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="openrouter-hedge")
+
+
+def hedged_completion(headers: dict, primary_body: dict, fallback_body: dict,
+                      hedge_delay: float, latency_tracker=None,
+                      first_token_timeout: float = DEFAULT_FIRST_TOKEN_TIMEOUT,
+                      total_timeout: float = DEFAULT_TOTAL_TIMEOUT) -> tuple[str, str]:
+    """Race the primary model against a delayed fallback; return ``(text, model)``.
+
+    The fallback starts when the primary has not finished after ``hedge_delay``
+    seconds, or immediately if the primary fails first. Whichever finishes
+    first wins and the other attempt is cancelled. Successful latencies are
+    recorded in ``latency_tracker`` (a ``latency.LatencyTracker``) so callers
+    can adapt the delay. Raises the last attempt's error when both fail.
+    """
+    cancel_events = {}
+    started_at = {}
+
+    def _attempt(name: str, body: dict) -> str:
+        text = collect_completion(
+            headers, body, cancel_events[name],
+            first_token_timeout=first_token_timeout,
+            total_timeout=total_timeout,
+        )
+        if latency_tracker is not None:
+            latency_tracker.record(body["model"], time.monotonic() - started_at[name])
+        return text
+
+    def _launch(name: str, body: dict):
+        cancel_events[name] = threading.Event()
+        started_at[name] = time.monotonic()
+        future = _HEDGE_POOL.submit(_attempt, name, body)
+        pending[future] = (name, body["model"])
+        return future
+
+    pending = {}
+    _launch("primary", primary_body)
+    done, _ = wait(list(pending), timeout=hedge_delay)
+    if not done:
+        _launch("fallback", fallback_body)
+
+    last_error = None
+    while pending:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            name, model = pending.pop(future)
+            try:
+                text = future.result()
+            except Exception as exc:
+                last_error = exc
+                if "fallback" not in cancel_events:
+                    _launch("fallback", fallback_body)
+                continue
+            for other_name, event in cancel_events.items():
+                if other_name != name:
+                    event.set()
+            return text, model
+
+    raise last_error
+
+
+def first_token_key(model: str) -> str:
+    """``LatencyTracker`` key for a model's time to first token (vs. whole answers)"""
+    return f"{model} first token"
+
+
+def hedged_stream(headers: dict, primary_body: dict, fallback_body: dict,
+                  hedge_delay: float, latency_tracker=None,
+                  first_token_timeout: float = DEFAULT_FIRST_TOKEN_TIMEOUT,
+                  total_timeout: float = DEFAULT_TOTAL_TIMEOUT):
+    """Streaming ``hedged_completion``: yield the deltas of whichever model speaks first.
+
+    The fallback stream starts when the primary has sent no content after
+    ``hedge_delay`` seconds, or immediately if the primary fails first. The
+    first stream to produce a token is kept and the other is closed; after
+    that there is no switching, so errors of the kept stream are raised to the
+    caller. Times to first token are recorded in ``latency_tracker`` under
+    ``first_token_key(model)``. Raises the last error when both fail before
+    any content.
+    """
+    events = queue.Queue()
+    cancel_events = {}
+
+    def _attempt(name: str, body: dict, cancel_event: threading.Event) -> None:
+        started = time.monotonic()
+        stream = stream_chat_completion(headers, body, first_token_timeout, total_timeout)
+        try:
+            for delta in stream:
+                if cancel_event.is_set():
+                    return
+                if latency_tracker is not None and started is not None:
+                    latency_tracker.record(first_token_key(body["model"]), time.monotonic() - started)
+                    started = None
+                events.put((name, delta, None))
+        except Exception as exc:
+            events.put((name, None, exc))
+            return
+        finally:
+            stream.close()
+        events.put((name, None, None))
+
+    def _launch(name: str, body: dict) -> None:
+        cancel_events[name] = threading.Event()
+        _HEDGE_POOL.submit(_attempt, name, body, cancel_events[name])
+
+    _launch("primary", primary_body)
+    hedge_at = time.monotonic() + hedge_delay
+    winner = None
+    last_error = None
+    try:
+        while True:
+            if "fallback" not in cancel_events:
+                try:
+                    name, delta, error = events.get(timeout=max(hedge_at - time.monotonic(), 0))
+                except queue.Empty:
+                    _launch("fallback", fallback_body)
+                    continue
+            else:
+                name, delta, error = events.get()
+
+            if winner is None:
+                if delta is None:
+                    # Failed (or ended empty) before any content
+                    last_error = error or last_error
+                    cancel_events[name].set()
+                    if "fallback" not in cancel_events:
+                        _launch("fallback", fallback_body)
+                    elif all(event.is_set() for event in cancel_events.values()):
+                        if last_error is not None:
+                            raise last_error
+                        return
+                    continue
+                winner = name
+                for other_name, event in cancel_events.items():
+                    if other_name != name:
+                        event.set()
+            elif name != winner:
+                continue
+
+            if delta is None:
+                if error is not None:
+                    raise error
+                return
+            yield delta
+    finally:
+        for event in cancel_events.values():
+            event.set()
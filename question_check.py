@@ -0,0 +1,187 @@
+"""Cheap local checks before a question is sent to the tutor.
+
+Catches, without a provider call:
+
+* empty-ish input ("?", "help", a stray character),
+* questions over the size limit,
+* the same question submitted again within a few seconds (double clicks),
+* questions that are obviously about another subject, e.g. a Chemistry
+  question on the Mathematics page; the student is offered the right
+  subject, or can ask anyway.
+
+The subject check is a keyword vote over small per-subject vocabularies. It
+only objects when the selected subject gets no votes and another subject
+gets several, so short or generic questions always go through.
+"""
+
+import re
+import time
+
+from answer_cache import normalize_question
+
+MAX_QUESTION_CHARS = 4000
+DEBOUNCE_SECONDS = 3.0
+
+# Other subjects need at least this many keyword hits to call a question off-subject
+OFF_SUBJECT_MIN_HITS = 2
+
+OK = "ok"
+EMPTY = "empty"
+TOO_LONG = "too_long"
+DUPLICATE = "duplicate"
+OFF_SUBJECT = "off_subject"
+
+# Vague one-word requests that say nothing about the problem
+_FILLER = {"help", "hi", "hello", "hey", "question", "test", "pls", "please", "solve",
+           "answer", "explain", "idk", "what", "why", "how", "this", "it", "homework"}
+
+VOCABULARY = {
+    "Mathematics": {
+        "algebra", "integral", "integrate", "derivative", "differentiate", "matrix", "matrices",
+        "polynomial", "quadratic", "equation", "inequality", "factor", "factorise", "factorize",
+        "logarithm", "log", "trigonometry", "sin", "cos", "tan", "theorem", "proof", "prove",
+        "probability", "geometry", "triangle", "circle", "angle", "vector", "limit", "sequence",
+        "series", "fraction", "prime", "simplify", "graph", "slope", "parabola", "hypotenuse",
+        "calculus", "sqrt", "root", "exponent", "percentage", "mean", "median", "variance",
+    },
+    "Physics": {
+        "velocity", "acceleration", "force", "newton", "momentum", "energy", "kinetic",
+        "potential", "gravity", "gravitational", "friction", "mass", "inertia", "projectile",
+        "circuit", "current", "voltage", "resistance", "ohm", "magnetic", "electric", "charge",
+        "wave", "frequency", "wavelength", "optics", "lens", "refraction", "thermodynamics",
+        "pressure", "torque", "displacement", "speed", "power", "joule", "watt", "quantum",
+        "relativity", "photon", "oscillation", "pendulum", "spring", "collision", "impulse",
+    },
+    "Chemistry": {
+        "mole", "molar", "molarity", "atom", "atomic", "molecule", "compound", "element",
+        "reaction", "reactant", "product", "balance", "stoichiometry", "acid", "base", "ph",
+        "oxidation", "reduction", "redox", "electron", "ion", "ionic", "covalent", "bond",
+        "periodic", "isotope", "titration", "solution", "solubility", "catalyst", "enthalpy",
+        "equilibrium", "organic", "alkane", "alkene", "ester", "polymer", "valence", "orbital",
+        "electrolysis", "precipitate", "concentration",
+    },
+    "Biology": {
+        "cell", "mitosis", "meiosis", "dna", "rna", "gene", "genetic", "chromosome", "protein",
+        "enzyme", "photosynthesis", "respiration", "evolution", "natural selection", "species",
+        "ecosystem", "organism", "bacteria", "virus", "immune", "hormone", "neuron", "tissue",
+        "organ", "membrane", "mitochondria", "chloroplast", "allele", "heredity", "mutation",
+        "anatomy", "digestion", "blood", "heart", "plant", "animal", "nucleus", "ribosome",
+    },
+    "English Literature": {
+        "poem", "poetry", "poet", "novel", "author", "character", "theme", "symbolism",
+        "metaphor", "simile", "imagery", "narrator", "shakespeare", "sonnet", "stanza", "scene",
+        "protagonist", "antagonist", "irony", "tone", "essay", "literary", "plot", "tragedy", "comedy", "dickens", "austen", "hamlet", "macbeth", "romeo", "juliet",
+        "alliteration", "grammar", "rhetoric", "quote", "passage", "fiction",
+    },
+    "History": {
+        "war", "world war", "empire", "revolution", "century", "ancient", "medieval", "treaty",
+        "king", "queen", "emperor", "dynasty", "colonial", "colonialism", "independence",
+        "civilization", "civilisation", "rome", "roman", "greek", "egypt", "renaissance",
+        "reformation", "cold war", "napoleon", "hitler", "battle", "monarchy", "feudal",
+        "slavery", "civil rights", "industrial revolution", "historian",
+    },
+    "Economics": {
+        "supply", "demand", "market", "price", "elasticity", "inflation", "gdp", "unemployment",
+        "monetary", "fiscal", "interest rate", "tax", "tariff", "trade", "monopoly", "oligopoly",
+        "competition", "equilibrium", "utility", "marginal", "cost", "revenue", "profit",
+        "consumer", "producer", "recession", "economy", "economic", "budget", "deficit",
+        "exchange rate", "opportunity cost", "subsidy", "externality",
+    },
+    "Computer Science": {
+        "algorithm", "code", "program", "programming", "python", "java", "javascript", "c++",
+        "function", "array", "list", "loop", "recursion", "recursive", "sort", "sorting",
+        "search", "binary", "tree", "graph", "linked list", "stack", "queue", "hash",
+        "complexity", "big o", "database", "sql", "class", "object", "compiler", "variable",
+        "pointer", "string", "implement", "debug", "bug", "api", "network", "dynamic programming",
+    },
+}
+
+_WORD = re.compile(r"[a-z][a-z+]*")
+_DIGIT = re.compile(r"\d")
+_OPERATOR = re.compile(r"[-+*/^=<>!%√×÷]")
+
+
+class CheckResult:
+    def __init__(self, status: str, message: str = "", suggestion: str | None = None):
+        self.status = status
+        self.message = message
+        self.suggestion = suggestion
+
+    @property
+    def ok(self) -> bool:
+        return self.status == OK
+
+
+def _terms(text: str) -> tuple[set[str], str]:
+    """Words (plus their singular) and the normalized text for phrase matches"""
+    lowered = " ".join(text.lower().split())
+    words = set()
+    for word in _WORD.findall(lowered):
+        words.add(word)
+        if len(word) > 3 and word.endswith("s"):
+            words.add(word[:-1])
+    return words, f" {lowered} "
+
+
+def subject_scores(question: str) -> dict[str, int]:
+    """Keyword hits per subject"""
+    words, padded = _terms(question)
+    scores = {}
+    for subject, vocabulary in VOCABULARY.items():
+        hits = 0
+        for term in vocabulary:
+            if " " in term:
+                hits += f" {term} " in padded
+            else:
+                hits += term in words
+        scores[subject] = hits
+    return scores
+
+
+def is_empty(question: str) -> bool:
+    """Nothing a tutor could work with: blank, one filler word, or a fragment
+    under three letters/digits that is not a bit of math such as "2+2" or "x=2"
+    """
+    text = (question or "").strip()
+    if sum(ch.isalnum() for ch in text) < 3:
+        return not (_DIGIT.search(text) and _OPERATOR.search(text))
+    words = re.findall(r"\w+", text.lower())
+    return len(words) == 1 and words[0] in _FILLER
+
+
+def is_duplicate(last: dict | None, subject: str, question: str,
+                 window: float = DEBOUNCE_SECONDS, now: float | None = None) -> bool:
+    """Whether ``last`` (see ``remember_submit``) is the same question moments ago"""
+    if not last:
+        return False
+    now = time.time() if now is None else now
+    return (last.get("subject") == subject
+            and last.get("question") == normalize_question(question)
+            and now - last.get("at", 0.0) < window)
+
+
+def remember_submit(subject: str, question: str, now: float | None = None) -> dict:
+    """State for ``is_duplicate``; callers keep it per session"""
+    return {"subject": subject, "question": normalize_question(question),
+            "at": time.time() if now is None else now}
+
+
+def check_question(subject: str, question: str, last: dict | None = None,
+                   max_chars: int = MAX_QUESTION_CHARS, window: float = DEBOUNCE_SECONDS,
+                   check_subject: bool = True) -> CheckResult:
+    """Run the cheap checks in order; the first one that objects wins."""
+    text = (question or "").strip()
+    if is_empty(text):
+        return CheckResult(EMPTY, "Please enter a question — include the problem and what you need to find.")
+    if len(text) > max_chars:
+        return CheckResult(TOO_LONG, f"That question is {len(text):,} characters long; the limit is "
+                                     f"{max_chars:,}. Please shorten it or split it into smaller questions.")
+    if is_duplicate(last, subject, text, window):
+        return CheckResult(DUPLICATE)
+    if check_subject and subject in VOCABULARY:
+        scores = subject_scores(text)
+        best = max(scores, key=scores.get)
+        if scores.get(subject, 0) == 0 and best != subject and scores[best] >= OFF_SUBJECT_MIN_HITS:
+            return CheckResult(OFF_SUBJECT, f"This looks like a {best} question, but you are on the "
+                                            f"{subject} page.", suggestion=best)
+    return CheckResult(OK)
@@ -0,0 +1,152 @@
+"""Split multi-part homework questions and solve the parts side by side.
+
+"A ball is thrown up at 20 m/s. (a) Find the max height. (b) Find the time of
+flight." becomes two questions that share the stem. They are solved
+concurrently, each through the normal pipeline (and so each with its own
+cache entry), and merged back in their original order under "**Part (x):**"
+headers. The wall-clock time is that of the slowest part instead of one long
+completion.
+
+Parts are recognised by "(a)"/"a)"/"(i)" markers, by "1." / "2)" numbering
+at the start of a line, or as separate tasks joined by "and" ("Differentiate
+x^2 and integrate 3x") when every task has an expression of its own. A plain
+"and" inside an equation or a list of unknowns ("solve x + y = 5 and
+x - y = 1", "find x and y") is not a split, and neither is a task that only
+works on what an earlier one gave it ("... and find the gradient at x = 2").
+
+Parts that refer back to each other ("hence", "using your answer to (a)",
+"evaluate it", "its stages") are left together, because solving them
+separately would lose the dependency.
+"""
+
+import re
+
+MAX_PARTS = 8
+
+# "(a)", "a)", "(ii)" at the start of the text or after whitespace; not "f(a)"
+_MARKER = re.compile(r"(?:(?<=\s)|^)(?:\(([a-h]|i{1,3}|iv|vi{0,3}|ix|x)\)|([a-h])\))(?=\s)", re.IGNORECASE)
+
+# "1." / "2)" / "(3)" numbering at the start of a line; not "1.5" or "f(1)"
+_NUMBERED = re.compile(r"(?m)^[ \t]*\(?(\d{1,2})[.)](?=\s)")
+
+_TASK = (r"(?:find|calculate|compute|solve|differentiate|integrate|evaluate|simplify|factori[sz]e|"
+         r"expand|determine|state|name|define|explain|describe|list|convert)\b")
+# "... and integrate 3x": only before another task verb
+_AND_TASK = re.compile(rf"(?:,\s*|\s+)and\s+(?={_TASK})", re.IGNORECASE)
+_TASK_START = re.compile(_TASK, re.IGNORECASE)
+_SENTENCE_END = re.compile(r"[.?!]\s+|\n")
+_MATH = re.compile(r"[\d=^]")
+# "at x = 2": a value to evaluate something at, not an expression of its own
+_AT_VALUE = re.compile(r"\b(?:at|when|where|for|if|with)\s+[a-z]\s*=\s*-?\d+(?:\.\d+)?", re.IGNORECASE)
+
+_LETTERS = "abcdefgh"
+_ROMANS = ["i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x"]
+
+_DEPENDENT = re.compile(
+    r"\b(hence|thus|therefore|using (?:your|the|this) (?:answer|result|value)s?|"
+    r"from (?:part|the previous|above)|in part|part \(?[a-h]\)?|previous part|above|"
+    r"the same|this result|it|its|this|that|these|those|they|them|their|"
+    r"the (?:gradient|slope|tangent|result|answer|solutions?|roots?))\b",
+    re.IGNORECASE,
+)
+
+
+def _sequence(labels: list[str]) -> bool:
+    """Labels must run a, b, c... or i, ii, iii... from the start."""
+    for series in (_LETTERS, _ROMANS):
+        if labels == list(series[:len(labels)]):
+            return True
+    return False
+
+
+def _cut(text: str, spans: list[tuple[int, int]], labels: list[str], end: int):
+    """``(stem, parts)`` for the part markers at ``spans``, each part running to the next"""
+    parts = []
+    for index, (_, body_start) in enumerate(spans):
+        body_end = spans[index + 1][0] if index + 1 < len(spans) else end
+        body = text[body_start:body_end].strip()
+        if len(body) < 3:
+            return None
+        parts.append((labels[index], body))
+    return text[:spans[0][0]].strip(), parts
+
+
+def _marked(text: str):
+    markers = list(_MARKER.finditer(text))
+    labels = [(m.group(1) or m.group(2)).lower() for m in markers]
+    if len(markers) < 2 or not _sequence(labels):
+        return None
+    return _cut(text, [m.span() for m in markers], labels, len(text))
+
+
+def _numbered(text: str):
+    markers = list(_NUMBERED.finditer(text))
+    labels = [m.group(1) for m in markers]
+    if len(markers) < 2 or labels != [str(n) for n in range(1, len(labels) + 1)]:
+        return None
+    return _cut(text, [m.span() for m in markers], labels, len(text))
+
+
+def _joined(text: str):
+    joins = list(_AND_TASK.finditer(text))
+    if not joins:
+        return None
+    # The tasks must make up one sentence that starts with a task verb; any
+    # sentences before it are the shared stem
+    start = 0
+    for boundary in _SENTENCE_END.finditer(text, 0, joins[0].start()):
+        start = boundary.end()
+    if not _TASK_START.match(text, start):
+        return None
+    stop = _SENTENCE_END.search(text, joins[-1].end())
+    end = stop.start() if stop else len(text)
+    if text[end:].strip(" .\n"):
+        return None  # more text after the tasks, which might belong to either
+    spans = [(start, start)] + [m.span() for m in joins]
+    split = _cut(text, spans, list(_LETTERS[:len(spans)]), end)
+    # Every task needs its own expression: in "Find the mean and find the
+    # median of 2, 4, 6" or "Differentiate y = x^3 and find the gradient at
+    # x = 2" the data of one task belongs to the other as well
+    if split is None or not all(_MATH.search(_AT_VALUE.sub("", body)) for _, body in split[1]):
+        return None
+    return split
+
+
+def split_parts(question: str) -> tuple[str, list[tuple[str, str]]] | None:
+    """Return ``(stem, [(label, text), ...])`` for independent parts, else None."""
+    text = (question or "").strip()
+    split = _marked(text) or _numbered(text) or _joined(text)
+    if split is None:
+        return None
+    stem, parts = split
+    if len(parts) > MAX_PARTS:
+        return None
+    if any(_DEPENDENT.search(body) for _, body in parts[1:]):
+        return None
+    return stem, parts
+
+
+def part_question(stem: str, body: str) -> str:
+    """Stand-alone question for one part: the shared stem plus that part."""
+    return f"{stem}\n\n{body}" if stem else body
+
+
+def part_header(label: str, body: str) -> str:
+    """Single-line header; ``format_response`` renders it as a part heading."""
+    return f"**Part ({label}):** {' '.join(body.split())}"
+
+
+def solve_in_order(questions: list[str], solve, executor):
+    """Run ``solve(question)`` for all questions concurrently; yield results in order.
+
+    Each result is yielded as soon as it and everything before it are done.
+    The first exception is re-raised once the earlier parts have been
+    yielded; parts that did succeed are still cached by ``solve``.
+    """
+    futures = [executor.submit(solve, question) for question in questions]
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
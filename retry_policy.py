@@ -0,0 +1,225 @@
+"""Retries and pacing for provider calls.
+
+``RetryPolicy`` retries transient failures (429, 5xx, connection errors,
+missed first-token deadlines) with exponential backoff and full jitter. It
+honours a provider's ``Retry-After`` and never goes past a total deadline:
+each attempt is handed the seconds left, to cap its own request timeout at.
+A stream is only retried before its first chunk has been handed out, so for
+a stream the deadline bounds the wait for that chunk.
+
+``TokenBucket`` paces requests per model. When a classroom bursts, calls
+queue for a token instead of all hitting the provider at once and coming
+back as 429s. A ``Retry-After`` also pauses the model's bucket, so the
+other sessions back off too.
+"""
+
+import email.utils
+import random
+import threading
+import time
+
+import requests
+
+import openrouter
+from circuit_breaker import CircuitOpenError
+
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class RateLimited(Exception):
+    """No pacing token became available within the remaining deadline."""
+
+    def __init__(self, name: str, waited: float):
+        super().__init__(f"{name}: no request slot within {waited:.1f}s")
+        self.name = name
+
+
+def parse_retry_after(value, now: float | None = None) -> float | None:
+    """Seconds to wait from a ``Retry-After`` value (delta-seconds or HTTP date)."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(when.timestamp() - (now if now is not None else time.time()), 0.0)
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Whether sending the same request again can reasonably succeed.
+
+    Chat completions have no side effects besides cost, so a request that
+    may have reached the provider (read timeout, 5xx) is still safe to resend.
+    Deliberate rejections (4xx other than 408/425/429), an open circuit and a
+    stream that already produced text are not retried.
+    """
+    if isinstance(exc, (CircuitOpenError, RateLimited, openrouter.TotalTimeout)):
+        return False
+    if isinstance(exc, openrouter.FirstTokenTimeout):
+        return True
+    if isinstance(exc, openrouter.OpenRouterError):
+        return exc.status_code is None or exc.status_code in RETRYABLE_STATUSES
+    return isinstance(exc, (requests.exceptions.ConnectionError,
+                            requests.exceptions.Timeout,
+                            requests.exceptions.ChunkedEncodingError))
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``burst``; thread-safe."""
+
+    def __init__(self, rate: float, burst: int = 1, name: str = ""):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.name = name
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Take a token, waiting up to ``timeout`` seconds (forever if None)."""
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = max((1 - self._tokens) / self.rate, self._paused_until - now, 0.001)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for ``seconds`` (after a 429 with Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {"tokens": round(self._tokens, 2), "paused_for": max(self._paused_until - now, 0.0)}
+
+
+class Pacer:
+    """One ``TokenBucket`` per model, created on first use."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def get(self, name: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(name)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst, name)
+                self._buckets[name] = bucket
+            return bucket
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {name: bucket.snapshot() for name, bucket in buckets.items()}
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 deadline: float = 45.0, rng: random.Random | None = None, sleep=time.sleep,
+                 clock=time.monotonic):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self._rng = rng or random.Random()
+        self._sleep = sleep
+        self._clock = clock
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base_delay * 2**attempt)]."""
+        return self._rng.uniform(0.0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _retry_delay(self, exc: Exception, attempt: int, started: float,
+                     bucket: TokenBucket | None) -> float | None:
+        """Seconds to sleep before the next attempt, or None to give up."""
+        if attempt >= self.max_attempts or not is_retryable(exc):
+            return None
+        retry_after = parse_retry_after(getattr(exc, "retry_after", None))
+        delay = retry_after if retry_after is not None else self.backoff(attempt - 1)
+        if self._clock() - started + delay >= self.deadline:
+            return None
+        if retry_after is not None and bucket is not None:
+            # The paused bucket holds back this call and every other one for the model
+            bucket.pause(retry_after)
+            return 0.0
+        return delay
+
+    def _remaining(self, started: float) -> float:
+        return max(self.deadline - (self._clock() - started), 0.0)
+
+    def _wait_for_slot(self, bucket: TokenBucket | None, started: float) -> None:
+        if bucket is None:
+            return
+        remaining = self._remaining(started)
+        if not bucket.acquire(timeout=remaining):
+            raise RateLimited(bucket.name, remaining)
+
+    def call(self, fn, bucket: TokenBucket | None = None):
+        """Return ``fn(remaining)``, retrying retryable errors within the attempt and time budget.
+
+        ``remaining`` is the seconds left before the deadline; ``fn`` must not
+        let its request run longer than that.
+        """
+        started = self._clock()
+        attempt = 0
+        while True:
+            self._wait_for_slot(bucket, started)
+            try:
+                return fn(self._remaining(started))
+            except Exception as exc:
+                attempt += 1
+                delay = self._retry_delay(exc, attempt, started, bucket)
+                if delay is None:
+                    raise
+                self._sleep(delay)
+
+    def stream(self, factory, bucket: TokenBucket | None = None):
+        """Yield from ``factory(remaining)``, starting over on retryable errors before the first chunk."""
+        started = self._clock()
+        attempt = 0
+        while True:
+            self._wait_for_slot(bucket, started)
+            produced = False
+            try:
+                for chunk in factory(self._remaining(started)):
+                    produced = True
+                    yield chunk
+                return
+            except Exception as exc:
+                attempt += 1
+                delay = None if produced else self._retry_delay(exc, attempt, started, bucket)
+                if delay is None:
+                    raise
+                self._sleep(delay)
@@ -11,6 +11,34 @@ import matplotlib.pyplot as plt
 import numpy as np
 import io
 import base64
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import fast_solver
+import http_pool
+import openrouter
+from answer_cache import AnswerCache, make_cache_key
+from answer_storage import TEXT, decode_answer, encode_answer, ensure_columns, migrate_history, render_stored
+from circuit_breaker import OPEN, STREAM, BreakerRegistry, CircuitOpenError, FIRST_TOKEN, is_provider_failure
+from completion_control import DEFAULT_MAX_TOKENS, LengthBudgets, stop_at_end, trim_after_end
+from conversations import DEFAULT_CONTEXT_BUDGET, SUMMARY_MAX_TOKENS, ConversationStore, build_context, summary_messages
+from format_memo import FORMAT_MEMO_DB_PATH, FormatMemo
+from formatting import FORMATTER_VERSION, StreamingFormatter
+from model_router import TIERS, ModelRouter, load_rules
+from question_check import DEBOUNCE_SECONDS, DUPLICATE, MAX_QUESTION_CHARS, OFF_SUBJECT, check_question, remember_submit
+from question_splitter import part_question, solve_in_order, split_parts
+from retry_policy import Pacer, RateLimited, RetryPolicy
+from similar_questions import QuestionIndex
+from single_flight import SingleFlight
+from solution_jobs import JobStore
+from solution_request import answer_max_tokens, build_request, choose_model, merged_parts, route_text
+from structured_answers import parse_answer
+from subjects import SUBJECTS
+from telemetry import SOURCE_API, SOURCE_CACHE, SOURCE_COALESCED, SOURCE_LOCAL, SOURCE_SUMMARY, Telemetry
+from warmup import WarmUp, example_questions, top_questions
 
 # Try to import streamlit_oauth, fallback if not available
 try:
@@ -449,6 +477,7 @@ def load_css():
     .code-block .code-header {{ background: #161b22; color: #8b949e; font-size: 0.85rem; padding: 0.3rem 0.6rem; border-bottom: 1px solid #30363d; border-top-left-radius: 8px; border-top-right-radius: 8px; }}
     .code-block pre {{ margin: 0; padding: 0.75rem; overflow-x: auto; }}
     .step-code {{ background: rgba(0,0,0,0.04); border: 1px dashed rgba(0,0,0,0.2); padding: 0.6rem; border-radius: 6px; margin: 0.4rem 0 0.8rem 0; }}
+    .plain-line {{ white-space: pre-wrap; overflow-wrap: anywhere; }}
     .final-answer {{
         background: linear-gradient(135deg, #FFD700, #FFA500) !important;
         border: 2px solid #FFD700 !important;
@@ -607,6 +636,22 @@ def load_css():
         font-size: 18px !important;
     }}
 
+    /* Part headers of multi-part solutions */
+    .part-header {{
+        color: #FFD700 !important;
+        font-weight: 800 !important;
+        font-size: 1.15em !important;
+        border-bottom: 1px solid rgba(255, 215, 0, 0.4) !important;
+        padding-bottom: 0.3rem !important;
+        margin: 1.5rem 0 0.5rem 0 !important;
+    }}
+
+    /* Lines shown unformatted because formatting ran out of time */
+    .plain-line {{
+        white-space: pre-wrap !important;
+        overflow-wrap: anywhere !important;
+    }}
+
     /* Step code - Black background with white text */
     .step-code {{
         background: #000000 !important;
@@ -651,750 +696,550 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
-# Subject definitions
-SUBJECTS = {
-    "Mathematics": {
-        "icon": "",
-        "prompt": """You are an expert mathematics tutor. Provide clear, step-by-step solutions:
-
-FORMATTING REQUIREMENTS:
-1. Use "**Step 1:**", "**Step 2:**" etc. for each step
-2. Write mathematical expressions in plain text: use x^2 for x², sqrt(x) for square roots
-3. For fractions, use format: (numerator)/(denominator) - this will be displayed properly
-4. Put each mathematical equation on its own line
-5. Explain the reasoning behind each step
-6. End with "**Final Answer:**"
-7. Keep explanations clear and concise
-8. Add blank lines between steps for better readability
-
-FRACTION EXAMPLES:
-- Write dy/dx = (2x + 1)/(x^2 + 1)
-- Write y = (x^2 + 3x + 2)/(x + 1)
-- This will display with numerator over denominator in a single box
-
-Provide detailed explanations but keep the formatting clean and readable.""",
-        "example": "Solve: 3x² - 12x + 9 = 0"
-    },
-    "Physics": {
-        "icon": "",
-        "prompt": """You are a senior physics tutor. Produce highly readable, plain‑text solutions.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use "**Step 1:**", "**Step 2:**" etc. for each step (short title on one line)
-2. On the next line, briefly explain the idea (why we do this step)
-3. On the next line, put the equation with quantities and units in simple text (no LaTeX, no \\(...\\) or symbols). Examples:
-   - v = u + a*t
-   - F = m*a
-   - v = sqrt(2*g*h)
-4. Substitute numbers on a separate line, with SI units:
-   - v = sqrt(2*9.8 m/s^2*10 m)
-5. Compute and show the numeric result on its own line with the unit:
-   - v = 14.0 m/s
-6. Include a short "Assumptions" line when needed (e.g., ignore air resistance).
-7. End with "**Final Answer:**" on its own line with the value and the unit.
-
-STYLE:
-- Plain text only (no LaTeX, no Greek letters, write "mu" not μ)
-- Keep numbers with 2–3 significant figures unless the question demands otherwise
-- Always show units in every formula line and result line
-- Add blank lines between steps for readability
-""",
-        "example": "A 2 kg object falls from 10 m height. Find velocity just before impact."
-    },
-    "Chemistry": {
-        "icon": "",
-        "prompt": """You are a senior chemistry tutor. Produce highly readable, plain‑text solutions.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use "**Step 1:**", "**Step 2:**" etc. as a SINGLE LINE title
-2. On the next line, explain the idea briefly (why this step is needed)
-3. On the next line, write the relevant equation in simple text (no LaTeX). Examples:
-   - rate = k * [A]^m * [B]^n
-   - t_half = 0.693 / k
-   - M = m / n
-4. Substitute numbers on a separate line with proper units where applicable
-5. Compute and show the numeric result on its own line with clear units
-6. Balance chemical equations when required and show the balanced form on its own line
-7. Add an "Assumptions" line when needed (e.g., ideal behavior, constant temperature)
-8. End with "**Final Answer:**" on its own line with the value (and unit) or the balanced equation
-
-STYLE:
-- Plain text only (no LaTeX, avoid special symbols). Write arrows using '->' and charges like 'SO4^2-'
-- Keep numbers to 2–3 significant figures unless the problem demands more
-- Always include units next to numbers where relevant
-- Add blank lines between steps for readability
-""",
-        "example": "Balance: Al + O2 -> Al2O3"
-    },
-    "Biology": {
-        "icon": "",
-        "prompt": """You are a senior biology tutor. Produce highly readable, plain‑text solutions.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use "**Step 1:**", "**Step 2:**" etc. as a SINGLE LINE title
-2. On the next line, explain the idea briefly (why this step matters biologically)
-3. On the next line, if a process/equation exists, write it in simple text (no LaTeX). Examples:
-   - Photosynthesis: 6 CO2 + 6 H2O -> C6H12O6 + 6 O2
-   - ATP yield per glucose in aerobic respiration: ~30–32 ATP
-4. If any quantities are computed, show substitution on a separate line and result on a new line with units (price/quantity)
-5. Add an "Assumptions" line when needed (e.g., standard temperature, typical eukaryotic cell)
-6. End with "**Final Answer:**" summarizing the key result or definition in one clear sentence
-
-STYLE:
-- Plain text only, no LaTeX; arrows as '->', charges as '^', and units explicit when used
-- 2–3 concise sentences per step; add blank lines between steps for readability
-""",
-        "example": "Explain the process of cellular respiration in detail."
-    },
-    "English Literature": {
-        "icon": "",
-        "prompt": """You are a senior literature tutor. Produce structured, plain‑text analyses.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use steps as SINGLE LINE titles (e.g., **Step 1:** Thesis)
-2. Next line: concise explanation of the claim for that step
-3. Next line: quote or evidence (short and attributed) on its own line with quotation marks
-4. Next line: analysis that links evidence to the claim in 1–2 sentences
-5. Repeat for 2–3 key points
-6. End with "**Final Answer:**" one‑sentence conclusion that directly answers the question
-
-STYLE:
-- Plain text only; keep quotes short; add blank lines between steps for readability
-""",
-        "example": "Analyze the symbolism of light and darkness in Romeo and Juliet."
-    },
-    "History": {
-        "icon": "",
-        "prompt": """You are a senior history tutor. Produce chronological/thematic, plain‑text analyses.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use steps as SINGLE LINE titles (e.g., **Step 1:** Long‑term causes)
-2. Next line: 1–2 sentence explanation of the factor
-3. Next line: key evidence/fact/date on its own line
-4. Next line: consequence/impact that links to the question
-5. Cover 3–5 major factors; keep each step compact
-6. End with "**Final Answer:**" one‑sentence conclusion that synthesizes the argument
-
-STYLE:
-- Plain text only; neutral tone; add blank lines between steps for readability
-""",
-        "example": "Analyze the causes of World War I."
-    },
-    "Economics": {
-        "icon": "",
-        "prompt": """You are a senior economics tutor. Produce clear, plain‑text, step‑by‑step solutions.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use "**Step 1:**", "**Step 2:**" etc. as SINGLE LINE titles
-2. Next line: explain the concept (demand/supply/elasticity/etc.) in 1–2 sentences
-3. Next line: write the relevant equation in simple text (no LaTeX). Examples:
-   - Qd = a − bP
-   - Qs = c + dP
-   - Equilibrium: set Qd = Qs and solve for P and Q
-4. If numbers are given, show substitution on a separate line and compute the result on a new line with units (price/quantity)
-5. Add assumptions where needed (e.g., linear demand, ceteris paribus)
-6. End with "**Final Answer:**" stating the numeric or conceptual result
-
-STYLE:
-- Plain text only; keep math simple and vertically separated; add blank lines between steps for readability
-""",
-        "example": "Explain supply and demand equilibrium with a market example."
-    },
-    "Computer Science": {
-        "icon": "💻",
-        "prompt": """You are a computer science expert. Provide solutions using the EXACT format below.
-
-FORMATTING REQUIREMENTS:
-1. Use "**Step 1:**", "**Step 2:**" etc. for each step as a SINGLE LINE
-2. Follow each step with explanatory text on the NEXT LINE
-3. Then show relevant syntax/code snippet on SEPARATE LINES (not horizontal)
-4. Add blank lines between steps for readability
-5. ALWAYS include "**Time Complexity:**" and "**Space Complexity:**" sections before the final code
-6. End with "**Complete Code**" followed by ONE consolidated, executable code block fenced with language (e.g., ```python)
-
-EXAMPLE FORMAT:
-**Step 1:** Initialize two pointers
-Set left pointer to start and right pointer to end of array.
-```
-left = 0
-right = len(array) - 1
-```
-
-**Step 2:** Compare middle element
-Find middle index and compare with target value.
-```
-mid = (left + right) // 2
-if array[mid] == target:
-    return mid
-```
-
-**Time Complexity:** O(log n) where n is the size of the array
-**Space Complexity:** O(1) constant space usage
-
-**Complete Code**
-```python
-# full, runnable program here
-```
-
-Keep explanations clean and readable with proper vertical separation.""",
-        "example": "Implement binary search algorithm in Python."
-    }
-}
-
 # API Functions
-def get_api_response(question, subject):
-    """Get response from OpenRouter API"""
-    if 'OPENROUTER_API_KEY' not in st.secrets:
-        st.error("⚠️ API key not configured. Please add OPENROUTER_API_KEY to Streamlit secrets.")
-        return None
-
-    api_key = st.secrets['OPENROUTER_API_KEY']
+def get_setting(name: str, default):
+    """Read an optional tuning value from Streamlit secrets, cast to the default's type"""
+    try:
+        value = st.secrets.get(name, default)
+    except Exception:
+        return default
+    if isinstance(default, bool) and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    try:
+        return type(default)(value)
+    except (TypeError, ValueError):
+        return default
+
+STREAM_SOLUTIONS = get_setting('STREAM_SOLUTIONS', True)
+FIRST_TOKEN_TIMEOUT = get_setting('FIRST_TOKEN_TIMEOUT', openrouter.DEFAULT_FIRST_TOKEN_TIMEOUT)
+STREAM_TOTAL_TIMEOUT = get_setting('STREAM_TOTAL_TIMEOUT', openrouter.DEFAULT_TOTAL_TIMEOUT)
+
+@st.cache_resource
+def get_answer_cache() -> AnswerCache:
+    """Process-wide answer cache shared by all sessions"""
+    ttl_hours = get_setting('ANSWER_CACHE_TTL_HOURS', 24.0 * 7)
+    max_entries = get_setting('ANSWER_CACHE_MAX_ENTRIES', 5000)
+    return AnswerCache(ttl_seconds=int(ttl_hours * 3600), max_entries=max_entries)
+
+@st.cache_resource
+def get_format_memo() -> FormatMemo:
+    """Formatted HTML of recent answers, so a cache hit is not formatted again"""
+    return FormatMemo(
+        max_entries=get_setting('FORMAT_MEMO_ENTRIES', 1000),
+        db_path=FORMAT_MEMO_DB_PATH if get_setting('FORMAT_MEMO_ON_DISK', True) else None,
+    )
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Keep-alive connection pool shared by OpenRouter and backend calls"""
+    # One immediate retry: the local-history fallback already covers a backend that is down
+    return http_pool.build_session(retries=get_setting('HTTP_RETRIES', 1))
+
+@st.cache_resource
+def get_single_flight() -> SingleFlight:
+    """Coalesces identical in-flight LLM calls across all sessions"""
+    return SingleFlight()
+
+@st.cache_resource
+def get_telemetry() -> Telemetry:
+    """Per-request LLM telemetry table (see telemetry.summary)"""
+    return Telemetry(DB_PATH, retention_days=get_setting('TELEMETRY_RETENTION_DAYS', 30.0))
+
+@st.cache_resource
+def get_circuit_breakers() -> BreakerRegistry:
+    """Per-model circuit breakers and latency windows, shared by all sessions"""
+    return BreakerRegistry(
+        window_seconds=get_setting('BREAKER_WINDOW_SECONDS', 60.0),
+        min_requests=get_setting('BREAKER_MIN_REQUESTS', 5),
+        error_threshold=get_setting('BREAKER_ERROR_RATE', 0.5),
+        open_seconds=get_setting('BREAKER_OPEN_SECONDS', 30.0),
+    )
 
-    model = "openai/gpt-4o-mini"
-    if subject in ("Physics", "Chemistry"):
-        model = "openai/gpt-4o"
+@st.cache_resource
+def get_retry_policy() -> RetryPolicy:
+    """Backoff with full jitter and Retry-After for transient provider errors"""
+    return RetryPolicy(
+        max_attempts=get_setting('RETRY_MAX_ATTEMPTS', 3),
+        base_delay=get_setting('RETRY_BASE_DELAY', 0.5),
+        max_delay=get_setting('RETRY_MAX_DELAY', 8.0),
+        deadline=get_setting('RETRY_DEADLINE', 45.0),
+    )
 
-    body = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": SUBJECTS[subject]['prompt']},
-            {"role": "user", "content": question}
-        ],
-        "temperature": 0.1,
-        "max_tokens": 2000
-    }
+@st.cache_resource
+def get_pacer() -> Pacer:
+    """Per-model token buckets that queue bursts instead of sending them all at once"""
+    return Pacer(rate=get_setting('MODEL_RATE_PER_SECOND', 5.0), burst=get_setting('MODEL_BURST', 10))
+
+@st.cache_resource
+def get_model_router() -> ModelRouter:
+    """Complexity-based model choice; rules can be overridden with MODEL_ROUTER_RULES (JSON)"""
+    breakers = get_circuit_breakers()
+
+    def latency_of(model):
+        # Only trust the breaker's p95 once it has a reasonable number of samples
+        info = breakers.get(model).snapshot()
+        p95 = info["stream_p95"] if STREAM_SOLUTIONS and not STRUCTURED_ANSWERS else info["p95"]
+        return p95 if info["requests"] >= 20 else None
+
+    return ModelRouter(
+        rules=load_rules(get_setting('MODEL_ROUTER_RULES', '')),
+        latency_of=latency_of,
+        available=lambda model: breakers.get(model).state != OPEN,
+    )
 
-    try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=body,
-            timeout=30
-        )
+EARLY_STOP = get_setting('EARLY_STOP', True)
+STRUCTURED_ANSWERS = get_setting('STRUCTURED_ANSWERS', False)
 
-        if response.status_code == 200:
-            return response.json()['choices'][0]['message']['content']
-        else:
-            st.error("Service temporarily unavailable. Please try again.")
-            return None
+@st.cache_resource
+def get_length_budgets() -> LengthBudgets:
+    """Per-subject max_tokens from the stored answer-length distribution"""
+    return LengthBudgets(
+        DB_PATH,
+        pct=get_setting('ANSWER_LENGTH_PERCENTILE', 99.0),
+        ceiling=get_setting('MAX_TOKENS', DEFAULT_MAX_TOKENS),
+    )
 
-    except requests.exceptions.RequestException as e:
-        st.error(f"Network Error: {str(e)}")
+def solve_locally(question, subject):
+    """Deterministic answer for simple linear/quadratic equations, else None"""
+    if subject != "Mathematics":
         return None
-
-import re
-import html
-
-def format_powers(text):
-    """Convert ^2, ^3, etc. to proper superscript format"""
-    # Replace common powers with superscript
-    text = re.sub(r'\^2', '<span class="power">2</span>', text)
-    text = re.sub(r'\^3', '<span class="power">3</span>', text)
-    text = re.sub(r'\^4', '<span class="power">4</span>', text)
-    text = re.sub(r'\^(\d+)', r'<span class="power">\1</span>', text)
-    text = re.sub(r'\^(\([^)]+\))', r'<span class="power">\1</span>', text)
-    # Replace sqrt(...) with √(...)
-    text = re.sub(r'\bsqrt\s*\(', '√(', text)
-    return text
-
-def format_fraction(numerator, denominator):
-    """Format a fraction with numerator over denominator in inline style"""
-    num_clean = format_powers(numerator.strip())
-    den_clean = format_powers(denominator.strip())
-
-    return f"""<div class="fraction-display">
-        <div>{num_clean}</div>
-        <div class="fraction-bar"></div>
-        <div>{den_clean}</div>
-    </div>"""
-
-def format_response(response_text):
-    """Improved formatting with consistent vertical fractions and tighter spacing.
-
-    Also formats Computer Science responses:
-    - Preserves fenced code blocks in a styled container
-    - Keeps non-code steps readable like math section
+    return fast_solver.solve(question)
+
+class MissingApiKey(Exception):
+    """OPENROUTER_API_KEY is not configured"""
+
+def solution_error_message(exc: Exception) -> str:
+    """User-facing text for a failed solution request"""
+    if isinstance(exc, MissingApiKey):
+        return "⚠️ API key not configured. Please add OPENROUTER_API_KEY to Streamlit secrets."
+    if isinstance(exc, RateLimited):
+        return "Lots of students are asking right now. Please try again in a moment."
+    if isinstance(exc, CircuitOpenError):
+        return (f"The tutor service is having trouble right now. "
+                f"Please try again in about {max(exc.retry_in, 1):.0f} seconds.")
+    if isinstance(exc, openrouter.FirstTokenTimeout):
+        return "The tutor is taking too long to respond. Please try again."
+    if isinstance(exc, openrouter.TotalTimeout):
+        return "The solution was cut short because it took too long."
+    if isinstance(exc, requests.exceptions.RequestException):
+        return f"Network Error: {str(exc)}"
+    return "Service temporarily unavailable. Please try again."
+
+def _guarded_call(breaker, fn, record):
+    """Run one provider call through the model's circuit breaker.
+
+    ``record(latency, error)`` is called once with the outcome, for telemetry.
     """
-    if not response_text:
-        return ""
-
-    # Clean up LaTeX notation to simple text but preserve fraction structure
-    response_text = re.sub(r'\\sqrt\{([^}]+)\}', r'sqrt(\1)', response_text)
-    response_text = re.sub(r'\\[a-zA-Z]+\{?([^}]*)\}?', r'\1', response_text)
-
-    # Handle fenced code blocks (```lang ... ```)
-    formatted_content = []
-    code_block_open = False
-    code_lines = []
-    code_lang = None
-
-    lines = response_text.strip().split('\n')
-    for line in lines:
-        line = line.strip()
-        if not line:
-            # Add minimal spacing between sections
-            if not code_block_open:
-                formatted_content.append("<br>")
-            continue
-
-        # Detect start/end of fenced code blocks
-        if line.startswith('```'):
-            fence = line.strip()
-            if not code_block_open:
-                # opening
-                code_block_open = True
-                code_lines = []
-                code_lang = fence.strip('`').strip() or 'text'
-            else:
-                # closing -> render and reset
-                escaped = html.escape("\n".join(code_lines))
-                formatted_content.append(
-                    f'<div class="code-block"><div class="code-header">{code_lang}</div><pre><code>{escaped}</code></pre></div>'
-                )
-                code_block_open = False
-                code_lines = []
-                code_lang = None
-            continue
-
-        if code_block_open:
-            code_lines.append(line)
-            continue
-
-        # Skip stray closing tags that may appear in the model text
-        if re.match(r'^\s*</(div|span|p)>\s*$', line):
-            continue
-
-        # One-line step headers with next-line explanation in monospace box
-        if re.match(r'^\*\*Step \d+:', line) or re.match(r'^###\s*Step \d+:', line):
-            step_text = re.sub(r'\*\*|###', '', line).strip()
-            # Keep step title on one line
-            formatted_content.append(f'<div style="color:#4CAF50;font-weight:700;margin:0.6rem 0 0.2rem 0;">{step_text}</div>')
-            # The explanation for this step is expected on the next line; we wrap whatever comes next
-            # by inserting an opener token that the next non-empty, non-step line will close.
-            formatted_content.append('<!--STEP_CODE_NEXT-->')
-
-        # Final answer (simple one-line box, as before)
-        elif 'Final Answer' in line:
-            clean_line = re.sub(r'\*\*', '', line)
-            formatted_content.append(f'<div class="final-answer">{format_powers(clean_line)}</div>\n')
-
-        # Check for any line containing fractions - convert ALL to vertical display
-        elif '/' in line and ('(' in line or any(char in line for char in ['x', 'y', 'dx', 'dy', 'du', 'dv'])):
-            # Convert all fractions in the line to vertical display
-            # First handle complex fractions like (numerator)/(denominator) - more comprehensive pattern
-            formatted_line = re.sub(r'\(([^)]+)\)\s*/\s*\(([^)]+)\)', lambda m: format_fraction(m.group(1), m.group(2)), line)
-            # Then handle simple fractions like du/dx, dv/dx, dy/dx
-            formatted_line = re.sub(r'\b([a-zA-Z]+)/([a-zA-Z]+)\b', lambda m: format_fraction(m.group(1), m.group(2)), formatted_line)
-            # Handle any remaining fractions with parentheses - catch cases like (2x + 1) / (x² + 1)²
-            formatted_line = re.sub(r'\(([^)]+)\)\s*/\s*([^/\s]+)', lambda m: format_fraction(m.group(1), m.group(2)), formatted_line)
-            formatted_content.append(f'<div class="math-line">{format_powers(formatted_line)}</div>\n')
-
-
-
-        # If we previously saw a step header, wrap this first following line in step-code box
-        elif formatted_content and formatted_content[-1] == '<!--STEP_CODE_NEXT-->':
-            formatted_content.pop()  # remove token
-            formatted_content.append(f'<div class="step-code">{html.escape(line)}</div>')
-
-        # Mathematical expressions with equations (no fractions)
-        elif ('=' in line and any(char in line for char in ['x', '+', '-', '*', '^', '(', ')'])):
-            formatted_content.append(f'<div class="math-line">{format_powers(line)}</div>\n')
-
-        # Regular text
+    try:
+        breaker.before_call()
+    except CircuitOpenError as exc:
+        record(0.0, exc)
+        raise
+    started = time.monotonic()
+    try:
+        result = fn()
+    except Exception as exc:
+        if is_provider_failure(exc):
+            breaker.record_failure()
         else:
-            formatted_content.append(f"{format_powers(line)}\n")
+            breaker.record_success()
+        record(time.monotonic() - started, exc)
+        raise
+    latency = time.monotonic() - started
+    breaker.record_success(latency)
+    record(latency, None)
+    return result
+
+def _guarded_stream(breaker, factory, record):
+    """Like ``_guarded_call`` for a stream; also records time to first token"""
+    try:
+        breaker.before_call()
+    except CircuitOpenError as exc:
+        record(0.0, exc)
+        raise
+    started = time.monotonic()
+    first = True
+    try:
+        for chunk in factory():
+            if first:
+                breaker.record_latency(time.monotonic() - started, FIRST_TOKEN)
+                first = False
+            yield chunk
+    except Exception as exc:
+        if is_provider_failure(exc):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        record(time.monotonic() - started, exc)
+        raise
+    latency = time.monotonic() - started
+    breaker.record_success(latency, STREAM)
+    record(latency, None)
+
+def provider_headers() -> dict:
+    if 'OPENROUTER_API_KEY' not in st.secrets:
+        raise MissingApiKey()
+    return {
+        "Authorization": f"Bearer {st.secrets['OPENROUTER_API_KEY']}",
+        "Content-Type": "application/json"
+    }
 
-    return ''.join(formatted_content)
+def iter_solution_chunks(question, subject, stream=True, history=None):
+    """Yield the solution text for a question; raises instead of touching the UI.
+
+    ``history`` holds the earlier messages of a follow-up conversation (see
+    ``conversation_context``); they are sent between the system prompt and
+    the question and are part of the cache key.
+    Order: local equation solver, answer cache, then OpenRouter. Identical
+    questions in flight at the same moment share one provider call (or one
+    upstream stream), and only complete answers are written to the cache.
+    Provider calls go through the model's circuit breaker, which fails fast
+    while the model is down and sizes timeouts from its observed p99.
+    Answers end after their "**Final Answer:**" (or "**Complete Code**")
+    section: streams are cut off there and anything after it is trimmed.
+    With STRUCTURED_ANSWERS the model returns JSON (see structured_answers)
+    in one non-streamed reply instead.
+    Every path is logged to the telemetry table.
+    Safe to run outside the Streamlit script thread (see solution jobs).
+    """
+    telemetry = get_telemetry()
+    started = time.monotonic()
+    history = history or []
+    local_answer = None if history else solve_locally(question, subject)
+    if local_answer is not None:
+        telemetry.record(subject, "local", SOURCE_LOCAL, time.monotonic() - started)
+        yield local_answer
+        return
+
+    # Built exactly as batch_solve.py does, so its answers are cache hits here
+    model = choose_model(get_model_router(), get_question_index(), DB_PATH, subject, route_text(question, history))
+    request = build_request(
+        subject, question, model,
+        answer_max_tokens(get_length_budgets(), subject, get_setting('MAX_TOKENS', DEFAULT_MAX_TOKENS),
+                          structured=STRUCTURED_ANSWERS),
+        structured=STRUCTURED_ANSWERS, history=history,
+    )
+    prompt_key, body = request.prompt_key, request.body
+    if STRUCTURED_ANSWERS:
+        stream = False
+    cache = get_answer_cache()
+    cached = cache.get(subject, question, model, prompt_key)
+    if cached is not None:
+        telemetry.record(subject, model, SOURCE_CACHE, time.monotonic() - started)
+        yield cached
+        return
+
+    headers = provider_headers()
+    key = make_cache_key(subject, question, model, prompt_key)
+    breaker = get_circuit_breakers().get(model)
+    retry = get_retry_policy()
+    bucket = get_pacer().get(model)
+    meta = {}
+
+    def fresh_meta():
+        # One telemetry row per attempt, so each retry starts from an empty dict
+        meta.clear()
+        return meta
+
+    def record(latency, error):
+        telemetry.record(subject, model, SOURCE_API, latency, ok=error is None,
+                         stream=stream, meta=meta, error=error)
+
+    def record_coalesced(error=None):
+        telemetry.record(subject, model, SOURCE_COALESCED, time.monotonic() - started,
+                         ok=error is None, stream=stream, error=error)
+
+    if not stream:
+        timeout = breaker.timeout(30.0)
+        led = False
+
+        def call():
+            nonlocal led
+            led = True
+            try:
+                answer = retry.call(lambda remaining: _guarded_call(breaker, lambda: openrouter.chat_completion(
+                    headers, body, timeout=min(timeout, remaining), session=get_http_session(), meta=fresh_meta(),
+                ), record), bucket=bucket)
+            except RateLimited as exc:
+                record(0.0, exc)
+                raise
+            return trim_after_end(answer, subject) if EARLY_STOP and not STRUCTURED_ANSWERS else answer
 
-def should_show_diagram(question: str, subject: str) -> bool:
-    """Return True only when the question explicitly asks for a visual/graph/geometry construction.
+        try:
+            answer, shared = get_single_flight().do(key, call)
+        except Exception as exc:
+            # The leader has already logged its own failure
+            if not led:
+                record_coalesced(exc)
+            raise
+        if shared:
+            record_coalesced()
+        else:
+            cache.put(subject, question, model, prompt_key, answer)
+        yield answer
+        return
+
+    # The shared stream is cached once it completes, even if this reader stops early
+    first_token_timeout = breaker.timeout(FIRST_TOKEN_TIMEOUT, kind=FIRST_TOKEN, floor=3.0)
+    total_timeout = breaker.timeout(STREAM_TOTAL_TIMEOUT, kind=STREAM, floor=15.0)
+
+    def upstream(remaining):
+        chunks = openrouter.stream_chat_completion(
+            headers, body,
+            # The retry deadline bounds the wait for a first token, not the answer
+            first_token_timeout=min(first_token_timeout, remaining),
+            total_timeout=total_timeout,
+            session=get_http_session(),
+            meta=fresh_meta(),
+        )
+        # Stopping early closes the response, so the provider stops generating
+        return stop_at_end(chunks, subject) if EARLY_STOP else chunks
 
-    Policy:
-    - Require an explicit drawing intent for algebra/calculus/trig (draw/plot/graph/sketch/construct/diagram/illustrate/visualize)
-    - Always allow geometry constructions when common geometry terms appear
-    - Keep other subjects conservative
+    def attempts():
+        try:
+            yield from retry.stream(lambda remaining: _guarded_stream(breaker, lambda: upstream(remaining), record),
+                                    bucket=bucket)
+        except RateLimited as exc:
+            record(0.0, exc)
+            raise
+
+    flight = get_single_flight().stream(
+        key,
+        attempts,
+        on_complete=lambda text: cache.put(subject, question, model, prompt_key, text),
+    )
+    if not flight.shared:
+        yield from flight
+        return
+    try:
+        yield from flight
+    except Exception as exc:
+        record_coalesced(exc)
+        raise
+    record_coalesced()
+
+SPLIT_MULTIPART = get_setting('SPLIT_MULTIPART', True)
+
+@st.cache_resource
+def get_part_pool() -> ThreadPoolExecutor:
+    """Workers for the parts of multi-part questions, separate from the job pool"""
+    return ThreadPoolExecutor(max_workers=get_setting('PART_WORKERS', 16),
+                              thread_name_prefix="question-part")
+
+def iter_solution(question, subject, stream=True, history=None):
+    """``iter_solution_chunks`` with multi-part questions fanned out.
+
+    Independent parts "(a) ... (b) ..." are solved concurrently, each as its
+    own question (and cache entry), and yielded in order as soon as each
+    part and the ones before it are done. Follow-ups are never split.
     """
-    q = question.lower()
-
-    # 1) Strong drawing intent verbs
-    intent = any(w in q for w in [
-        'draw', 'plot', 'graph', 'sketch', 'construct', 'diagram', 'illustrate', 'visualize'
-    ])
-    
-    # 2) Geometry terms that usually need construction
-    geometry_terms = any(w in q for w in [
-        'triangle', 'circle', 'polygon', 'angle', 'perpendicular', 'parallel'
-    ])
-    
-    if subject == "Mathematics":
-        return intent or geometry_terms
-    else:
-        return intent
-
-# Subject definitions
-SUBJECTS = {
-    "Mathematics": {
-        "icon": "📐",
-        "prompt": """You are an expert mathematics tutor. Provide clear, step-by-step solutions:
-
-FORMATTING REQUIREMENTS:
-1. Use "**Step 1:**", "**Step 2:**" etc. for each step
-2. Write mathematical expressions in plain text: use x^2 for x², sqrt(x) for square roots
-3. For fractions, use format: (numerator)/(denominator) - this will be displayed properly
-4. Put each mathematical equation on its own line
-5. Explain the reasoning behind each step
-6. End with "**Final Answer:**"
-7. Keep explanations clear and concise
-8. Add blank lines between steps for better readability
-
-FRACTION EXAMPLES:
-- Write dy/dx = (2x + 1)/(x^2 + 1)
-- Write y = (x^2 + 3x + 2)/(x + 1)
-- This will display with numerator over denominator in a single box
-
-Provide detailed explanations but keep the formatting clean and readable.""",
-        "example": "Solve: 3x² - 12x + 9 = 0"
-    },
-    "Physics": {
-        "icon": "⚡",
-        "prompt": """You are a senior physics tutor. Produce highly readable, plain‑text solutions.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use "**Step 1:**", "**Step 2:**" etc. for each step (short title on one line)
-2. On the next line, briefly explain the idea (why we do this step)
-3. On the next line, put the equation with quantities and units in simple text (no LaTeX, no \\(...\\) or symbols). Examples:
-   - v = u + a*t
-   - F = m*a
-   - v = sqrt(2*g*h)
-4. Substitute numbers on a separate line, with SI units:
-   - v = sqrt(2*9.8 m/s^2*10 m)
-5. Compute and show the numeric result on its own line with the unit:
-   - v = 14.0 m/s
-6. Include a short "Assumptions" line when needed (e.g., ignore air resistance).
-7. End with "**Final Answer:**" on its own line with the value and the unit.
-
-STYLE:
-- Plain text only (no LaTeX, no Greek letters, write "mu" not μ)
-- Keep numbers with 2–3 significant figures unless the question demands otherwise
-- Always show units in every formula line and result line
-- Add blank lines between steps for readability
-""",
-        "example": "A 2 kg object falls from 10 m height. Find velocity just before impact."
-    },
-    "Chemistry": {
-        "icon": "🧪",
-        "prompt": """You are a senior chemistry tutor. Produce highly readable, plain‑text solutions.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use "**Step 1:**", "**Step 2:**" etc. as a SINGLE LINE title
-2. On the next line, explain the idea briefly (why this step is needed)
-3. On the next line, write the relevant equation in simple text (no LaTeX). Examples:
-   - rate = k * [A]^m * [B]^n
-   - t_half = 0.693 / k
-   - M = m / n
-4. Substitute numbers on a separate line with proper units where applicable
-5. Compute and show the numeric result on its own line with clear units
-6. Balance chemical equations when required and show the balanced form on its own line
-7. Add an "Assumptions" line when needed (e.g., ideal behavior, constant temperature)
-8. End with "**Final Answer:**" on its own line with the value (and unit) or the balanced equation
-
-STYLE:
-- Plain text only (no LaTeX, avoid special symbols). Write arrows using '->' and charges like 'SO4^2-'
-- Keep numbers to 2–3 significant figures unless the problem demands more
-- Always include units next to numbers where relevant
-- Add blank lines between steps for readability
-""",
-        "example": "Balance: Al + O2 -> Al2O3"
-    },
-    "Biology": {
-        "icon": "🧬",
-        "prompt": """You are a senior biology tutor. Produce highly readable, plain‑text solutions.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use "**Step 1:**", "**Step 2:**" etc. as a SINGLE LINE title
-2. On the next line, explain the idea briefly (why this step matters biologically)
-3. On the next line, if a process/equation exists, write it in simple text (no LaTeX). Examples:
-   - Photosynthesis: 6 CO2 + 6 H2O -> C6H12O6 + 6 O2
-   - ATP yield per glucose in aerobic respiration: ~30–32 ATP
-4. If any quantities are computed, show substitution on a separate line and result on a new line with units
-5. Add an "Assumptions" line when needed (e.g., standard temperature, typical eukaryotic cell)
-6. End with "**Final Answer:**" summarizing the key result or definition in one clear sentence
-
-STYLE:
-- Plain text only, no LaTeX; arrows as '->', charges as '^', and units explicit when used
-- 2–3 concise sentences per step; add blank lines between steps for readability
-""",
-        "example": "Explain the process of cellular respiration in detail."
-    },
-    "English Literature": {
-        "icon": "📚",
-        "prompt": """You are a senior literature tutor. Produce structured, plain‑text analyses.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use steps as SINGLE LINE titles (e.g., **Step 1:** Thesis)
-2. Next line: concise explanation of the claim for that step
-3. Next line: quote or evidence (short and attributed) on its own line with quotation marks
-4. Next line: analysis that links evidence to the claim in 1–2 sentences
-5. Repeat for 2–3 key points
-6. End with "**Final Answer:**" one‑sentence conclusion that directly answers the question
-
-STYLE:
-- Plain text only; keep quotes short; add blank lines between steps for readability
-""",
-        "example": "Analyze the symbolism of light and darkness in Romeo and Juliet."
-    },
-    "History": {
-        "icon": "🏛️",
-        "prompt": """You are a senior history tutor. Produce chronological/thematic, plain‑text analyses.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use steps as SINGLE LINE titles (e.g., **Step 1:** Long‑term causes)
-2. Next line: 1–2 sentence explanation of the factor
-3. Next line: key evidence/fact/date on its own line
-4. Next line: consequence/impact that links to the question
-5. Cover 3–5 major factors; keep each step compact
-6. End with "**Final Answer:**" one‑sentence conclusion that synthesizes the argument
-
-STYLE:
-- Plain text only; neutral tone; add blank lines between steps for readability
-""",
-        "example": "Analyze the causes of World War I."
-    },
-    "Economics": {
-        "icon": "💰",
-        "prompt": """You are a senior economics tutor. Produce clear, plain‑text, step‑by‑step solutions.
-
-FORMATTING REQUIREMENTS (STRICT):
-1. Use "**Step 1:**", "**Step 2:**" etc. as SINGLE LINE titles
-2. Next line: explain the concept (demand/supply/elasticity/etc.) in 1–2 sentences
-3. Next line: write the relevant equation in simple text (no LaTeX). Examples:
-   - Qd = a − bP
-   - Qs = c + dP
-   - Equilibrium: set Qd = Qs and solve for P and Q
-4. If numbers are given, show substitution on a separate line and compute the result on a new line with units (price/quantity)
-5. Add assumptions where needed (e.g., linear demand, ceteris paribus)
-6. End with "**Final Answer:**" stating the numeric or conceptual result
-
-STYLE:
-- Plain text only; keep math simple and vertically separated; add blank lines between steps for readability
-""",
-        "example": "Explain supply and demand equilibrium with a market example."
-    },
-    "Computer Science": {
-        "icon": "💻",
-        "prompt": """You are a computer science expert. Provide solutions using the EXACT format below.
-
-FORMATTING REQUIREMENTS:
-1. Use "**Step 1:**", "**Step 2:**" etc. for each step as a SINGLE LINE
-2. Follow each step with explanatory text on the NEXT LINE
-3. Then show relevant syntax/code snippet on SEPARATE LINES (not horizontal)
-4. Add blank lines between steps for readability
-5. ALWAYS include "**Time Complexity:**" and "**Space Complexity:**" sections before the final code
-6. End with "**Complete Code**" followed by ONE consolidated, executable code block fenced with language (e.g., ```python)
-
-EXAMPLE FORMAT:
-**Step 1:** Initialize two pointers
-Set left pointer to start and right pointer to end of array.
-```
-left = 0
-right = len(array) - 1
-```
-
-**Step 2:** Compare middle element
-Find middle index and compare with target value.
-```
-mid = (left + right) // 2
-if array[mid] == target:
-    return mid
-```
-
-**Time Complexity:** O(log n) where n is the size of the array
-**Space Complexity:** O(1) constant space usage
-
-**Complete Code**
-```python
-# full, runnable program here
-```
-
-Keep explanations clean and readable with proper vertical separation.""",
-        "example": "Implement binary search algorithm in Python."
-    }
-}
+    split = split_parts(question) if SPLIT_MULTIPART and not history else None
+    if split is None:
+        yield from iter_solution_chunks(question, subject, stream=stream, history=history)
+        return
+
+    stem, parts = split
+    answers = solve_in_order(
+        [part_question(stem, body) for _, body in parts],
+        lambda part: ''.join(iter_solution_chunks(part, subject, stream=False)),
+        get_part_pool(),
+    )
+    yield from merged_parts(parts, answers, structured=STRUCTURED_ANSWERS)
 
-# API Functions
 def get_api_response(question, subject):
-    """Get response from OpenRouter API"""
-    if 'OPENROUTER_API_KEY' not in st.secrets:
-        st.error("⚠️ API key not configured. Please add OPENROUTER_API_KEY to Streamlit secrets.")
+    """Get response from OpenRouter API (served from the answer cache when possible)"""
+    try:
+        return ''.join(iter_solution(question, subject, stream=False))
+    except (MissingApiKey, CircuitOpenError, RateLimited, openrouter.OpenRouterError,
+            requests.exceptions.RequestException) as exc:
+        st.error(solution_error_message(exc))
         return None
 
-    api_key = st.secrets['OPENROUTER_API_KEY']
+@st.cache_resource
+def get_job_store() -> JobStore:
+    """Worker pool + result store for solutions, shared by all sessions"""
+    return JobStore(max_workers=get_setting('SOLUTION_WORKERS', 8))
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+# pyplot keeps global state, so figures are drawn one at a time across workers
+_VIZ_LOCK = threading.Lock()
 
-    model = "openai/gpt-4o-mini"
-    if subject in ("Physics", "Chemistry"):
-        model = "openai/gpt-4o"
+def run_solution_job(job, question, subject, history=None):
+    """Worker body: LLM answer, formatted HTML and optional diagram PNG
 
-    body = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": SUBJECTS[subject]['prompt']},
-            {"role": "user", "content": question}
-        ],
-        "temperature": 0.1,
-        "max_tokens": 2000
+    Text answers are formatted as they stream in, so the page shows finished
+    steps early and the answer is not formatted a second time at the end.
+    """
+    formatter = None if STRUCTURED_ANSWERS else StreamingFormatter()
+    # Cache hits and local answers arrive as one chunk and are formatted
+    # through the memo below; formatting starts once a second chunk shows
+    # that the answer is really streaming
+    backlog = None
+    for delta in iter_solution(question, subject, stream=STREAM_SOLUTIONS, history=history):
+        if formatter is None:
+            job.append(delta)
+        elif backlog is None:
+            backlog = delta
+            job.append(delta)
+        else:
+            job.append(delta, formatter.feed(backlog + delta), formatter.pending)
+            backlog = ""
+    snapshot = job.snapshot()
+    response = snapshot['partial']
+    if not response:
+        raise openrouter.OpenRouterError("Empty answer")
+
+    memo = get_format_memo()
+    if backlog == "" and parse_answer(response) is None:
+        formatted = snapshot['partial_html'] + formatter.finish()
+        memo.put(response, formatted)
+    else:
+        formatted = memo.render(response)
+
+    viz = None
+    if should_show_diagram(question, subject):
+        with _VIZ_LOCK:
+            buf = create_smart_visualization(question, subject)
+        viz = buf.getvalue() if buf else None
+
+    return {
+        "response": response,
+        "formatted": formatted,
+        "viz": viz,
     }
 
-    try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=body,
-            timeout=30
-        )
+def submit_solution_job(question, subject, force=False, history=None, pin=False) -> str:
+    """Queue a solution in the background and return its job id"""
+    # Identical questions share a job whichever model ends up answering them
+    prompt_key = SUBJECTS[subject]['prompt']
+    if history:
+        prompt_key += "\n" + json.dumps(history, sort_keys=True, ensure_ascii=False)
+    key = make_cache_key(subject, question, "", prompt_key)
+    return get_job_store().submit(
+        key, lambda job: run_solution_job(job, question, subject, history), force=force, pin=pin
+    )
 
-        if response.status_code == 200:
-            return response.json()['choices'][0]['message']['content']
-        else:
-            st.error("Service temporarily unavailable. Please try again.")
-            return None
+def warm_solution(subject: str, question: str, refresh: bool = False):
+    """Solve a question the way a student's submission would and keep the finished job.
 
-    except requests.exceptions.RequestException as e:
-        st.error(f"Network Error: {str(e)}")
-        return None
+    The job is pinned, so a later identical submission shares it (answer,
+    formatted HTML and diagram) instead of starting over; its answer is
+    also in the answer cache. ``refresh`` redoes the job, e.g. after a
+    prompt or formatter change.
+    """
+    job = get_job_store().get(submit_solution_job(question, subject, force=refresh, pin=True))
+    if job is None:
+        return
+    if not job.wait(timeout=STREAM_TOTAL_TIMEOUT * 2):
+        raise TimeoutError("warm-up job did not finish")
+    error = job.snapshot()["error"]
+    if error is not None:
+        raise error
+
+@st.cache_resource
+def get_warm_up() -> WarmUp:
+    """Background pre-solving of subject examples and the most asked questions"""
+    return WarmUp(warm_solution, concurrency=get_setting('WARM_UP_CONCURRENCY', 2))
+
+def warm_up_items() -> list[tuple[str, str]]:
+    """Every subject's example plus the WARM_UP_TOP_N most asked history questions"""
+    items = example_questions(SUBJECTS)
+    top_n = get_setting('WARM_UP_TOP_N', 20)
+    if top_n > 0:
+        items += [(subject, question) for subject, question, _ in top_questions(DB_PATH, top_n)
+                  if subject in SUBJECTS]
+    return items
+
+@st.cache_resource
+def start_warm_up() -> bool:
+    """Kick off the warm-up once per server process (not once per session)"""
+    if not get_setting('WARM_UP_ON_START', True) or 'OPENROUTER_API_KEY' not in st.secrets:
+        return False
+    return get_warm_up().start(warm_up_items())
 
-import re
-import html
-
-def format_powers(text):
-    """Convert ^2, ^3, etc. to proper superscript format"""
-    # Replace common powers with superscript
-    text = re.sub(r'\^2', '<span class="power">2</span>', text)
-    text = re.sub(r'\^3', '<span class="power">3</span>', text)
-    text = re.sub(r'\^4', '<span class="power">4</span>', text)
-    text = re.sub(r'\^(\d+)', r'<span class="power">\1</span>', text)
-    text = re.sub(r'\^(\([^)]+\))', r'<span class="power">\1</span>', text)
-    # Replace sqrt(...) with √(...)
-    text = re.sub(r'\bsqrt\s*\(', '√(', text)
-    return text
-
-def format_fraction(numerator, denominator):
-    """Format a fraction with numerator over denominator in inline style"""
-    num_clean = format_powers(numerator.strip())
-    den_clean = format_powers(denominator.strip())
-
-    return f"""<div class="fraction-display">
-        <div>{num_clean}</div>
-        <div class="fraction-bar"></div>
-        <div>{den_clean}</div>
-    </div>"""
-
-def format_response(response_text):
-    """Improved formatting with consistent vertical fractions and tighter spacing.
-
-    Also formats Computer Science responses:
-    - Preserves fenced code blocks in a styled container
-    - Keeps non-code steps readable like math section
+@st.cache_resource
+def start_history_migration() -> bool:
+    """Convert history rows stored as HTML, in the background, once per server process"""
+    if not get_setting('MIGRATE_HISTORY_ON_START', True):
+        return False
+    threading.Thread(
+        target=migrate_history,
+        args=(DB_PATH,),
+        kwargs={"compress": get_setting('COMPRESS_HISTORY', True)},
+        name="history-migration",
+        daemon=True,
+    ).start()
+    return True
+
+def is_admin() -> bool:
+    """Signed-in user listed in the comma-separated ADMIN_EMAILS setting"""
+    admins = {email.strip().lower() for email in get_setting('ADMIN_EMAILS', "").split(",") if email.strip()}
+    return (st.session_state.get("user_email") or "").lower() in admins
+
+CONTEXT_TOKEN_BUDGET = get_setting('CONTEXT_TOKEN_BUDGET', DEFAULT_CONTEXT_BUDGET)
+
+@st.cache_resource
+def get_conversations() -> ConversationStore:
+    """Follow-up threads per user and subject, shared by all sessions"""
+    return ConversationStore(DB_PATH)
+
+def conversation_user_key() -> str:
+    """Owner of new threads: the signed-in user, else this browser session"""
+    if st.session_state.get("user_id"):
+        return f"user-{st.session_state.user_id}"
+    if 'conversation_key' not in st.session_state:
+        st.session_state.conversation_key = f"session-{uuid.uuid4().hex}"
+    return st.session_state.conversation_key
+
+def conversation_context(thread_id: int) -> tuple[list[dict], list[dict]]:
+    """(messages to send with a follow-up, turns not yet in the summary)"""
+    store = get_conversations()
+    return build_context(store.turns(thread_id), store.summary(thread_id), CONTEXT_TOKEN_BUDGET)
+
+def summarize_thread(thread_id: int, subject: str):
+    """Fold turns that no longer fit verbatim into the thread's cached summary.
+
+    Runs in the background after an answer is shown. Any failure is ignored:
+    the turns stay pending and are folded in after the next answer.
     """
-    if not response_text:
-        return ""
-
-    # Clean up LaTeX notation to simple text but preserve fraction structure
-    response_text = re.sub(r'\\sqrt\{([^}]+)\}', r'sqrt(\1)', response_text)
-    response_text = re.sub(r'\\[a-zA-Z]+\{?([^}]*)\}?', r'\1', response_text)
-
-    # Handle fenced code blocks (```lang ... ```)
-    formatted_content = []
-    code_block_open = False
-    code_lines = []
-    code_lang = None
-
-    lines = response_text.strip().split('\n')
-    for line in lines:
-        line = line.strip()
-        if not line:
-            # Add minimal spacing between sections
-            if not code_block_open:
-                formatted_content.append("<br>")
-            continue
-
-        # Detect start/end of fenced code blocks
-        if line.startswith('```'):
-            fence = line.strip()
-            if not code_block_open:
-                # opening
-                code_block_open = True
-                code_lines = []
-                code_lang = fence.strip('`').strip() or 'text'
-            else:
-                # closing -> render and reset
-                escaped = html.escape("\n".join(code_lines))
-                formatted_content.append(
-                    f'<div class="code-block"><div class="code-header">{code_lang}</div><pre><code>{escaped}</code></pre></div>'
-                )
-                code_block_open = False
-                code_lines = []
-                code_lang = None
-            continue
-
-        if code_block_open:
-            code_lines.append(line)
-            continue
-
-        # Skip stray closing tags that may appear in the model text
-        if re.match(r'^\s*</(div|span|p)>\s*$', line):
-            continue
-
-        # One-line step headers with next-line explanation in monospace box
-        if re.match(r'^\*\*Step \d+:', line) or re.match(r'^###\s*Step \d+:', line):
-            step_text = re.sub(r'\*\*|###', '', line).strip()
-            # Keep step title on one line
-            formatted_content.append(f'<div style="color:#4CAF50;font-weight:700;margin:0.6rem 0 0.2rem 0;">{step_text}</div>')
-            # The explanation for this step is expected on the next line; we wrap whatever comes next
-            # by inserting an opener token that the next non-empty, non-step line will close.
-            formatted_content.append('<!--STEP_CODE_NEXT-->')
-
-        # Final answer (simple one-line box, as before)
-        elif 'Final Answer' in line:
-            clean_line = re.sub(r'\*\*', '', line)
-            formatted_content.append(f'<div class="final-answer">{format_powers(clean_line)}</div>\n')
-
-        # Check for any line containing fractions - convert ALL to vertical display
-        elif '/' in line and ('(' in line or any(char in line for char in ['x', 'y', 'dx', 'dy', 'du', 'dv'])):
-            # Convert all fractions in the line to vertical display
-            # First handle complex fractions like (numerator)/(denominator) - more comprehensive pattern
-            formatted_line = re.sub(r'\(([^)]+)\)\s*/\s*\(([^)]+)\)', lambda m: format_fraction(m.group(1), m.group(2)), line)
-            # Then handle simple fractions like du/dx, dv/dx, dy/dx
-            formatted_line = re.sub(r'\b([a-zA-Z]+)/([a-zA-Z]+)\b', lambda m: format_fraction(m.group(1), m.group(2)), formatted_line)
-            # Handle any remaining fractions with parentheses - catch cases like (2x + 1) / (x² + 1)²
-            formatted_line = re.sub(r'\(([^)]+)\)\s*/\s*([^/\s]+)', lambda m: format_fraction(m.group(1), m.group(2)), formatted_line)
-            formatted_content.append(f'<div class="math-line">{format_powers(formatted_line)}</div>\n')
-
-
-
-        # If we previously saw a step header, wrap this first following line in step-code box
-        elif formatted_content and formatted_content[-1] == '<!--STEP_CODE_NEXT-->':
-            formatted_content.pop()  # remove token
-            formatted_content.append(f'<div class="step-code">{html.escape(line)}</div>')
-
-        # Mathematical expressions with equations (no fractions)
-        elif ('=' in line and any(char in line for char in ['x', '+', '-', '*', '^', '(', ')'])):
-            formatted_content.append(f'<div class="math-line">{format_powers(line)}</div>\n')
-
-        # Regular text
-        else:
-            formatted_content.append(f"{format_powers(line)}\n")
+    _, stale = conversation_context(thread_id)
+    if not stale:
+        return
+    store = get_conversations()
+    previous = store.summary(thread_id)
+    model = TIERS[0]["model"]
+    body = {
+        "model": model,
+        "messages": summary_messages(subject, previous[1] if previous else "", stale),
+        "temperature": 0.0,
+        "max_tokens": SUMMARY_MAX_TOKENS,
+        "usage": {"include": True}
+    }
+    breaker = get_circuit_breakers().get(model)
+    meta = {}
+
+    def record(latency, error):
+        get_telemetry().record(subject, model, SOURCE_SUMMARY, latency, ok=error is None,
+                               meta=meta, error=error)
 
-    return ''.join(formatted_content)
+    try:
+        headers = provider_headers()
+        summary = get_retry_policy().call(lambda remaining: _guarded_call(breaker, lambda: openrouter.chat_completion(
+            headers, body, timeout=min(breaker.timeout(30.0), remaining), session=get_http_session(), meta=meta,
+        ), record), bucket=get_pacer().get(model))
+    except Exception:
+        return
+    if summary.strip():
+        store.save_summary(thread_id, stale[-1]["id"], summary.strip())
+
+def stream_api_response(question, subject):
+    """Yield the solution text from OpenRouter chunk by chunk (for st.write_stream)"""
+    try:
+        yield from iter_solution(question, subject, stream=True)
+    except openrouter.TotalTimeout as exc:
+        st.warning(solution_error_message(exc))
+    except (MissingApiKey, CircuitOpenError, RateLimited, openrouter.StreamTimeout,
+            openrouter.OpenRouterError, requests.exceptions.RequestException) as exc:
+        st.error(solution_error_message(exc))
 
 def should_show_diagram(question: str, subject: str) -> bool:
     """Return True only when the question explicitly asks for a visual/graph/geometry construction.
@@ -2115,7 +1960,7 @@ except:
 
 def backend_register(username: str, password: str) -> tuple[bool, str]:
     try:
-        r = requests.post(f"{BACKEND_URL}/auth/register", json={"username": username, "password": password}, timeout=6)
+        r = get_http_session().post(f"{BACKEND_URL}/auth/register", json={"username": username, "password": password}, timeout=6)
         if r.status_code in (200, 201):
             return True, r.json().get('message', 'Account created')
         # Attempt to read common error message
@@ -2129,7 +1974,7 @@ def backend_register(username: str, password: str) -> tuple[bool, str]:
 def backend_login(username: str, password: str) -> tuple[bool, str]:
     try:
         # backend expects form data for OAuth2PasswordRequestForm
-        r = requests.post(f"{BACKEND_URL}/auth/login", data={"username": username, "password": password}, timeout=6)
+        r = get_http_session().post(f"{BACKEND_URL}/auth/login", data={"username": username, "password": password}, timeout=6)
         if r.status_code == 200:
             return True, r.json().get('access_token')
         try:
@@ -2142,7 +1987,7 @@ def backend_login(username: str, password: str) -> tuple[bool, str]:
 def backend_get_me(token: str) -> tuple[bool, dict | str]:
     try:
         headers = {"Authorization": f"Bearer {token}"}
-        r = requests.get(f"{BACKEND_URL}/auth/me", headers=headers, timeout=6)
+        r = get_http_session().get(f"{BACKEND_URL}/auth/me", headers=headers, timeout=6)
         if r.status_code == 200:
             return True, r.json()
         try:
@@ -2163,9 +2008,10 @@ def backend_save_history(subject: str, question: str, answer: str) -> bool:
         data = {
             "subject": subject,
             "question": question,
-            "answer": answer
+            "answer": answer,
+            "answer_format": TEXT,
         }
-        r = requests.post(f"{BACKEND_URL}/history/save", json=data, headers=headers, timeout=6)
+        r = get_http_session().post(f"{BACKEND_URL}/history/save", json=data, headers=headers, timeout=6)
         return r.status_code in (200, 201)
     except:
         return False
@@ -2181,7 +2027,7 @@ def backend_get_history(limit: int = 20, subject: str = None) -> list:
         url = f"{BACKEND_URL}/history?limit={limit}"
         if subject:
             url += f"&subject={subject}"
-        r = requests.get(url, headers=headers, timeout=6)
+        r = get_http_session().get(url, headers=headers, timeout=6)
         if r.status_code == 200:
             data = r.json()
             return data.get("history", [])
@@ -2227,9 +2073,12 @@ def init_db():
                     question TEXT NOT NULL,
                     answer TEXT NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    answer_format TEXT NOT NULL DEFAULT 'html',
+                    formatter_version TEXT,
                     FOREIGN KEY (user_id) REFERENCES users (id)
                 )
             """)
+            ensure_columns(conn)
             conn.commit()
     except sqlite3.Error:
         pass
@@ -2379,18 +2228,62 @@ def github_oauth_login():
         st.success("✅ Demo GitHub login successful!")
         st.rerun()
 
-def save_history(user_id: int, subject: str, question: str, answer: str):
-    """Save question/answer to local database"""
+def save_history(user_id: int, subject: str, question: str, answer: str) -> int | None:
+    """Save question/answer to local database (the answer's text; it is formatted when shown).
+
+    Returns the new row's id, or None if it could not be saved.
+    """
+    stored, answer_format = encode_answer(answer, compress=get_setting('COMPRESS_HISTORY', True))
     try:
         with sqlite3.connect(DB_PATH) as conn:
             cur = conn.cursor()
             cur.execute(
-                "INSERT INTO history (user_id, subject, question, answer) VALUES (?, ?, ?, ?)",
-                (user_id, subject, question, answer)
+                "INSERT INTO history (user_id, subject, question, answer, answer_format, formatter_version) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, subject, question, stored, answer_format, FORMATTER_VERSION)
             )
             conn.commit()
+            history_id = cur.lastrowid
     except sqlite3.Error:
-        pass
+        return None
+    return history_id
+
+@st.cache_resource
+def get_question_index() -> QuestionIndex:
+    """Near-duplicate index over local history, shared by all sessions"""
+    init_db()
+    return QuestionIndex(DB_PATH)
+
+def find_similar_answer(subject: str, question: str) -> tuple[str, float] | None:
+    """Stored (answer, score) for a near-identical earlier question, if any"""
+    threshold = get_setting('SIMILAR_MATCH_THRESHOLD', 0.90)
+    match = get_question_index().find(subject, question, threshold=threshold)
+    if not match:
+        return None
+    history_id, score = match
+    try:
+        with sqlite3.connect(DB_PATH) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT answer, answer_format FROM history WHERE id=?", (history_id,))
+            row = cur.fetchone()
+    except sqlite3.Error:
+        return None
+    if not row or not row[0]:
+        return None
+    return render_stored(*row, render=get_format_memo().render), score
+
+def request_fresh_solution():
+    """Button callback: skip the stored-answer shortcut on the next run"""
+    st.session_state.solve_fresh = True
+
+def ask_anyway():
+    """Button callback: solve on the current page despite the subject check"""
+    st.session_state.solve_anyway = True
+
+def switch_subject(subject: str, question: str):
+    """Button callback: carry the question over to the suggested subject's page"""
+    st.session_state.selected_subject = subject
+    st.session_state[f"question_{subject}"] = question
 
 def load_history(user_id: int, limit: int = 20, subject: str = None) -> list[tuple]:
     try:
@@ -2399,7 +2292,7 @@ def load_history(user_id: int, limit: int = 20, subject: str = None) -> list[tup
             if subject:
                 cur.execute(
                     """
-                    SELECT id, subject, question, answer, created_at
+                    SELECT id, subject, question, answer, created_at, answer_format
                     FROM history
                     WHERE user_id=? AND subject=?
                     ORDER BY id DESC
@@ -2410,7 +2303,7 @@ def load_history(user_id: int, limit: int = 20, subject: str = None) -> list[tup
             else:
                 cur.execute(
                     """
-                    SELECT id, subject, question, answer, created_at
+                    SELECT id, subject, question, answer, created_at, answer_format
                     FROM history
                     WHERE user_id=?
                     ORDER BY id DESC
@@ -2418,9 +2311,11 @@ def load_history(user_id: int, limit: int = 20, subject: str = None) -> list[tup
                     """,
                     (user_id, limit),
                 )
-            return cur.fetchall()
+            rows = cur.fetchall()
     except sqlite3.Error:
         return []
+    return [(row_id, subj, q, decode_answer(a, answer_format), created_at)
+            for row_id, subj, q, a, created_at, answer_format in rows]
 
 # Theme Toggle Component - REMOVED
 
@@ -3303,6 +3198,85 @@ def render_profile_page():
         </div>
         """, unsafe_allow_html=True)
 
+    st.markdown("---")
+    render_service_status()
+
+def render_service_status():
+    """Process-wide tutor health: circuit breakers, adaptive timeouts and caches"""
+    with st.expander("🩺 Tutor service status"):
+        breakers = get_circuit_breakers()
+        snapshot = breakers.snapshot()
+        if not snapshot:
+            st.caption("No tutor requests have been made since the app started.")
+        state_icons = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}
+        seconds = lambda value: "–" if value is None else f"{value:.1f}s"
+        pacing = get_pacer().snapshot()
+        for model, info in snapshot.items():
+            breaker = breakers.get(model)
+            st.markdown(
+                f"**{state_icons.get(info['state'], '')} {model}** — {info['state'].replace('_', '-')}, "
+                f"{info['requests']} requests in window, {info['error_rate']:.0%} errors"
+            )
+            st.caption(
+                f"Replies p50 {seconds(info['p50'])} · p95 {seconds(info['p95'])} · "
+                f"p99 {seconds(info['p99'])} · streams p99 {seconds(info['stream_p99'])} · "
+                f"first token p99 {seconds(info['first_token_p99'])} — timeouts now "
+                f"{breaker.timeout(FIRST_TOKEN_TIMEOUT, kind=FIRST_TOKEN, floor=3.0):.1f}s first token, "
+                f"{breaker.timeout(STREAM_TOTAL_TIMEOUT, kind=STREAM, floor=15.0):.1f}s stream, "
+                f"{breaker.timeout(30.0):.1f}s reply"
+            )
+            bucket = pacing.get(model)
+            if bucket and bucket["paused_for"] > 0:
+                st.caption(f"⏸️ Provider asked us to slow down — paused for {bucket['paused_for']:.0f}s more")
+
+        calls = get_telemetry().summary(window_seconds=24 * 3600, source=SOURCE_API)
+        if calls:
+            st.markdown("**Provider calls, last 24 hours**")
+            st.dataframe([
+                {
+                    "Subject": row["subject"],
+                    "Model": row["model"],
+                    "Calls": row["count"],
+                    "Errors": f"{row['error_rate']:.0%}",
+                    "p50": seconds(row["latency_p50"]),
+                    "p95": seconds(row["latency_p95"]),
+                    "p99": seconds(row["latency_p99"]),
+                    "TTFB p95": seconds(row["ttfb_p95"]),
+                    "Avg tokens": round(row["avg_completion_tokens"]),
+                    "Cost": "–" if row["cost"] is None else f"${row['cost']:.4f}",
+                }
+                for row in calls
+            ], hide_index=True, use_container_width=True)
+
+        cache = get_answer_cache().stats()
+        flights = get_single_flight().stats()
+        jobs = get_job_store().stats()
+        memo = get_format_memo().stats()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Answer cache hit rate", f"{cache['hit_rate']:.0%}", f"{cache['entries']} stored",
+                    delta_color="off")
+        col1.caption(f"Formatted HTML reused for {memo['hit_rate']:.0%} of answers")
+        col2.metric("Coalesced requests", flights['coalesced'], f"{flights['in_flight']} in flight",
+                    delta_color="off")
+        col3.metric("Solutions running", jobs['running'] + jobs['queued'], f"{jobs['failed']} failed",
+                    delta_color="off")
+
+        budgets = get_length_budgets().snapshot()
+        if budgets:
+            st.caption("Answer length budgets (max tokens): " + " · ".join(
+                f"{subject} {tokens}" for subject, tokens in sorted(budgets.items())))
+
+        warm = get_warm_up().snapshot()
+        if warm["status"] == "running":
+            st.caption(f"🔥 Warming example answers: {warm['done']}/{warm['total']}")
+        elif warm["status"] == "finished":
+            st.caption(f"🔥 {warm['total'] - warm['errors']}/{warm['total']} example answers pre-solved"
+                       + (f" — last error: {warm['last_error']}" if warm["last_error"] else ""))
+        if is_admin():
+            if st.button("🔥 Re-warm example answers", disabled=warm["status"] == "running"):
+                get_warm_up().start(warm_up_items(), refresh=True)
+                st.rerun()
+
 def render_about_page():
     """Enhanced About Us page with comprehensive company information"""
     render_navbar()
@@ -3461,6 +3435,119 @@ def render_about_page():
     </div>
     """, unsafe_allow_html=True)
 
+@st.fragment(run_every=0.75)
+def render_pending_solution(job_id: str):
+    """Poll a running job, showing the finished steps and the line being written;
+    reruns the page once it finishes"""
+    job = get_job_store().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    snapshot = job.snapshot()
+    if snapshot['partial_html']:
+        st.markdown(f"""
+        <div class="solution-content">
+            {snapshot['partial_html']}
+        </div>
+        """, unsafe_allow_html=True)
+    if snapshot['pending']:
+        st.markdown(snapshot['pending'])
+    elif not snapshot['partial_html']:
+        st.info("⏳ Getting solution...")
+
+def render_solution_job(job_info: dict):
+    """Show a background solution: progress while running, the result when done"""
+    job = get_job_store().get(job_info["id"])
+    if job is None:
+        # Expired from the store; forget it rather than recompute on every rerun
+        st.session_state.pop('solution_job', None)
+        return
+
+    subject = job_info["subject"]
+    question = job_info["question"]
+    st.markdown("---")
+    st.markdown(f"## 📚 {subject} Solution")
+    if job_info.get("follow_up_to"):
+        st.caption(f"💬 Follow-up: {question}")
+
+    if not job.finished:
+        render_pending_solution(job.id)
+        return
+
+    snapshot = job.snapshot()
+    if snapshot["error"] is not None:
+        st.error(solution_error_message(snapshot["error"]))
+        st.session_state.pop('solution_job', None)
+        return
+
+    result = snapshot["result"]
+    formatted_response = result["formatted"]
+    st.markdown(f"""
+    <div class="solution-content">
+        {formatted_response}
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Show diagram if needed
+    if result["viz"]:
+        st.markdown("### 📊 Visualization")
+        st.image(result["viz"], use_container_width=True)
+
+    # Save to history once per job (backend and local)
+    if not job_info["saved"]:
+        job_info["saved"] = True
+        thread_id = job_info.get("thread")
+        if thread_id:
+            get_conversations().add_turns(thread_id, [("user", question), ("assistant", result["response"])])
+            get_part_pool().submit(summarize_thread, thread_id, subject)
+        if job_info.get("follow_up_to"):
+            pass  # Only meaningful in its thread; kept out of history and the similar-question index
+        else:
+            # The backend keeps the user's history when it is up; the local table
+            # gets every answer as well, because the similar-question index serves
+            # answers from it
+            backend_save_history(subject, question, result["response"])
+            user_id = st.session_state.get("user_id")
+            history_id = save_history(user_id, subject, question, result["response"]) if user_id else None
+            if history_id is not None:
+                get_question_index().add(history_id, subject, question)
+
+    if job_info.get("thread"):
+        render_follow_up(job_info)
+
+    # Feedback
+    st.markdown("### Rate this solution")
+    col_a, col_b, col_c = st.columns(3)
+    with col_a:
+        if st.button("👍 Helpful"):
+            st.success("Thanks!")
+    with col_b:
+        if st.button("👎 Needs work"):
+            st.info("We'll improve!")
+    with col_c:
+        if st.button("🔄 Try again"):
+            st.session_state.pop('solution_job', None)
+            st.rerun()
+
+def render_follow_up(job_info: dict):
+    """Ask about the solution on screen; the thread's earlier turns go along"""
+    with st.form(f"follow_up_{job_info['id']}", clear_on_submit=True):
+        follow_up = st.text_input(
+            "💬 Ask a follow-up about this solution",
+            placeholder="e.g. Why does the second step work?",
+        )
+        asked = st.form_submit_button("Ask")
+    if asked and follow_up.strip():
+        history, _ = conversation_context(job_info["thread"])
+        st.session_state.solution_job = {
+            "id": submit_solution_job(follow_up.strip(), job_info["subject"], history=history),
+            "subject": job_info["subject"],
+            "question": follow_up.strip(),
+            "saved": False,
+            "thread": job_info["thread"],
+            "follow_up_to": job_info.get("follow_up_to") or job_info["question"],
+        }
+        st.rerun()
+
 def render_questions_page():
     """Questions page with hamburger menu"""
     
@@ -3471,60 +3558,75 @@ def render_questions_page():
     st.markdown("---")
 
     # Question input
+    question_key = f"question_{subject}"
     question = st.text_area(
         f"📝 Enter your {subject} question:",
         height=150,
         placeholder=f"Ask your {subject} question here...",
-        help="Be specific and include all relevant details"
+        help="Be specific and include all relevant details",
+        key=question_key,
     )
-
-    if st.button("🎯 Get Solution", type="primary"):
-        if question.strip():
-            with st.spinner("Getting solution..."):
-                response = get_api_response(question, subject)
-
-                if response:
-                    st.markdown("---")
-                    st.markdown(f"## 📚 {subject} Solution")
-
-                    # Display solution (render HTML for math/formatting)
-                    formatted_response = format_response(response)
-                    st.markdown(f"""
-                    <div class="solution-content">
-                        {formatted_response}
-                    </div>
-                    """, unsafe_allow_html=True)
-
-                    # Show diagram if needed
-                    if should_show_diagram(question, subject):
-                        st.markdown("### 📊 Visualization")
-                        viz = create_smart_visualization(question, subject)
-                        if viz:
-                            st.image(viz, use_container_width=True)
-
-                    # Save to history (backend first, fallback local)
-                    if backend_save_history(subject, question.strip(), formatted_response):
-                        pass  # Successfully saved
-                    else:
-                        # Fallback to local save if backend fails
-                        user_id = st.session_state.get("user_id")
-                        if user_id:
-                            save_history(user_id, subject, question.strip(), formatted_response)
-
-                    # Feedback
-                    st.markdown("### Rate this solution")
-                    col_a, col_b, col_c = st.columns(3)
-                    with col_a:
-                        if st.button("👍 Helpful"):
-                            st.success("Thanks!")
-                    with col_b:
-                        if st.button("👎 Needs work"):
-                            st.info("We'll improve!")
-                    with col_c:
-                        if st.button("🔄 Try again"):
-                            st.rerun()
-        else:
-            st.warning("Please enter a question.")
+    example = SUBJECTS.get(subject, {}).get("example")
+    if example:
+        # Examples are pre-solved at startup, so this answer comes back instantly
+        st.button(f"✨ Try an example: {example}", type="tertiary",
+                  on_click=lambda: st.session_state.update({question_key: example}))
+
+    solve_clicked = st.button("🎯 Get Solution", type="primary")
+    solve_fresh = st.session_state.pop('solve_fresh', False)
+    solve_anyway = st.session_state.pop('solve_anyway', False)
+    if solve_clicked or solve_fresh or solve_anyway:
+        # Cheap local checks first; none of these outcomes costs a provider call
+        check = check_question(
+            subject, question,
+            last=None if (solve_fresh or solve_anyway) else st.session_state.get('last_submit'),
+            max_chars=get_setting('MAX_QUESTION_CHARS', MAX_QUESTION_CHARS),
+            window=get_setting('DEBOUNCE_SECONDS', DEBOUNCE_SECONDS),
+            check_subject=not (solve_fresh or solve_anyway),
+        )
+        similar = None
+        if check.ok and not solve_fresh:
+            similar = find_similar_answer(subject, question)
+        if check.status == DUPLICATE:
+            pass  # A double click: the solution below is already on its way
+        elif check.status == OFF_SUBJECT:
+            st.warning(f"🧭 {check.message}")
+            col_switch, col_anyway = st.columns(2)
+            with col_switch:
+                st.button(f"Switch to {check.suggestion}", type="primary",
+                          on_click=switch_subject, args=(check.suggestion, question))
+            with col_anyway:
+                st.button(f"Ask in {subject} anyway", on_click=ask_anyway)
+        elif not check.ok:
+            st.warning(check.message)
+        elif similar:
+            # A near-identical question was already solved: show that answer instantly
+            stored_answer, score = similar
+            st.session_state.pop('solution_job', None)
+            st.markdown("---")
+            st.markdown(f"## 📚 {subject} Solution")
+            st.caption(f"⚡ Matched a previously solved question ({score:.0%} similar)")
+            st.markdown(f"""
+            <div class="solution-content">
+                {stored_answer}
+            </div>
+            """, unsafe_allow_html=True)
+            st.button("🤖 Not the same question? Ask the tutor", on_click=request_fresh_solution)
+        elif question.strip():
+            # Solve in the background; the job survives reruns (e.g. feedback clicks)
+            st.session_state.last_submit = remember_submit(subject, question)
+            st.session_state.solution_job = {
+                "id": submit_solution_job(question, subject),
+                "subject": subject,
+                "question": question.strip(),
+                "saved": False,
+                # A new question starts a new follow-up thread
+                "thread": get_conversations().create_thread(conversation_user_key(), subject),
+            }
+
+    job_info = st.session_state.get('solution_job')
+    if job_info and job_info["subject"] == subject:
+        render_solution_job(job_info)
 
     # Subject-specific History
     with st.expander(f"🕘 View your {subject} history"):
@@ -3578,6 +3680,8 @@ def main():
     """Main application with complete workflow"""
     # Initialize database
     init_db()
+    start_history_migration()
+    start_warm_up()
 
     # Load CSS
     load_css()
@@ -0,0 +1,238 @@
+"""Near-duplicate question index over the local ``history`` table.
+
+Questions are normalized (case, spacing, numbering, superscripts) and turned
+into hashed TF-IDF vectors of word tokens and character 3-grams. A single
+NumPy matrix product scores a new question against every stored one, so
+"Solve 3x² - 12x + 9 = 0" and "solve: 3x^2-12x+9=0" resolve to the same
+stored answer without a provider call.
+
+Vectors are persisted in a ``question_index`` table next to ``history``:
+adding a row is one INSERT, and a restart just reloads the vectors and
+indexes any history rows written since. The index keeps the newest
+``max_rows`` questions; past that, each new one replaces the oldest.
+"""
+
+import re
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+
+DEFAULT_DIMS = 1024
+DEFAULT_MAX_ROWS = 20000
+DEFAULT_THRESHOLD = 0.90
+
+_SUPERSCRIPTS = str.maketrans({
+    "⁰": "^0", "¹": "^1", "²": "^2", "³": "^3", "⁴": "^4",
+    "⁵": "^5", "⁶": "^6", "⁷": "^7", "⁸": "^8", "⁹": "^9",
+    "−": "-", "–": "-", "×": "*", "÷": "/",
+})
+
+
+def normalize_for_match(question: str) -> str:
+    """Aggressive normalization used only for similarity, never for display."""
+    text = (question or "").translate(_SUPERSCRIPTS).lower()
+    # Leading numbering such as "1.", "Q3)", "question 2:" (but not "1.5")
+    text = re.sub(r"^\s*(?:q(?:uestion)?\s*)?\d+\s*[.):](?!\d)\s*", "", text)
+    text = re.sub(r"[^\w\s^+\-*/=().,]", " ", text)
+    text = re.sub(r"\s*([\^+\-*/=()])\s*", r"\1", text)
+    return re.sub(r"\s+", " ", text).strip(" .,")
+
+
+def extract_numbers(normalized: str) -> tuple[str, ...]:
+    """Numbers in order; two questions only match if these are identical."""
+    return tuple(re.findall(r"\d+(?:\.\d+)?", normalized))
+
+
+def shingles(normalized: str) -> list[str]:
+    compact = normalized.replace(" ", "")
+    grams = [compact[i:i + 3] for i in range(max(len(compact) - 2, 0))]
+    return re.findall(r"\w+", normalized) + ["#" + g for g in grams]
+
+
+def hashed_tf(normalized: str, dims: int) -> np.ndarray:
+    """Log-scaled term frequencies of the shingles, hashed into ``dims`` buckets."""
+    vec = np.zeros(dims, dtype=np.float32)
+    for gram in shingles(normalized):
+        # crc32 is stable across processes, unlike hash()
+        vec[zlib.crc32(gram.encode("utf-8")) % dims] += 1.0
+    np.log1p(vec, out=vec)
+    return vec
+
+
+class QuestionIndex:
+    """In-process similarity index; safe to share between session threads."""
+
+    def __init__(self, db_path: str, dims: int = DEFAULT_DIMS, max_rows: int = DEFAULT_MAX_ROWS):
+        self.db_path = db_path
+        self.dims = dims
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((256, dims), dtype=np.float32)
+        self._df = np.zeros(dims, dtype=np.float32)
+        self._ids = []
+        self._subjects = []
+        self._normalized = []
+        self._seen = set()
+        # Once full, the slot of the oldest row (the next one to replace)
+        self._oldest = 0
+        # IDF-weighted row norms; recomputed only after the index changes
+        self._idf = None
+        self._norms = None
+        self._load()
+
+    # ---- persistence ----
+    def _load(self) -> None:
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS question_index (
+                        history_id INTEGER PRIMARY KEY,
+                        subject TEXT NOT NULL,
+                        normalized TEXT NOT NULL,
+                        vector BLOB NOT NULL
+                    )
+                """)
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS question_index_state (
+                        name TEXT PRIMARY KEY,
+                        value INTEGER NOT NULL
+                    )
+                """)
+                conn.commit()
+                cur.execute(
+                    "SELECT history_id, subject, normalized, vector FROM question_index "
+                    "ORDER BY history_id DESC LIMIT ?",
+                    (self.max_rows,),
+                )
+                rows = cur.fetchall()[::-1]
+                for history_id, subject, normalized, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float32)
+                    if vec.shape[0] == self.dims:
+                        self._append(history_id, subject, normalized, vec)
+
+                # Catch up on history written since the index was last updated;
+                # rows skipped as duplicates count as done too
+                cur.execute("SELECT value FROM question_index_state WHERE name=?", (self._watermark_name,))
+                row = cur.fetchone()
+                last_id = max(self._ids + [row[0] if row else 0])
+                cur.execute(
+                    "SELECT id, subject, question FROM history WHERE id > ? ORDER BY id",
+                    (last_id,),
+                )
+                pending = cur.fetchall()
+            for history_id, subject, question in pending:
+                self.add(history_id, subject, question)
+            if pending:
+                with sqlite3.connect(self.db_path) as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO question_index_state (name, value) VALUES (?, ?)",
+                        (self._watermark_name, pending[-1][0]),
+                    )
+                    conn.commit()
+        except sqlite3.Error:
+            pass
+
+    @property
+    def _watermark_name(self) -> str:
+        # Vectors of another size are not loaded, so their rows need indexing again
+        return f"last_history_id:{self.dims}"
+
+    def _append(self, history_id: int, subject: str, normalized: str, vec: np.ndarray) -> int | None:
+        """Store a row; returns the history id it replaced once the index is full"""
+        size = len(self._ids)
+        evicted = None
+        if size >= self.max_rows:
+            # Rows arrive in id order, so slots fill oldest first: reuse them round-robin
+            slot = self._oldest
+            self._oldest = (slot + 1) % size
+            evicted = self._ids[slot]
+            self._df -= self._vectors[slot] > 0
+            self._seen.discard((self._subjects[slot], self._normalized[slot]))
+            self._ids[slot] = history_id
+            self._subjects[slot] = subject
+            self._normalized[slot] = normalized
+        else:
+            if size == self._vectors.shape[0]:
+                grown = np.zeros((min(size * 2, self.max_rows), self.dims), dtype=np.float32)
+                grown[:size] = self._vectors
+                self._vectors = grown
+            slot = size
+            self._ids.append(history_id)
+            self._subjects.append(subject)
+            self._normalized.append(normalized)
+        self._vectors[slot] = vec
+        self._df += vec > 0
+        self._seen.add((subject, normalized))
+        self._idf = None
+        self._norms = None
+        return evicted
+
+    # ---- public API ----
+    def add(self, history_id: int, subject: str, question: str) -> None:
+        """Index one history row; exact normalized duplicates are skipped.
+
+        When the index is full the oldest row makes room, here and on disk.
+        """
+        normalized = normalize_for_match(question)
+        if not normalized:
+            return
+        with self._lock:
+            if (subject, normalized) in self._seen:
+                return
+            vec = hashed_tf(normalized, self.dims)
+            evicted = self._append(history_id, subject, normalized, vec)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO question_index (history_id, subject, normalized, vector) "
+                    "VALUES (?, ?, ?, ?)",
+                    (history_id, subject, normalized, vec.tobytes()),
+                )
+                if evicted is not None:
+                    conn.execute("DELETE FROM question_index WHERE history_id=?", (evicted,))
+                conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def find(self, subject: str, question: str, threshold: float = DEFAULT_THRESHOLD,
+             match_numbers: bool = True) -> tuple[int, float] | None:
+        """Best ``(history_id, score)`` in the same subject above ``threshold``.
+
+        ``match_numbers=False`` accepts the same question with other numbers,
+        which is enough when only the shape of the answer matters.
+        """
+        normalized = normalize_for_match(question)
+        if not normalized:
+            return None
+        numbers = extract_numbers(normalized)
+        with self._lock:
+            size = len(self._ids)
+            if size == 0:
+                return None
+            matrix = self._vectors[:size]
+            if self._norms is None:
+                self._idf = np.log((1.0 + size) / (1.0 + self._df)) + 1.0
+                self._norms = np.sqrt(np.square(matrix) @ np.square(self._idf))
+            idf, norms = self._idf, self._norms
+            query = hashed_tf(normalized, self.dims) * idf
+            query_norm = float(np.linalg.norm(query))
+            if query_norm == 0.0:
+                return None
+            # cos(D*idf, q*idf) without materialising the weighted matrix
+            scores = (matrix @ (query * idf)) / np.maximum(norms * query_norm, 1e-9)
+            mask = np.fromiter((s == subject for s in self._subjects), dtype=bool, count=size)
+            scores[~mask] = -1.0
+            # Walk the best few candidates; numbers have to agree exactly
+            for idx in np.argsort(scores)[::-1][:5]:
+                score = float(scores[idx])
+                if score < threshold:
+                    break
+                if not match_numbers or extract_numbers(self._normalized[idx]) == numbers:
+                    return self._ids[idx], score
+        return None
+
+    def __len__(self) -> int:
+        return len(self._ids)
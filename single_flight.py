@@ -0,0 +1,160 @@
+"""In-flight request coalescing ("single flight").
+
+When many sessions ask the exact same thing at the same moment (a teacher
+projects a problem and the whole class pastes it), only the first caller
+talks to the provider; everyone else waits for that call and shares its
+result.
+"""
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _SharedStream:
+    """Chunks produced by one upstream iterator, replayable by many readers."""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def pump(self, iterator, on_complete=None) -> None:
+        try:
+            for chunk in iterator:
+                with self.cond:
+                    self.chunks.append(chunk)
+                    self.cond.notify_all()
+        except Exception as exc:
+            with self.cond:
+                self.error = exc
+        else:
+            if on_complete is not None:
+                try:
+                    on_complete("".join(self.chunks))
+                except Exception:
+                    pass
+        finally:
+            with self.cond:
+                self.finished = True
+                self.cond.notify_all()
+
+    def read(self):
+        index = 0
+        while True:
+            with self.cond:
+                while index >= len(self.chunks) and not self.finished:
+                    self.cond.wait()
+                pending = self.chunks[index:]
+                index = len(self.chunks)
+                finished, error = self.finished, self.error
+            yield from pending
+            if finished and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class FlightStream:
+    """Iterator over a shared stream; ``shared`` is True for coalesced callers."""
+
+    def __init__(self, shared_stream: _SharedStream, shared: bool):
+        self.shared = shared
+        self._reader = shared_stream.read()
+
+    def __iter__(self):
+        return self._reader
+
+
+class SingleFlight:
+    """Process-wide registry of in-flight calls keyed by request identity."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    def do(self, key: str, fn):
+        """Run ``fn()`` once per concurrent ``key``; return ``(result, shared)``.
+
+        Exceptions raised by the leader are re-raised in every waiting caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as exc:
+                call.error = exc
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader
+
+    def stream(self, key: str, factory, on_complete=None) -> FlightStream:
+        """Share one upstream stream between all concurrent callers of ``key``.
+
+        ``factory()`` must return an iterator of text chunks. It is consumed by
+        a background thread, so the upstream keeps going (and ``on_complete``
+        still receives the full text) even if the first reader goes away.
+        Late joiners replay the chunks produced so far, then follow live.
+        """
+        with self._lock:
+            shared_stream = self._streams.get(key)
+            if shared_stream is not None:
+                self._coalesced += 1
+                return FlightStream(shared_stream, shared=True)
+            shared_stream = _SharedStream()
+            self._streams[key] = shared_stream
+            self._leaders += 1
+
+        def _run():
+            try:
+                shared_stream.pump(factory(), on_complete)
+            except Exception as exc:
+                # factory() itself failed before producing an iterator
+                with shared_stream.cond:
+                    shared_stream.error = exc
+                    shared_stream.finished = True
+                    shared_stream.cond.notify_all()
+            finally:
+                with self._lock:
+                    self._streams.pop(key, None)
+
+        threading.Thread(target=_run, name="single-flight-stream", daemon=True).start()
+        return FlightStream(shared_stream, shared=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls) + len(self._streams)
+            leaders, coalesced = self._leaders, self._coalesced
+        total = leaders + coalesced
+        return {
+            "leaders": leaders,
+            "coalesced": coalesced,
+            "in_flight": in_flight,
+            "coalesced_ratio": coalesced / total if total else 0.0,
+        }
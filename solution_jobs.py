@@ -0,0 +1,153 @@
+"""Background solution jobs, decoupled from Streamlit reruns.
+
+Submitting a question returns a job id right away; a worker pool runs the LLM
+call, formatting and visualization, and the page re-reads the job on every
+rerun. Clicking a button therefore never discards or recomputes an answer,
+and a slow provider call no longer pins the session's script thread.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class SolutionJob:
+    """State of one job. Workers write through ``append``; pages read ``snapshot``."""
+
+    def __init__(self, key: str):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = QUEUED
+        self.partial = ""
+        self.partial_html = ""
+        self.pending = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until the job has finished; False if ``timeout`` ran out first."""
+        return self._done.wait(timeout)
+
+    def append(self, text: str, html: str = "", pending: str | None = None) -> None:
+        """Add streamed text so pages can show progress before the job finishes.
+
+        Workers that format as they go also pass the newly finished ``html``
+        and the ``pending`` text that has no HTML yet.
+        """
+        with self._lock:
+            self.partial += text
+            self.partial_html += html
+            if pending is not None:
+                self.pending = pending
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "partial": self.partial,
+                "partial_html": self.partial_html,
+                "pending": self.pending,
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobStore:
+    """Process-wide job registry backed by a bounded worker pool.
+
+    Jobs with the same ``key`` that are still running (or finished
+    successfully and not yet expired) are shared instead of resubmitted.
+    Finished jobs are kept for ``ttl_seconds`` and at most ``max_jobs``
+    entries are retained, except pinned jobs (pre-solved examples), which
+    stay until they fail or are replaced.
+    """
+
+    def __init__(self, max_workers: int = 8, max_jobs: int = 500, ttl_seconds: int = 3600):
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="solution-job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._pinned = set()
+
+    def submit(self, key: str, work, force: bool = False, pin: bool = False) -> str:
+        """Queue ``work(job)`` and return the job id.
+
+        The return value of ``work`` becomes ``job.result``; an exception is
+        stored in ``job.error`` for the page to report. ``force`` starts a new
+        job even if one with the same key is still around. ``pin`` exempts the
+        job from expiry.
+        """
+        with self._lock:
+            self._prune()
+            existing = self._jobs.get(self._by_key.get(key))
+            if existing is not None and not force and existing.status != FAILED:
+                if pin:
+                    self._pinned.add(existing.id)
+                return existing.id
+            if existing is not None:
+                self._pinned.discard(existing.id)
+            job = SolutionJob(key)
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+            if pin:
+                self._pinned.add(job.id)
+
+        self._pool.submit(self._run, job, work)
+        return job.id
+
+    def _run(self, job: SolutionJob, work) -> None:
+        job.status = RUNNING
+        try:
+            result = work(job)
+        except Exception as exc:
+            job.error = exc
+            job.finished_at = time.time()
+            job.status = FAILED
+        else:
+            job.result = result
+            job.finished_at = time.time()
+            job.status = DONE
+        finally:
+            job._done.set()
+
+    def get(self, job_id: str) -> SolutionJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job_id in self._pinned:
+                if job.status != FAILED:
+                    continue
+                self._pinned.discard(job_id)
+            expired = job.finished and now - job.finished_at > self.ttl_seconds
+            if expired or (len(self._jobs) > self.max_jobs and job.finished):
+                del self._jobs[job_id]
+                if self._by_key.get(job.key) == job_id:
+                    del self._by_key[job.key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in (QUEUED, RUNNING, DONE, FAILED)}
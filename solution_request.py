@@ -0,0 +1,107 @@
+"""How a question becomes a provider request; shared by the app and batch_solve.py.
+
+The answer cache is keyed on subject, question, model and prompt, so an
+answer pre-solved in a batch is only a cache hit in the app if both pick the
+same model (routed with the length of a similar stored answer), the same
+prompt and the same ``max_tokens``, and split multi-part questions into the
+same separately cached parts. Everything that decides those lives here.
+"""
+
+import json
+import sqlite3
+
+from answer_storage import answer_text
+from completion_control import DEFAULT_MAX_TOKENS
+from question_splitter import part_header
+from structured_answers import RESPONSE_FORMAT, STRUCTURED_INSTRUCTIONS, merge_parts
+from subjects import SUBJECTS
+
+
+def similar_answer_length(index, db_path: str, subject: str, question: str) -> int | None:
+    """Length of the stored answer to a roughly similar question, for routing"""
+    if index is None:
+        return None
+    match = index.find(subject, question, threshold=0.6, match_numbers=False)
+    if not match:
+        return None
+    try:
+        with sqlite3.connect(db_path) as conn:
+            row = conn.execute("SELECT answer, answer_format FROM history WHERE id=?", (match[0],)).fetchone()
+    except sqlite3.Error:
+        return None
+    return len(answer_text(*row)) if row else None
+
+
+def choose_model(router, index, db_path: str, subject: str, question: str) -> str:
+    """Model for this question, picked by the complexity router"""
+    answer_length = similar_answer_length(index, db_path, subject, question)
+    return router.route(subject, question, answer_length).model
+
+
+def route_text(question: str, history: list | None = None) -> str:
+    """What the router scores: a bare "why?" is routed by the questions it follows up on"""
+    return "\n".join([m["content"] for m in history or [] if m["role"] == "user"] + [question])
+
+
+def answer_max_tokens(budgets, subject: str, default: int = DEFAULT_MAX_TOKENS,
+                      structured: bool = False) -> int:
+    """``max_tokens`` from the per-subject ``LengthBudgets``.
+
+    The budgets are learned from text answers; the same content as JSON is
+    much longer, so structured requests keep the flat ``default``.
+    """
+    if structured:
+        return default
+    return budgets.get(subject, default)
+
+
+class SolutionRequest:
+    def __init__(self, model: str, prompt: str, prompt_key: str, body: dict):
+        self.model = model
+        self.prompt = prompt
+        # The prompt part of the cache key: the prompt plus any follow-up history
+        self.prompt_key = prompt_key
+        self.body = body
+
+
+def build_request(subject: str, question: str, model: str, max_tokens: int,
+                  structured: bool = False, history: list | None = None) -> SolutionRequest:
+    """The chat-completions body for a question, and the prompt it is cached under"""
+    history = history or []
+    prompt = SUBJECTS[subject]['prompt']
+    if structured:
+        # A different prompt, so JSON and text answers never share cache entries
+        prompt += STRUCTURED_INSTRUCTIONS
+    if history:
+        prompt_key = prompt + "\n" + json.dumps(history, sort_keys=True, ensure_ascii=False)
+    else:
+        prompt_key = prompt
+    body = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": prompt},
+            *history,
+            {"role": "user", "content": question}
+        ],
+        "temperature": 0.1,
+        "max_tokens": max_tokens,
+        # Ask OpenRouter to include token counts and cost in the reply
+        "usage": {"include": True}
+    }
+    if structured:
+        body["response_format"] = RESPONSE_FORMAT
+    return SolutionRequest(model, prompt, prompt_key, body)
+
+
+def merged_parts(parts: list[tuple[str, str]], answers, structured: bool = False):
+    """Yield the answer to a split question from the answers to its parts, in order.
+
+    ``answers`` may be an iterator that produces each part's answer when it
+    is ready. Text answers are yielded part by part under "**Part (x):**"
+    headers; structured answers are merged into one JSON answer at the end.
+    """
+    if structured:
+        yield merge_parts([(label, body, answer) for (label, body), answer in zip(parts, answers)])
+        return
+    for index, ((label, body), answer) in enumerate(zip(parts, answers)):
+        yield ("\n\n" if index else "") + part_header(label, body) + "\n" + answer.strip()
@@ -0,0 +1,170 @@
+"""Structured (JSON) answers rendered straight to the app's HTML.
+
+With ``STRUCTURED_ANSWERS`` on, the model is asked for a JSON object (steps
+with title, explanation, equations and code, a complexity block, the complete
+program and the final answer) instead of "**Step N:**" text. ``render_structured``
+maps its fields directly onto the CSS classes ``format_response`` produces
+(``step-code``, ``math-line``, ``code-block``, ``final-answer``,
+``part-header``), with no regex pass over the text.
+
+``format_answer`` is the single entry point for rendering: anything that is
+not a structured answer (local solver output, answers cached before the
+switch, a model that ignored the format) goes through ``format_response``.
+"""
+
+import html
+import json
+
+from formatting import format_response
+
+STRUCTURED_INSTRUCTIONS = """
+
+OUTPUT FORMAT OVERRIDE:
+Return the solution as ONE JSON object instead of the text layout above, with the same content:
+- "steps": the steps in order; each has "title" (short, without "Step N:"), "explanation" (one or two sentences), "equations" (the math lines of the step, one per entry, [] if none), "code" (code for the step, "" if none) and "language" ("" if no code)
+- "complexity": {"time": ..., "space": ...} for algorithm questions, otherwise both ""
+- "complete_code": {"language": ..., "code": ...} with the full program for programming questions, otherwise both ""
+- "final_answer": the final result in one line ("" only for programming questions)
+Write math as plain text with Unicode symbols (x², √, ≤, π); no LaTeX and no Markdown."""
+
+_STEP = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "explanation": {"type": "string"},
+        "equations": {"type": "array", "items": {"type": "string"}},
+        "code": {"type": "string"},
+        "language": {"type": "string"},
+    },
+    "required": ["title", "explanation", "equations", "code", "language"],
+    "additionalProperties": False,
+}
+
+ANSWER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "steps": {"type": "array", "items": _STEP},
+        "complexity": {
+            "type": "object",
+            "properties": {"time": {"type": "string"}, "space": {"type": "string"}},
+            "required": ["time", "space"],
+            "additionalProperties": False,
+        },
+        "complete_code": {
+            "type": "object",
+            "properties": {"language": {"type": "string"}, "code": {"type": "string"}},
+            "required": ["language", "code"],
+            "additionalProperties": False,
+        },
+        "final_answer": {"type": "string"},
+    },
+    "required": ["steps", "complexity", "complete_code", "final_answer"],
+    "additionalProperties": False,
+}
+
+# OpenAI-style structured outputs, passed through by OpenRouter
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "homework_solution", "strict": True, "schema": ANSWER_SCHEMA},
+}
+
+# Part of every format_memo key, with FORMATTER_VERSION: bump it whenever the
+# HTML render_structured produces changes
+STRUCTURED_RENDERER_VERSION = "1"
+
+# Same inline style as the step titles of the text path
+_TITLE = '<div style="color:#4CAF50;font-weight:700;margin:0.6rem 0 0.2rem 0;">{}</div>'
+
+
+def parse_answer(text: str) -> dict | None:
+    """The structured answer in ``text``, or None if it is plain text"""
+    body = (text or "").strip()
+    if body.startswith("```"):
+        # Some models fence the JSON despite the response format
+        body = body.strip("`").strip()
+        if body.startswith("json"):
+            body = body[4:]
+    if not body.startswith("{"):
+        return None
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    if isinstance(data.get("parts"), list) or isinstance(data.get("steps"), list):
+        return data
+    return None
+
+
+def merge_parts(parts: list[tuple[str, str, str]]) -> str:
+    """One structured answer from ``(label, part question, answer text)`` triples"""
+    return json.dumps({"parts": [
+        {"label": label, "question": " ".join(body.split()), "answer": parse_answer(answer) or answer}
+        for label, body, answer in parts
+    ]}, ensure_ascii=False)
+
+
+def _text(value) -> str:
+    return html.escape(value if isinstance(value, str) else "" if value is None else str(value))
+
+
+def _code_block(language, code) -> str:
+    return (f'<div class="code-block"><div class="code-header">{_text(language) or "text"}</div>'
+            f'<pre><code>{_text(code)}</code></pre></div>')
+
+
+def render_structured(data: dict) -> str:
+    """HTML for a parsed structured answer; every model string is escaped"""
+    if isinstance(data.get("parts"), list):
+        out = []
+        for part in data["parts"]:
+            if not isinstance(part, dict):
+                continue
+            if out:
+                out.append("<br>")
+            header = f"Part ({part.get('label', '')}): {part.get('question', '')}"
+            out.append(f'<div class="part-header">{_text(header)}</div>\n')
+            answer = part.get("answer")
+            out.append(render_structured(answer) if isinstance(answer, dict) else format_response(answer or ""))
+        return "".join(out)
+
+    out = []
+    for number, step in enumerate(data.get("steps") or [], 1):
+        if not isinstance(step, dict):
+            continue
+        if out:
+            out.append("<br>")
+        title = str(step.get("title") or "").strip()
+        if not title.startswith("Step "):
+            title = f"Step {number}: {title}".rstrip(": ")
+        out.append(_TITLE.format(_text(title)))
+        if step.get("explanation"):
+            out.append(f'<div class="step-code">{_text(step["explanation"])}</div>')
+        for equation in step.get("equations") or []:
+            if equation:
+                out.append(f'<div class="math-line">{_text(equation)}</div>\n')
+        if step.get("code"):
+            out.append(_code_block(step.get("language"), step["code"]))
+
+    complexity = data.get("complexity") if isinstance(data.get("complexity"), dict) else {}
+    for label, key in (("Time Complexity", "time"), ("Space Complexity", "space")):
+        if complexity.get(key):
+            out.append(f"<br><div><strong>{label}:</strong> {_text(complexity[key])}</div>\n")
+
+    complete = data.get("complete_code") if isinstance(data.get("complete_code"), dict) else {}
+    if complete.get("code"):
+        out.append("<br>" + _TITLE.format("Complete Code"))
+        out.append(_code_block(complete.get("language"), complete["code"]))
+
+    if data.get("final_answer"):
+        out.append(f'<br><div class="final-answer">Final Answer: {_text(data["final_answer"])}</div>\n')
+    return "".join(out)
+
+
+def format_answer(text: str) -> str:
+    """HTML for any answer: structured answers directly, text via ``format_response``"""
+    data = parse_answer(text)
+    if data is None:
+        return format_response(text)
+    return render_structured(data)
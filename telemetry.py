@@ -0,0 +1,206 @@
+"""Per-request LLM telemetry stored in SQLite.
+
+Every solution request is recorded, whether it was answered by the provider,
+the answer cache, the local equation solver, or by joining an identical call
+already in flight. Each row holds the subject, requested and served model,
+token usage and cost, time to first byte/token, total latency and outcome.
+``summary`` and ``timeseries`` aggregate the rows into latency percentiles and
+token totals per subject and model, e.g. to check whether routing Physics
+and Chemistry to ``gpt-4o`` is worth its latency.
+"""
+
+import sqlite3
+import threading
+import time
+
+from latency import percentile
+
+# Same database as the history it describes
+TELEMETRY_DB_PATH = "homework_history.db"
+
+DEFAULT_RETENTION_DAYS = 30
+
+# Where an answer came from
+SOURCE_API = "api"
+SOURCE_CACHE = "cache"
+SOURCE_LOCAL = "local"
+SOURCE_COALESCED = "coalesced"
+# Background summaries of follow-up conversations
+SOURCE_SUMMARY = "summary"
+
+_GROUP_COLUMNS = ("subject", "model", "source", "served_model")
+
+
+class Telemetry:
+    """Append-only call log with a bounded retention window.
+
+    Like the answer cache, ``sqlite3.Error`` is swallowed everywhere: losing a
+    telemetry row must never fail a student's request.
+    """
+
+    def __init__(self, db_path: str = TELEMETRY_DB_PATH,
+                 retention_days: float = DEFAULT_RETENTION_DAYS):
+        self.db_path = db_path
+        self.retention_seconds = retention_days * 24 * 3600
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self) -> None:
+        try:
+            with self._connect() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_telemetry (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        created_at REAL NOT NULL,
+                        subject TEXT NOT NULL,
+                        model TEXT NOT NULL,
+                        served_model TEXT,
+                        source TEXT NOT NULL,
+                        stream INTEGER NOT NULL DEFAULT 0,
+                        status TEXT NOT NULL,
+                        http_status INTEGER,
+                        prompt_tokens INTEGER,
+                        completion_tokens INTEGER,
+                        cost REAL,
+                        ttfb REAL,
+                        latency REAL NOT NULL,
+                        error TEXT
+                    )
+                """)
+                cur.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_llm_telemetry_created_at "
+                    "ON llm_telemetry (created_at)"
+                )
+                conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def record(self, subject: str, model: str, source: str, latency: float,
+               ok: bool = True, stream: bool = False, meta: dict | None = None,
+               error: Exception | None = None) -> None:
+        """Store one call; ``meta`` is the dict filled by the openrouter client."""
+        meta = meta or {}
+        usage = meta.get("usage") or {}
+        http_status = meta.get("status") or getattr(error, "status_code", None)
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    """
+                    INSERT INTO llm_telemetry (created_at, subject, model, served_model, source,
+                        stream, status, http_status, prompt_tokens, completion_tokens, cost,
+                        ttfb, latency, error)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        time.time(), subject, model, meta.get("model"), source,
+                        int(stream), "ok" if ok else "error", http_status,
+                        usage.get("prompt_tokens"), usage.get("completion_tokens"),
+                        usage.get("cost"), meta.get("ttfb"), latency,
+                        type(error).__name__ if error is not None else None,
+                    ),
+                )
+                self._writes += 1
+                if self._writes % 500 == 0:
+                    conn.execute(
+                        "DELETE FROM llm_telemetry WHERE created_at < ?",
+                        (time.time() - self.retention_seconds,),
+                    )
+                conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def _rows(self, since: float, until: float | None) -> list[tuple]:
+        query = ("SELECT created_at, subject, model, source, served_model, status, "
+                 "prompt_tokens, completion_tokens, cost, ttfb, latency "
+                 "FROM llm_telemetry WHERE created_at >= ?")
+        params = [since]
+        if until is not None:
+            query += " AND created_at < ?"
+            params.append(until)
+        try:
+            with self._connect() as conn:
+                return conn.execute(query, params).fetchall()
+        except sqlite3.Error:
+            return []
+
+    @staticmethod
+    def _aggregate(rows: list[tuple]) -> dict:
+        latencies = [r[10] for r in rows]
+        ttfbs = [r[9] for r in rows if r[9] is not None]
+        errors = sum(1 for r in rows if r[5] != "ok")
+        prompt_tokens = sum(r[6] or 0 for r in rows)
+        completion_tokens = sum(r[7] or 0 for r in rows)
+        costs = [r[8] for r in rows if r[8] is not None]
+        return {
+            "count": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+            "ttfb_p50": percentile(ttfbs, 50),
+            "ttfb_p95": percentile(ttfbs, 95),
+            "ttfb_p99": percentile(ttfbs, 99),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "avg_completion_tokens": completion_tokens / len(rows) if rows else 0.0,
+            "cost": sum(costs) if costs else None,
+        }
+
+    @staticmethod
+    def _group_key(row: tuple, group_by: tuple[str, ...]) -> tuple:
+        columns = {"subject": row[1], "model": row[2], "source": row[3], "served_model": row[4]}
+        return tuple(columns[name] for name in group_by)
+
+    def summary(self, window_seconds: float = 24 * 3600, group_by=("subject", "model"),
+                source: str | None = None, until: float | None = None) -> list[dict]:
+        """Percentiles and token totals per group over the last ``window_seconds``.
+
+        ``group_by`` is any of subject, model, source, served_model. ``source``
+        restricts the rows, e.g. ``"api"`` to look at provider calls only.
+        """
+        group_by = tuple(group_by)
+        unknown = set(group_by) - set(_GROUP_COLUMNS)
+        if unknown:
+            raise ValueError(f"Cannot group telemetry by {sorted(unknown)}")
+        end = until if until is not None else time.time()
+        rows = self._rows(end - window_seconds, until)
+        if source is not None:
+            rows = [r for r in rows if r[3] == source]
+
+        groups = {}
+        for row in rows:
+            groups.setdefault(self._group_key(row, group_by), []).append(row)
+        result = []
+        for key in sorted(groups, key=lambda k: tuple(str(v) for v in k)):
+            entry = dict(zip(group_by, key))
+            entry.update(self._aggregate(groups[key]))
+            result.append(entry)
+        return result
+
+    def timeseries(self, bucket_seconds: float = 3600, window_seconds: float = 24 * 3600,
+                   group_by=("model",), source: str | None = SOURCE_API) -> list[dict]:
+        """``summary`` per time bucket, oldest first; each entry has ``bucket_start``.
+
+        Buckets are aligned to multiples of ``bucket_seconds`` since the epoch,
+        so hourly buckets start on the hour (UTC).
+        """
+        rows = self._rows(time.time() - window_seconds, None)
+        if source is not None:
+            rows = [r for r in rows if r[3] == source]
+
+        buckets = {}
+        for row in rows:
+            bucket = (row[0] // bucket_seconds) * bucket_seconds
+            buckets.setdefault((bucket, self._group_key(row, tuple(group_by))), []).append(row)
+        result = []
+        for (bucket, key) in sorted(buckets, key=lambda k: (k[0], tuple(str(v) for v in k[1]))):
+            entry = {"bucket_start": bucket, **dict(zip(group_by, key))}
+            entry.update(self._aggregate(buckets[(bucket, key)]))
+            result.append(entry)
+        return result
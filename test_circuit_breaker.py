@@ -0,0 +1,95 @@
+"""Tests for circuit_breaker.py."""
+
+import pytest
+
+from circuit_breaker import (CLOSED, FIRST_TOKEN, HALF_OPEN, OPEN, STREAM, TOTAL, CircuitBreaker,
+                             CircuitOpenError, is_provider_failure)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def tripped_breaker(clock, **options):
+    breaker = CircuitBreaker("model", min_requests=4, error_threshold=0.5, open_seconds=30.0,
+                             clock=clock, **options)
+    for ok in (True, False, True, False):
+        breaker.before_call()
+        breaker.record_success() if ok else breaker.record_failure()
+    return breaker
+
+
+def test_closed_until_the_error_rate_crosses_the_threshold():
+    breaker = CircuitBreaker("model", min_requests=4, error_threshold=0.5, clock=Clock())
+    for _ in range(3):
+        breaker.record_failure()  # below min_requests: no verdict yet
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_open_fails_fast_then_half_open_probe_closes():
+    clock = Clock()
+    breaker = tripped_breaker(clock)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_in == pytest.approx(30.0)
+
+    clock.now += 30.0
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()  # the probe
+    breaker.record_success(1.0)
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens():
+    clock = Clock()
+    breaker = tripped_breaker(clock)
+    clock.now += 30.0
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.now += 29.0
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+@pytest.mark.parametrize("probes", [1, 3])
+def test_half_open_admits_only_the_configured_probes(probes):
+    clock = Clock()
+    breaker = tripped_breaker(clock, half_open_probes=probes)
+    clock.now += 30.0
+    for _ in range(probes):
+        breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_timeouts_use_separate_latency_series():
+    breaker = CircuitBreaker("model", clock=Clock())
+    for _ in range(20):
+        breaker.record_success(2.0)  # short non-streamed replies
+        breaker.record_success(40.0, STREAM)
+        breaker.record_latency(1.0, FIRST_TOKEN)
+
+    assert breaker.timeout(30.0, kind=TOTAL) == pytest.approx(5.0)  # 2 * 1.5, raised to the floor
+    assert breaker.timeout(90.0, kind=STREAM) == pytest.approx(60.0)
+    assert breaker.timeout(10.0, kind=FIRST_TOKEN, floor=1.0) == pytest.approx(1.5)
+    snapshot = breaker.snapshot()
+    assert (snapshot["p99"], snapshot["stream_p99"], snapshot["first_token_p99"]) == (2.0, 40.0, 1.0)
+
+
+def test_provider_failures():
+    class Status(Exception):
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    assert is_provider_failure(TimeoutError())
+    assert is_provider_failure(Status(429)) and is_provider_failure(Status(503))
+    assert not is_provider_failure(Status(400))
@@ -0,0 +1,56 @@
+"""Tests for fast_solver.py."""
+
+from fractions import Fraction
+
+import pytest
+
+from fast_solver import parse_equation, solve
+
+
+def final_answer(question):
+    return solve(question).split("**Final Answer:**")[1].strip()
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("Solve 2x + 4 = 10", "x = 3"),
+    ("solve for x: 5x - 2 = 3x + 6", "x = 4"),
+    ("Find y: 3y + 1 = 0", "y = -1/3 ≈ -0.3333"),
+])
+def test_linear(question, answer):
+    assert final_answer(question) == answer
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("Solve: 3x² - 12x + 9 = 0", "x = 3 or x = 1"),
+    ("x^2 - 4x + 4 = 0", "x = 2 (repeated root)"),
+    ("Solve x^2 - 2 = 0", "x = ±√2, i.e. x ≈ 1.414 or x ≈ -1.414"),
+    ("Solve 2x^2 - 2x - 1 = 0", "x = 1/2 ± √3/2, i.e. x ≈ 1.366 or x ≈ -0.366"),
+])
+def test_quadratic(question, answer):
+    assert final_answer(question) == answer
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("solve x^2 + 2x + 5 = 0", "No real solutions; x = -1 + 2i or x = -1 - 2i"),
+    ("x^2 + 1 = 0", "No real solutions; x = i or x = -i"),
+    ("Solve 4x^2 + 3 = 0", "No real solutions; x = i√3/2 or x = -i√3/2"),
+])
+def test_quadratic_with_negative_discriminant(question, answer):
+    assert final_answer(question) == answer
+
+
+@pytest.mark.parametrize("question", [
+    "a = 5",
+    "5 = x",
+    "Solve x + y = 5",
+    "Solve x^3 - 1 = 0",
+    "Solve x^2 - 1 = 0 and x = 1",
+    "If 3 apples cost 6 dollars, what does 1 cost?",
+    "Solve for y: 2x + 1 = 5",
+])
+def test_out_of_scope_questions_go_to_the_model(question):
+    assert solve(question) is None
+
+
+def test_parse_equation_moves_everything_left():
+    assert parse_equation("solve 2x^2 + 3 = x") == (Fraction(2), Fraction(-1), Fraction(3), "x")
@@ -0,0 +1,145 @@
+"""Golden-output tests for formatting.py.
+
+test_formatting_golden.json holds answers (hand-written edge cases plus
+generated mixed answers) with the HTML the original regex-per-line formatter
+produced for them. The formatter must keep reproducing it byte for byte,
+whether the answer is formatted whole or fed in chunks.
+"""
+
+import importlib
+import json
+import random
+import re
+import time
+from pathlib import Path
+
+import pytest
+
+from formatting import StreamingFormatter, format_powers, format_response, is_plain_fallback
+
+GOLDEN = json.loads((Path(__file__).parent / "test_formatting_golden.json").read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("case", GOLDEN, ids=[case["name"] for case in GOLDEN])
+def test_format_response_matches_golden(case):
+    assert format_response(case["input"]) == case["html"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 17])
+def test_streaming_matches_golden(chunk_size):
+    for case in GOLDEN:
+        text = case["input"]
+        formatter = StreamingFormatter()
+        pieces = [formatter.feed(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+        assert "".join(pieces) + formatter.finish() == case["html"], case["name"]
+
+
+def test_streaming_holds_back_only_the_open_lines():
+    formatter = StreamingFormatter()
+    assert formatter.feed("**Step 1:** Set up\nx = 2\n```py\nprint(1)").startswith('<div style=')
+    assert formatter.pending == "```py\nprint(1)"
+    assert formatter.feed("\n```\n").startswith('<div class="code-block">')
+    assert formatter.pending == ""
+
+
+def sequential_powers(text):
+    """The original six substitutions, applied one after another"""
+    text = re.sub(r'\^2', '<span class="power">2</span>', text)
+    text = re.sub(r'\^3', '<span class="power">3</span>', text)
+    text = re.sub(r'\^4', '<span class="power">4</span>', text)
+    text = re.sub(r'\^(\d+)', r'<span class="power">\1</span>', text)
+    text = re.sub(r'\^(\([^)]+\))', r'<span class="power">\1</span>', text)
+    return re.sub(r'\bsqrt\s*\(', '√(', text)
+
+
+def test_format_powers_matches_sequential_substitutions():
+    rng = random.Random(21)
+    alphabet = "^^^()23456789 sqrt_xa٣"
+    for _ in range(20000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 24)))
+        assert format_powers(text) == sequential_powers(text), text
+
+
+def fastest_format(text, repeats=5):
+    """Best of ``repeats`` unbudgeted runs, in seconds"""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        format_response(text, budget=None)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+@pytest.mark.parametrize("make, n", [
+    (lambda n: "x/" + "(" * n, 20000),
+    (lambda n: "(a" * n + ")/", 10000),
+    (lambda n: "x/y ^(" * n, 3500),
+    (lambda n: "x/y sqrt(" * n, 2300),
+    (lambda n: "\\sqrt{" * n, 3500),
+], ids=["open-parens", "paren-over-term", "open-powers", "sqrt-calls", "latex-sqrt"])
+def test_adversarial_lines_format_in_linear_time(make, n):
+    # The original formatter needs seconds on each of these, and 16 times as
+    # long at 4n; a linear one needs about 4 times as long. A ratio rather
+    # than a deadline, so slow machines pass too (bench_formatting.py times it)
+    assert fastest_format(make(4 * n)) < 8 * fastest_format(make(n))
+
+
+def test_over_budget_answers_fall_back_to_escaped_text():
+    from format_memo import FormatMemo
+
+    formatted = format_response("**Step 1:** <b>x</b>/2\n(a)/(b)", budget=0)
+    assert is_plain_fallback(formatted)
+    assert "&lt;b&gt;x&lt;/b&gt;/2" in formatted
+    assert not is_plain_fallback(format_response("(a)/(b)"))
+
+    memo = FormatMemo(render=lambda text: format_response(text, budget=0))
+    memo.render("(a)/(b)")
+    assert memo.get("(a)/(b)") is None
+
+
+def test_format_memo_reuses_html_until_the_version_changes(tmp_path):
+    from format_memo import FormatMemo
+
+    renders = []
+
+    def render(text):
+        renders.append(text)
+        return format_response(text)
+
+    db_path = str(tmp_path / "memo.db")
+    answer = GOLDEN[3]["input"]
+    memo = FormatMemo(render=render, max_entries=1, db_path=db_path)
+    assert memo.render(answer) == GOLDEN[3]["html"]
+    memo.render("another answer")  # pushes the first one out of memory
+    assert memo.render(answer) == GOLDEN[3]["html"]
+    assert FormatMemo(render=render, db_path=db_path).render(answer) == GOLDEN[3]["html"]
+    assert len(renders) == 2
+
+    FormatMemo(render=render, db_path=db_path, version="next").render(answer)
+    assert len(renders) == 3
+
+
+def test_format_memo_version_covers_both_renderers(monkeypatch):
+    import format_memo
+    import structured_answers
+
+    key = format_memo.content_key("answer")
+    monkeypatch.setattr(structured_answers, "STRUCTURED_RENDERER_VERSION", "next")
+    importlib.reload(format_memo)
+    assert format_memo.content_key("answer") != key
+    monkeypatch.undo()
+    importlib.reload(format_memo)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_migrated_history_rows_render_unchanged(compress):
+    from answer_storage import migrate_row, render_stored
+
+    converted = 0
+    for case in GOLDEN:
+        if not case["html"]:
+            continue
+        value, answer_format = migrate_row(case["html"], compress=compress)
+        assert render_stored(value, answer_format) == case["html"], case["name"]
+        converted += answer_format.startswith("text")
+    assert converted > len(GOLDEN) // 2
@@ -0,0 +1,69 @@
+"""Tests for question_splitter.py and the merge in solution_request.py."""
+
+import re
+
+import pytest
+
+from formatting import format_response
+from question_splitter import part_question, split_parts
+from solution_request import merged_parts
+
+
+def test_lettered_parts_share_the_stem():
+    stem, parts = split_parts("A ball is thrown up at 20 m/s. (a) Find the max height. (b) Find the time of flight.")
+    assert stem == "A ball is thrown up at 20 m/s."
+    assert parts == [("a", "Find the max height."), ("b", "Find the time of flight.")]
+    assert part_question(stem, parts[1][1]) == "A ball is thrown up at 20 m/s.\n\nFind the time of flight."
+
+
+def test_numbered_parts():
+    stem, parts = split_parts("Answer the following:\n1. Find 2+2\n2) Simplify 3x + 2x\n(3) Name the capital of France")
+    assert stem == "Answer the following:"
+    assert parts == [("1", "Find 2+2"), ("2", "Simplify 3x + 2x"), ("3", "Name the capital of France")]
+
+
+@pytest.mark.parametrize("question, parts", [
+    ("Differentiate x^2 + 3x and integrate 3x dx",
+     [("a", "Differentiate x^2 + 3x"), ("b", "integrate 3x dx")]),
+    ("Solve 2x + 5 = 11, and simplify 3(x + 2) - x.",
+     [("a", "Solve 2x + 5 = 11"), ("b", "simplify 3(x + 2) - x.")]),
+])
+def test_tasks_joined_by_and(question, parts):
+    assert split_parts(question) == ("", parts)
+
+
+@pytest.mark.parametrize("question", [
+    "Explain osmosis",
+    "Solve 3x^2 - 12x + 9 = 0",
+    "(a) Find x if 2x = 4. (b) Hence find x^2.",  # depends on part (a)
+    "(a) Find x. (c) Find y.",  # not a sequence
+    "Find the mean and find the median of 1, 2, 3 and 4",  # the data is shared
+    "Find the derivative of f(x) = x^2 + 3x and evaluate it at x = 3",
+    "Define osmosis and explain its importance in plant cells",
+    "Name the process and describe its stages",
+    "Differentiate y = x^3 and find the gradient at x = 2",
+    "1. Solve x^2 = 4\n2. Using this, find x^4",
+])
+def test_single_questions_pass_through(question):
+    assert split_parts(question) is None
+
+
+@pytest.mark.parametrize("question", [
+    "Solve x + y = 5 and x - y = 1",
+    "Find x and y if 2x = 4 and 3y = 9",
+    "Find f(a) and f(b) where f(x) = x^2",
+    "Evaluate g(x) = (x) + 1.5 when x = 2. Then 3. is the answer",
+])
+def test_no_split_inside_equations(question):
+    assert split_parts(question) is None
+
+
+def test_merged_parts_render_as_part_headers():
+    question = "Answer the following:\n1. Find 2+2\n2. Simplify x^2 * x"
+    _, parts = split_parts(question)
+    answers = ["**Step 1:** Add\n4\n\n**Final Answer:** 4\n", "**Final Answer:** x^3"]
+    html = format_response("".join(merged_parts(parts, iter(answers))))
+
+    headers = re.findall(r'<div class="part-header">(.*?)</div>', html)
+    assert headers == ["Part (1): Find 2+2", 'Part (2): Simplify x<span class="power">2</span> * x']
+    assert html.index("Final Answer: 4") < html.index(headers[1]) < html.index("Final Answer: x")
@@ -0,0 +1,134 @@
+"""Tests for retry_policy.py, with an injected RNG, clock and sleep."""
+
+import email.utils
+import random
+
+import pytest
+
+import openrouter
+from retry_policy import RetryPolicy, parse_retry_after
+
+
+class FakeTime:
+    """Clock that only moves when the policy sleeps"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_policy(fake, **options):
+    return RetryPolicy(rng=random.Random(7), sleep=fake.sleep, clock=fake.clock, **options)
+
+
+def failing(*errors, result="answer"):
+    """``fn`` for ``RetryPolicy.call`` raising ``errors`` in turn, then returning ``result``"""
+    remaining = list(errors)
+    calls = []
+
+    def fn(time_left):
+        calls.append(time_left)
+        if remaining:
+            raise remaining.pop(0)
+        return result
+
+    fn.calls = calls
+    return fn
+
+
+def test_full_jitter_stays_within_the_capped_exponential():
+    policy = RetryPolicy(base_delay=0.5, max_delay=8.0, rng=random.Random(1))
+    for attempt in range(8):
+        cap = min(8.0, 0.5 * 2 ** attempt)
+        delays = [policy.backoff(attempt) for _ in range(500)]
+        assert all(0.0 <= delay <= cap for delay in delays)
+        assert max(delays) > cap * 0.9  # the whole range is used, not just its start
+
+
+def test_retry_after_seconds_is_honoured():
+    fake = FakeTime()
+    fn = failing(openrouter.OpenRouterError("slow down", 429, retry_after="7"))
+    assert make_policy(fake).call(fn) == "answer"
+    assert fake.sleeps == [7.0]
+
+
+def test_retry_after_http_date():
+    now = 1_700_000_000.0
+    date = email.utils.formatdate(now + 12, usegmt=True)
+    assert parse_retry_after(date, now=now) == pytest.approx(12.0)
+    assert parse_retry_after(email.utils.formatdate(now - 60, usegmt=True), now=now) == 0.0
+    assert parse_retry_after("soon", now=now) is None
+
+
+def test_gives_up_at_the_deadline():
+    fake = FakeTime()
+    error = openrouter.OpenRouterError("busy", 503)
+    fn = failing(*[error] * 100)
+    policy = make_policy(fake, max_attempts=100, base_delay=1.0, max_delay=4.0, deadline=10.0)
+    with pytest.raises(openrouter.OpenRouterError):
+        policy.call(fn)
+    assert fake.now < 10.0
+    assert 1 < len(fn.calls) < 100
+
+
+def test_slow_attempts_are_cut_off_at_the_deadline():
+    fake = FakeTime()
+    calls = []
+
+    def fn(remaining):
+        # A request that times out after min(30s, remaining), as in run.py
+        calls.append(remaining)
+        fake.now += min(30.0, remaining)
+        raise openrouter.OpenRouterError("timed out", None)
+
+    with pytest.raises(openrouter.OpenRouterError):
+        make_policy(fake, deadline=45.0).call(fn)
+    assert calls[0] == 45.0 and calls[1] < 15.0
+    assert fake.now <= 45.0
+
+
+def test_a_retry_after_past_the_deadline_is_not_waited_for():
+    fake = FakeTime()
+    fn = failing(openrouter.OpenRouterError("later", 429, retry_after="60"))
+    with pytest.raises(openrouter.OpenRouterError):
+        make_policy(fake, deadline=45.0).call(fn)
+    assert fake.sleeps == []
+
+
+@pytest.mark.parametrize("status, retried", [(400, False), (401, False), (404, False), (422, False),
+                                             (429, True), (500, True), (503, True)])
+def test_only_transient_statuses_are_retried(status, retried):
+    fake = FakeTime()
+    fn = failing(openrouter.OpenRouterError("error", status))
+    if retried:
+        assert make_policy(fake).call(fn) == "answer"
+    else:
+        with pytest.raises(openrouter.OpenRouterError):
+            make_policy(fake).call(fn)
+    assert len(fn.calls) == (2 if retried else 1)
+
+
+def test_streams_are_not_retried_after_the_first_chunk():
+    fake = FakeTime()
+    attempts = []
+
+    def factory(remaining):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise openrouter.FirstTokenTimeout("no tokens")
+        yield "partial"
+        raise openrouter.OpenRouterError("dropped", 502)
+
+    chunks = []
+    with pytest.raises(openrouter.OpenRouterError):
+        for chunk in make_policy(fake).stream(factory):
+            chunks.append(chunk)
+    assert chunks == ["partial"]
+    assert len(attempts) == 2
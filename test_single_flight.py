@@ -0,0 +1,106 @@
+"""Tests for single_flight.py."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def run_coalesced(flight, fn, callers=5):
+    """Start ``callers`` concurrent ``do`` calls and let ``fn`` finish once all have joined"""
+    release = threading.Event()
+
+    def leader_fn():
+        release.wait(5)
+        return fn()
+
+    def call():
+        try:
+            return flight.do("key", leader_fn)
+        except Exception as exc:
+            return exc
+
+    with ThreadPoolExecutor(callers) as pool:
+        futures = [pool.submit(call) for _ in range(callers)]
+        wait_for(lambda: flight.stats()["coalesced"] == callers - 1)
+        release.set()
+        return [future.result() for future in futures]
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    results = run_coalesced(flight, lambda: calls.append(1) or "answer")
+
+    assert len(calls) == 1
+    assert sorted(results, key=lambda r: r[1]) == [("answer", False)] + [("answer", True)] * 4
+    assert flight.stats()["in_flight"] == 0
+    # Nothing is cached: the next call runs again
+    assert flight.do("key", lambda: "again") == ("again", False)
+
+
+def test_concurrent_callers_share_the_exception():
+    flight = SingleFlight()
+    error = ValueError("provider down")
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise error
+
+    results = run_coalesced(flight, fail)
+    assert len(calls) == 1
+    assert all(result is error for result in results)
+
+
+def test_late_stream_reader_replays_missed_chunks():
+    flight = SingleFlight()
+    resume = threading.Event()
+    completed = []
+
+    def upstream():
+        yield "a"
+        yield "b"
+        resume.wait(5)
+        yield "c"
+
+    first = flight.stream("key", upstream, on_complete=completed.append)
+    reader = iter(first)
+    assert [next(reader), next(reader)] == ["a", "b"]
+
+    late = flight.stream("key", lambda: pytest.fail("upstream started twice"))
+    assert (first.shared, late.shared) == (False, True)
+    resume.set()
+    assert "".join(late) == "abc"
+    assert list(reader) == ["c"]
+    wait_for(lambda: completed)
+    assert completed == ["abc"]
+
+
+def test_stream_error_reaches_every_reader():
+    flight = SingleFlight()
+    resume = threading.Event()
+
+    def upstream():
+        yield "a"
+        resume.wait(5)
+        raise ConnectionError("dropped")
+
+    first = flight.stream("key", upstream)
+    reader = iter(first)
+    assert next(reader) == "a"
+    late = flight.stream("key", upstream)
+    resume.set()
+    for stream in (reader, iter(late)):
+        with pytest.raises(ConnectionError):
+            list(stream)
@@ -0,0 +1,112 @@
+"""Pre-solve the questions students ask first.
+
+Many first interactions are a subject's example question submitted verbatim,
+or one of the questions that keep coming up in ``history``. ``WarmUp`` runs
+those through the normal solution pipeline in the background, at startup and
+again on demand, so the answer, its formatted HTML and any diagram are ready
+before anyone asks and are served without a provider call.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from answer_cache import normalize_question
+
+# Recent history rows scanned when mining the most asked questions
+HISTORY_SCAN_ROWS = 20000
+
+
+def example_questions(subjects: dict) -> list[tuple[str, str]]:
+    """``(subject, example)`` for every subject that has an example question"""
+    return [(subject, info["example"]) for subject, info in subjects.items() if info.get("example")]
+
+
+def top_questions(db_path: str, limit: int, min_count: int = 2,
+                  scan_rows: int = HISTORY_SCAN_ROWS) -> list[tuple[str, str, int]]:
+    """The most asked ``(subject, question, count)`` in recent history.
+
+    Questions are grouped the way the answer cache matches them (whitespace
+    folded); the most recent spelling is returned. Only questions asked at
+    least ``min_count`` times are worth warming.
+    """
+    try:
+        with sqlite3.connect(db_path, timeout=5) as conn:
+            rows = conn.execute(
+                "SELECT subject, question FROM history ORDER BY id DESC LIMIT ?", (scan_rows,)
+            ).fetchall()
+    except sqlite3.Error:
+        return []
+
+    counts = Counter()
+    spelling = {}
+    for subject, question in rows:
+        key = (subject, normalize_question(question))
+        if not key[1]:
+            continue
+        counts[key] += 1
+        spelling.setdefault(key, question.strip())
+    return [(subject, spelling[(subject, text)], count)
+            for (subject, text), count in counts.most_common(limit) if count >= min_count]
+
+
+class WarmUp:
+    """Background warm-up runs, one at a time.
+
+    ``solve(subject, question, refresh)`` must produce and keep everything a
+    later request needs; ``refresh`` asks it to redo work it already has.
+    ``snapshot`` reports progress for the service status panel.
+    """
+
+    def __init__(self, solve, concurrency: int = 2):
+        self.solve = solve
+        self.concurrency = max(concurrency, 1)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._state = {"status": "idle", "total": 0, "done": 0, "errors": 0,
+                       "last_error": None, "started_at": None, "finished_at": None}
+
+    def start(self, items: list[tuple[str, str]], refresh: bool = False) -> bool:
+        """Warm ``items`` in the background; False if a run is already going"""
+        unique = {}
+        for subject, question in items:
+            unique.setdefault((subject, normalize_question(question)), (subject, question))
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._state = {"status": "running", "total": len(unique), "done": 0, "errors": 0,
+                           "last_error": None, "started_at": time.time(), "finished_at": None}
+            self._thread = threading.Thread(target=self._run, args=(list(unique.values()), refresh),
+                                            name="warm-up", daemon=True)
+            self._thread.start()
+        return True
+
+    def _run(self, items: list[tuple[str, str]], refresh: bool) -> None:
+        # A few at a time, so warming never crowds out students' own requests
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="warm-up") as pool:
+            futures = {pool.submit(self.solve, subject, question, refresh): subject
+                       for subject, question in items}
+            for future in as_completed(futures):
+                error = future.exception()
+                with self._lock:
+                    self._state["done"] += 1
+                    if error is not None:
+                        self._state["errors"] += 1
+                        self._state["last_error"] = f"{futures[future]}: {type(error).__name__}: {error}"
+        with self._lock:
+            self._state["status"] = "finished"
+            self._state["finished_at"] = time.time()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until the current run is over; False if ``timeout`` ran out first."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._state)